@@ -1,6 +1,7 @@
 import os
 import json
 import random
+import threading
 from datetime import datetime, timedelta
 from flask import Flask, render_template, request, jsonify, session
 from dotenv import load_dotenv
@@ -8,11 +9,9 @@ from pymongo import MongoClient
 from bson import ObjectId
 from bson.json_util import dumps, loads
 import requests
-import numpy as np
-from sklearn.cluster import KMeans
-import pandas as pd
-from geopy.distance import geodesic
-from openai import OpenAI
+
+# numpy/sklearn, geopy and openai are imported where they are used: together they
+# dominate import time, and most requests (and every worker start) never need them
 
 load_dotenv()
 
@@ -37,13 +36,28 @@ except Exception as e:
     client = None
     db = None
 
-try:
-    openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
-    if openai_client:
-        print(f"OpenAI client initialized with model {OPENAI_MODEL}")
-except Exception as e:
-    print(f"OpenAI client initialization error: {e}")
-    openai_client = None
+openai_client = None
+_openai_client_ready = False
+_openai_client_lock = threading.Lock()
+
+def get_openai_client():
+    """OpenAI client, created on first use (None if no API key or initialization failed)"""
+    global openai_client, _openai_client_ready
+    if _openai_client_ready:
+        return openai_client
+    # Threaded server: concurrent first requests wait for one initialization instead of seeing None
+    with _openai_client_lock:
+        if not _openai_client_ready:
+            try:
+                if OPENAI_API_KEY:
+                    from openai import OpenAI
+                    openai_client = OpenAI(api_key=OPENAI_API_KEY)
+                    print(f"OpenAI client initialized with model {OPENAI_MODEL}")
+            except Exception as e:
+                print(f"OpenAI client initialization error: {e}")
+                openai_client = None
+            _openai_client_ready = True
+    return openai_client
 
 def init_db():
     """Initialize database collections and indexes"""
@@ -112,6 +126,9 @@ def analyze_location_patterns_ml(locations_data):
     if not locations_data or len(locations_data) < 3:
         return None
     
+    import numpy as np
+    from sklearn.cluster import KMeans
+    
     coords = np.array([[loc['lat'], loc['lon']] for loc in locations_data])
     
     n_clusters = min(3, len(locations_data))
@@ -230,6 +247,7 @@ def get_tomtom_route(start_lat, start_lon, end_lat, end_lon, route_type='eco'):
 
 def mock_tomtom_route(start_lat, start_lon, end_lat, end_lon, route_type):
     """Mock TomTom route for demo"""
+    from geopy.distance import geodesic
     distance = geodesic((start_lat, start_lon), (end_lat, end_lon)).kilometers
     
     travel_time = int(distance * 4 * 60)
@@ -486,11 +504,12 @@ def chatbot():
     data = request.json
     message = data.get('message', '')
     
-    if not openai_client:
+    ai_client = get_openai_client()
+    if not ai_client:
         return jsonify({'response': get_rule_based_response(message)})
 
     try:
-        completion = openai_client.chat.completions.create(
+        completion = ai_client.chat.completions.create(
             model=OPENAI_MODEL,
             messages=[
                 {
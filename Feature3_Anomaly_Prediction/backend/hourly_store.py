@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Gyatah Hourly Store - append-only, memory-mapped store of merged hourly signals
+One fixed-width binary file per signal (row i = hour start + i) plus meta.json
+describing the columns and time range. Time-range reads are views of the mapped
+files, and new hours are appended to the tail instead of rewriting the history.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of this process are serialized
+    fcntl = None
+
+HOUR_NS = 3600 * 10**9
+
+_LOCKS = {}  # abspath(lock file) -> threading.Lock shared by every user of that file in the process
+_LOCKS_GUARD = threading.Lock()
+
+
+def _path_lock(path):
+    key = os.path.abspath(path)
+    with _LOCKS_GUARD:
+        return _LOCKS.setdefault(key, threading.Lock())
+
+
+@contextmanager
+def exclusive_lock(lock_path):
+    """
+    Exclusive hold on lock_path: threads of this process via a shared threading.Lock,
+    other processes via flock() on the file (created if missing).
+    """
+    with _path_lock(lock_path):
+        if os.path.dirname(lock_path):
+            os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        with open(lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class HourlyStore:
+    """
+    Persistent hourly time series: <store_dir>/meta.json + <store_dir>/<n>.bin per column.
+
+    meta.json is the commit point: it is replaced atomically after the column
+    files are extended, and readers only map the first meta['hours'] rows, so a
+    crash mid-append leaves at most some unreferenced bytes at the file tails
+    (trimmed by the next append). Appends are serialized per directory: by a lock
+    shared by every instance in the process (each analysis job opens its own) and
+    by flock() on <store_dir>/.lock across processes.
+    """
+
+    VERSION = 1
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.meta = self._read_meta()
+
+    # -------------------------
+    # Metadata
+    # -------------------------
+    def _meta_path(self):
+        return os.path.join(self.store_dir, 'meta.json')
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_path(), 'r') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return {'version': self.VERSION, 'start': None, 'hours': 0, 'columns': {}}
+        if meta.get('version') != self.VERSION:
+            raise ValueError(f"{self.store_dir}: unsupported hourly store version {meta.get('version')}")
+        return meta
+
+    def _write_meta(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp = self._meta_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(tmp, self._meta_path())
+
+    @property
+    def columns(self):
+        return list(self.meta['columns'])
+
+    @property
+    def hours(self):
+        return self.meta['hours']
+
+    @property
+    def start(self):
+        return pd.Timestamp(self.meta['start']) if self.meta['start'] else None
+
+    @property
+    def end(self):
+        """Timestamp of the last stored hour (None while empty)."""
+        if not self.meta['hours']:
+            return None
+        return self.start + pd.Timedelta(hours=self.meta['hours'] - 1)
+
+    def _file(self, col):
+        return os.path.join(self.store_dir, self.meta['columns'][col]['file'])
+
+    # -------------------------
+    # Writing
+    # -------------------------
+    def _locked(self):
+        """Exclusive hold on the store for one append (see exclusive_lock())."""
+        return exclusive_lock(os.path.join(self.store_dir, '.lock'))
+
+    def append(self, merged):
+        """
+        Append the hours of a merged frame (timestamp + numeric columns) that lie after the stored range.
+
+        Hours already in the store are never rewritten; gaps between the current end and
+        the new rows are stored as NaN. A column seen for the first time gets a new file
+        back-filled with NaN for the existing hours. Returns the number of hours appended.
+        """
+        cols = [c for c in merged.columns if c != 'timestamp' and pd.api.types.is_numeric_dtype(merged[c])]
+        ts = pd.to_datetime(merged['timestamp']).dt.floor('h').to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        if not len(ts) or not cols:
+            return 0
+        with self._locked():
+            self.meta = self._read_meta()  # another job or process may have appended meanwhile
+            if self.meta['start'] is None:
+                self.meta['start'] = str(pd.Timestamp(ts.min()))
+            start_ns = pd.Timestamp(self.meta['start']).value
+            old_hours = self.meta['hours']
+            idx = (ts - start_ns) // HOUR_NS
+            new = idx >= old_hours
+            skipped_before = int((idx < 0).sum())
+            if skipped_before:
+                print(f"Hourly store: ignoring {skipped_before} rows before {self.meta['start']}")
+            if not new.any():
+                return 0
+            new_hours = int(idx[new].max()) + 1
+            pos = idx[new] - old_hours
+
+            for col in list(self.meta['columns']) + [c for c in cols if c not in self.meta['columns']]:
+                if col not in self.meta['columns']:
+                    dtype = np.float32 if merged[col].dtype == np.float32 else np.float64
+                    self.meta['columns'][col] = {'file': f'{len(self.meta["columns"])}.bin',
+                                                 'dtype': np.dtype(dtype).name}
+                    with open(self._file(col), 'wb') as f:
+                        np.full(old_hours, np.nan, dtype=dtype).tofile(f)
+                dtype = np.dtype(self.meta['columns'][col]['dtype'])
+                tail = np.full(new_hours - old_hours, np.nan, dtype=dtype)
+                if col in merged.columns:
+                    tail[pos] = merged[col].to_numpy(dtype=dtype, na_value=np.nan)[new]
+                with open(self._file(col), 'r+b') as f:
+                    f.truncate(old_hours * dtype.itemsize)  # drop bytes of an interrupted append
+                    f.seek(0, os.SEEK_END)
+                    tail.tofile(f)
+            self.meta['hours'] = new_hours
+            self._write_meta()
+            return new_hours - old_hours
+
+    # -------------------------
+    # Reading
+    # -------------------------
+    def _slice(self, start=None, end=None):
+        """Row range [i0, i1) covering start..end (inclusive timestamps, clipped to the store)."""
+        hours = self.meta['hours']
+        if not hours:
+            return 0, 0
+        start_ns = pd.Timestamp(self.meta['start']).value
+        i0 = 0 if start is None else -(-(pd.Timestamp(start).value - start_ns) // HOUR_NS)
+        i1 = hours if end is None else (pd.Timestamp(end).value - start_ns) // HOUR_NS + 1
+        i0, i1 = max(int(i0), 0), min(int(i1), hours)
+        return i0, max(i0, i1)
+
+    def arrays(self, start=None, end=None, columns=None):
+        """
+        Zero-copy read: (timestamps, {column: read-only memmap view}) for start..end.
+
+        The views stay valid after later appends (they map the file as it was).
+        This is the path for readers that work on arrays; frame() copies.
+        """
+        self.meta = self._read_meta()
+        columns = self.columns if columns is None else [c for c in columns if c in self.meta['columns']]
+        i0, i1 = self._slice(start, end)
+        ts = np.datetime64(self.meta['start'] or 'NaT', 'ns') + np.arange(i0, i1) * np.timedelta64(1, 'h')
+        out = {}
+        for col in columns:
+            dtype = np.dtype(self.meta['columns'][col]['dtype'])
+            if i1 <= i0:
+                out[col] = np.empty(0, dtype=dtype)
+                continue
+            out[col] = np.memmap(self._file(col), dtype=dtype, mode='r', offset=i0 * dtype.itemsize,
+                                 shape=(i1 - i0,))
+        return ts, out
+
+    def frame(self, start=None, end=None, columns=None):
+        """
+        Merged-frame layout (timestamp + one column per signal) for start..end.
+
+        Copies the mapped range into the DataFrame (pandas consolidates the columns
+        into one block), so memory grows with the range read; use arrays() for zero-copy.
+        """
+        ts, arrays = self.arrays(start, end, columns)
+        df = pd.DataFrame({c: np.asarray(a) for c, a in arrays.items()})
+        df.insert(0, 'timestamp', pd.DatetimeIndex(ts))
+        return df
+
+    def info(self):
+        return {
+            'store_dir': self.store_dir,
+            'hours': self.hours,
+            'start': self.meta['start'],
+            'end': None if self.end is None else str(self.end),
+            'columns': self.columns
+        }
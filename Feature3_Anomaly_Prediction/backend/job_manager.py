@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Gyatah Job Manager - bounded, queued analysis jobs with isolated outputs
+Used by web_controller.py; each job runs run_analysis_with_params() in its own output directory.
+"""
+
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# urban_anomaly (numpy/pandas) is imported by the workers, on the first job, so that
+# importing this module (and starting web_controller) stays cheap
+
+
+class QueueFull(Exception):
+    """Raised by JobManager.submit() when the pending-job queue is at capacity."""
+
+
+class Job:
+    """One analysis run: parameters, lifecycle state, per-stage timings and output directory."""
+
+    FINAL_STATES = ('completed', 'failed', 'cancelled')
+
+    def __init__(self, job_id, params, output_dir):
+        self.id = job_id
+        self.params = params
+        self.output_dir = output_dir
+        self.status = 'queued'  # queued -> running -> completed | failed | cancelled
+        self.stage = None
+        self.progress = 0.0
+        self.error = None
+        self.summary = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.timings = {}  # stage -> seconds
+        self.outputs = {}  # output file -> rows, as each one is written
+        self._stage_started = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def done(self):
+        return self.status in self.FINAL_STATES
+
+    def to_dict(self):
+        def iso(t):
+            return datetime.fromtimestamp(t).isoformat() if t else None
+        now = self.finished_at or time.time()
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': round(self.progress, 3),
+            'error': self.error,
+            'created_at': iso(self.created_at),
+            'started_at': iso(self.started_at),
+            'finished_at': iso(self.finished_at),
+            'queued_seconds': round((self.started_at or now) - self.created_at, 3),
+            'run_seconds': round(now - self.started_at, 3) if self.started_at else None,
+            'stage_timings': {k: round(v, 3) for k, v in self.timings.items()},
+            'outputs': dict(self.outputs),
+            'params': self.params
+        }
+
+
+class JobManager:
+    """
+    Fixed pool of worker threads fed by a bounded queue.
+
+    At most max_workers analyses run at once; up to max_queued more wait in line
+    and further submissions raise QueueFull. Every job writes its outputs into
+    jobs_dir/<job_id>/ so concurrent users never clobber each other (uploads are
+    stored once, content-addressed, in the shared upload dir; see multipart_upload).
+    Queued jobs cancel immediately; running jobs stop at the next stage boundary.
+
+    Listeners (see subscribe()) receive ('job', job_id, job.to_dict()) on every
+    state or stage change and ('output', job_id, info) whenever the runner reports
+    a written file. The dict is a snapshot taken when the event fires, so a slow
+    listener still sees every transition as it happened, not the job's current state.
+    """
+
+    def __init__(self, runner, jobs_dir='jobs', max_workers=2, max_queued=16, max_history=200):
+        self.runner = runner
+        self.jobs_dir = jobs_dir
+        self.max_history = max_history
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.listeners = set()
+        os.makedirs(jobs_dir, exist_ok=True)
+        for i in range(max_workers):
+            threading.Thread(target=self._worker, name=f'analysis-worker-{i}', daemon=True).start()
+
+    def create(self):
+        """Reserve a job ID and its output directory; submit() removes the directory if the queue is full."""
+        job_id = uuid.uuid4().hex[:12]
+        output_dir = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(output_dir, exist_ok=True)
+        return job_id, output_dir
+
+    def submit(self, job_id, params):
+        """Queue a job created with create(); raises QueueFull if the queue is at capacity."""
+        params = dict(params, output_dir=os.path.join(self.jobs_dir, job_id))
+        job = Job(job_id, params, params['output_dir'])
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            # Never tracked in self.jobs, so _trim_history() would not clean it up
+            shutil.rmtree(job.output_dir, ignore_errors=True)
+            raise QueueFull(f"{self.queue.maxsize} analyses already waiting")
+        with self.lock:
+            self.jobs[job_id] = job
+            self._trim_history()
+        self._notify('job', job.id, job.to_dict())
+        return job
+
+    def subscribe(self, maxsize=256):
+        """Queue that receives job notifications until unsubscribe(); slow listeners drop events."""
+        q = queue.Queue(maxsize=maxsize)
+        with self.lock:
+            self.listeners.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.listeners.discard(q)
+
+    def listener_count(self):
+        with self.lock:
+            return len(self.listeners)
+
+    def _notify(self, *event):
+        with self.lock:
+            listeners = list(self.listeners)
+        for q in listeners:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                pass
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return sorted(self.jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    def latest_completed(self):
+        done = [j for j in self.list() if j.status == 'completed']
+        return done[0] if done else None
+
+    def active_count(self):
+        return sum(1 for j in self.list() if not j.done)
+
+    def cancel(self, job_id):
+        """Request cancellation. Returns False if the job is unknown or already finished."""
+        job = self.get(job_id)
+        if job is None or job.done:
+            return False
+        job.cancel_event.set()
+        if job.status == 'queued':
+            self._finish(job, 'cancelled')
+        return True
+
+    def _trim_history(self):
+        finished = sorted((j for j in self.jobs.values() if j.done), key=lambda j: j.created_at)
+        for job in finished[:max(0, len(self.jobs) - self.max_history)]:
+            del self.jobs[job.id]
+
+    def _finish(self, job, status, error=None):
+        now = time.time()
+        if job.stage is not None and job._stage_started is not None:
+            job.timings[job.stage] = now - job._stage_started
+        job.status = status
+        job.error = error
+        job.finished_at = now
+        if status == 'completed':
+            job.progress = 1.0
+        self._notify('job', job.id, job.to_dict())
+
+    def _progress(self, job, stage, **info):
+        """Progress callback handed to the runner: records stage timings and honours cancellation."""
+        from urban_anomaly import ANALYSIS_STAGES, AnalysisCancelled
+        if stage == 'output':
+            job.outputs[info.get('file')] = info.get('rows')
+            self._notify('output', job.id, dict(info))
+            return
+        now = time.time()
+        if job.stage is not None and job._stage_started is not None:
+            job.timings[job.stage] = now - job._stage_started
+        if job.cancel_event.is_set():
+            raise AnalysisCancelled(job.id)
+        job.stage = stage
+        job._stage_started = now
+        if stage in ANALYSIS_STAGES:
+            job.progress = ANALYSIS_STAGES.index(stage) / len(ANALYSIS_STAGES)
+        self._notify('job', job.id, job.to_dict())
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            from urban_anomaly import AnalysisCancelled
+            try:
+                if job.done:  # cancelled while queued
+                    continue
+                job.status = 'running'
+                job.started_at = time.time()
+                self._notify('job', job.id, job.to_dict())
+                try:
+                    result = self.runner(job.params, progress=lambda stage, **info: self._progress(job, stage, **info))
+                except AnalysisCancelled:
+                    self._finish(job, 'cancelled')
+                    continue
+                except Exception as e:
+                    self._finish(job, 'failed', str(e))
+                    continue
+                job.summary = result
+                if isinstance(result, dict) and 'error' in result:
+                    self._finish(job, 'failed', result['error'])
+                else:
+                    self._finish(job, 'completed')
+            finally:
+                self.queue.task_done()
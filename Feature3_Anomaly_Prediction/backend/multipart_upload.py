@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Gyatah Multipart Upload - streaming multipart/form-data parser for web_controller.py
+Uploaded files are written to disk in fixed-size chunks and hashed on the fly, so a
+CSV is never held in memory; identical uploads are stored once (content-addressed).
+"""
+
+import hashlib
+import os
+import uuid
+
+
+class MultipartError(ValueError):
+    """Malformed multipart body."""
+
+
+class UploadTooLarge(Exception):
+    """Raised when a request body, a file, a field or the field count exceeds its limit."""
+
+
+class UploadedFile:
+    """A file part saved to disk: original name, stored path, size and sha256."""
+
+    def __init__(self, filename, path, size, sha256, deduplicated):
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.deduplicated = deduplicated  # True if an identical upload was already stored
+
+
+def _boundary(content_type):
+    for part in content_type.split(';')[1:]:
+        key, _, value = part.strip().partition('=')
+        if key.lower() == 'boundary' and value:
+            return value.strip('"').encode('latin-1')
+    raise MultipartError("multipart/form-data without boundary")
+
+
+def _disposition(header_block):
+    """name and filename from the part's Content-Disposition header."""
+    name = filename = None
+    for line in header_block.decode('utf-8', 'replace').split('\r\n'):
+        key, _, value = line.partition(':')
+        if key.strip().lower() != 'content-disposition':
+            continue
+        for item in value.split(';')[1:]:
+            k, _, v = item.strip().partition('=')
+            v = v.strip().strip('"')
+            if k.lower() == 'name':
+                name = v
+            elif k.lower() == 'filename':
+                filename = os.path.basename(v.replace('\\', '/'))
+    if name is None:
+        raise MultipartError("part without a Content-Disposition name")
+    return name, filename
+
+
+class _FileSink:
+    """Writes a file part to a temp file while hashing it; finish() moves it to <sha256><ext>."""
+
+    def __init__(self, upload_dir, filename, max_bytes):
+        self.upload_dir = upload_dir
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.tmp_path = os.path.join(upload_dir, f'.upload-{uuid.uuid4().hex}.part')
+        self.f = open(self.tmp_path, 'wb')
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"{self.filename} exceeds {self.max_bytes} bytes")
+        self.hash.update(data)
+        self.f.write(data)
+
+    def finish(self):
+        self.f.close()
+        digest = self.hash.hexdigest()
+        ext = os.path.splitext(self.filename)[1].lower() or '.csv'
+        path = os.path.join(self.upload_dir, digest + ext)
+        if os.path.exists(path) and os.path.getsize(path) == self.size:
+            os.remove(self.tmp_path)
+            deduplicated = True
+        else:
+            os.replace(self.tmp_path, path)
+            deduplicated = False
+        return UploadedFile(self.filename, path, self.size, digest, deduplicated)
+
+    def abort(self):
+        self.f.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class _FieldSink:
+    """Collects a (small) form field value, rejecting it before it grows past max_bytes."""
+
+    def __init__(self, name, max_bytes):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.data = bytearray()
+
+    def write(self, data):
+        if len(self.data) + len(data) > self.max_bytes:
+            raise UploadTooLarge(f"form field {self.name!r} exceeds {self.max_bytes} bytes")
+        self.data += data
+
+
+def parse_multipart(rfile, content_type, content_length, upload_dir,
+                    max_file_bytes=200 * 1024 * 1024, max_field_bytes=64 * 1024,
+                    max_request_bytes=None, max_fields=64, chunk_size=64 * 1024):
+    """
+    Stream a multipart/form-data body from rfile.
+
+    Args:
+        rfile: request body stream (exactly content_length bytes are consumed)
+        content_type: Content-Type header (must carry the boundary)
+        content_length: Content-Length header value
+        upload_dir: where file parts are stored, named by sha256 of their content
+        max_file_bytes: per-file limit, enforced while streaming
+        max_field_bytes: per-field limit for plain (non-file) fields
+        max_request_bytes: limit on the declared Content-Length, checked before any
+            of the body is read (None: no limit beyond the per-part ones)
+        max_fields: most parts (plain fields and file inputs) one request may carry
+
+    Returns:
+        (fields, files): {name: str} for plain fields, {name: UploadedFile} for
+        file parts with a non-empty filename
+    """
+    if content_length is None:
+        raise MultipartError("Content-Length required")
+    try:
+        remaining = int(content_length)
+    except ValueError:
+        raise MultipartError(f"invalid Content-Length: {content_length!r}") from None
+    if remaining < 0:
+        raise MultipartError(f"invalid Content-Length: {content_length!r}")
+    if max_request_bytes is not None and remaining > max_request_bytes:
+        raise UploadTooLarge(f"request body of {remaining} bytes exceeds {max_request_bytes} bytes")
+    os.makedirs(upload_dir, exist_ok=True)
+    delimiter = b'\r\n--' + _boundary(content_type)
+    keep = len(delimiter) + 1  # tail kept back in case a delimiter straddles two reads
+
+    fields, files = {}, {}
+    # Prefix CRLF so the first boundary matches the same delimiter as the rest
+    buf = b'\r\n'
+    sink = None
+    eof = False
+    parts = 0
+
+    def fill():
+        nonlocal buf, remaining, eof
+        if remaining <= 0:
+            eof = True
+            return
+        data = rfile.read(min(chunk_size, remaining))
+        if not data:
+            eof = True
+            return
+        remaining -= len(data)
+        buf += data
+
+    try:
+        # Preamble: skip to the first boundary
+        while (idx := buf.find(delimiter)) < 0:
+            if eof:
+                raise MultipartError("no multipart boundary found")
+            buf = buf[-keep:]
+            fill()
+        buf = buf[idx + len(delimiter):]
+
+        while True:
+            while len(buf) < 2 and not eof:
+                fill()
+            if buf.startswith(b'--'):
+                break  # closing boundary
+            # Part headers
+            while (end := buf.find(b'\r\n\r\n')) < 0:
+                if eof or len(buf) > 16 * 1024:
+                    raise MultipartError("malformed part headers")
+                fill()
+            name, filename = _disposition(buf[2:end])
+            buf = buf[end + 4:]
+            parts += 1
+            if parts > max_fields:
+                raise UploadTooLarge(f"more than {max_fields} form fields")
+            if filename:
+                sink = _FileSink(upload_dir, filename, max_file_bytes)
+            elif filename is None:
+                sink = _FieldSink(name, max_field_bytes)
+            else:
+                sink = None  # file input left empty: discard the (empty) body
+
+            # Part body: flush everything that cannot be the start of the delimiter
+            while (idx := buf.find(delimiter)) < 0:
+                if eof:
+                    raise MultipartError("unexpected end of multipart body")
+                if len(buf) > keep:
+                    if sink is not None:
+                        sink.write(buf[:-keep])
+                    buf = buf[-keep:]
+                fill()
+            if sink is not None:
+                sink.write(buf[:idx])
+            buf = buf[idx + len(delimiter):]
+
+            if isinstance(sink, _FileSink):
+                files[name] = sink.finish()
+            elif isinstance(sink, _FieldSink):
+                fields[name] = sink.data.decode('utf-8', 'replace')
+            sink = None
+    except BaseException:
+        # The rest of the body is left unread; callers should close the connection
+        if isinstance(sink, _FileSink):
+            sink.abort()
+        raise
+    # Drain the epilogue so the connection stays usable
+    while remaining > 0:
+        data = rfile.read(min(chunk_size, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+    return fields, files
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Gyatah Results Cache - in-memory snapshots of analysis outputs for /api/get_results
+Snapshots are rebuilt only when the result files change (mtime/size), and carry an
+ETag, Last-Modified, a version number for delta polling and lazily encoded bodies:
+row records (the original format), columnar JSON and, when pyarrow is installed,
+an Arrow IPC stream per table.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # optional: ~5-10x faster encoding of large payloads
+    orjson = None
+
+RESULT_FILES = ('anomalies.csv', 'predicted_upcoming_anoms.csv', 'analysis_summary.json')
+TABLES = ('anomalies', 'predictions')
+
+# Representations of a snapshot (see ResultsCache / web_controller content negotiation)
+FORMATS = ('records', 'columnar', 'arrow')
+ARROW_MIME = 'application/vnd.apache.arrow.stream'
+COLUMNAR_MIME = 'application/vnd.gyatah.columnar+json'
+
+
+def dumps(obj):
+    """Compact JSON bytes; orjson when available (numpy arrays and NaN → null handled natively)."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=str, separators=(',', ':')).encode()
+
+
+def load_frames(results_dir):
+    """Read anomalies/predictions (as DataFrames, time columns as strings) and the summary of an output directory."""
+    frames, summary = {}, None
+    for key, name in (('anomalies', 'anomalies.csv'), ('predictions', 'predicted_upcoming_anoms.csv')):
+        path = os.path.join(results_dir, name)
+        if not os.path.exists(path):
+            continue
+        try:
+            df = pd.read_csv(path)
+            # Convert any date columns to string to avoid JSON serialization issues
+            for col in df.columns:
+                if 'time' in col.lower() or 'date' in col.lower():
+                    df[col] = df[col].astype(str)
+            frames[key] = df
+        except Exception as e:
+            print(f"Error reading {name}: {e}")
+            frames[key] = pd.DataFrame()
+
+    summary_path = os.path.join(results_dir, 'analysis_summary.json')
+    if os.path.exists(summary_path):
+        try:
+            with open(summary_path, 'r') as f:
+                summary = json.load(f)
+        except Exception as e:
+            print(f"Error reading summary: {e}")
+    return frames, summary
+
+
+def load_results(results_dir):
+    """Read anomalies, predictions and summary from an output directory into JSON-ready objects."""
+    frames, summary = load_frames(results_dir)
+    results = {key: df.to_dict('records') for key, df in frames.items()}
+    if summary is not None:
+        results['summary'] = summary
+    return results
+
+
+def _column(s):
+    """One column as a JSON-ready array: numpy for numbers/bools (orjson), list with None for missing values."""
+    if orjson is not None and (pd.api.types.is_float_dtype(s.dtype) or pd.api.types.is_integer_dtype(s.dtype)
+                               or pd.api.types.is_bool_dtype(s.dtype)):
+        return np.ascontiguousarray(s.to_numpy())
+    if s.isna().any():
+        return s.astype(object).where(s.notna(), None).tolist()
+    return s.tolist()
+
+
+def columnar(df):
+    """{'columns': [...], 'rows': n, 'data': {column: [values]}} - one array per column instead of one dict per row."""
+    return {'columns': [str(c) for c in df.columns], 'rows': len(df),
+            'data': {str(c): _column(df[c]) for c in df.columns}}
+
+
+def arrow_stream(df):
+    """Arrow IPC stream bytes of one table; None if pyarrow is not installed."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _row_key(row):
+    return json.dumps(row, sort_keys=True, default=str)
+
+
+class Snapshot:
+    """
+    Results of one output directory at one point in time.
+
+    Every representation (row records, columnar JSON, Arrow, gzip of each, delta
+    row keys) is encoded on first use and then reused, so a dashboard that only
+    asks for one format never pays for the others.
+    """
+
+    def __init__(self, version, etag, last_modified, frames, summary=None):
+        self.version = version
+        self.etag = etag
+        self.last_modified = last_modified
+        self.frames = frames
+        self.summary = summary
+        self._results = None
+        self._row_keys = None
+        self._encoded = {}
+        self._gzipped = {}
+
+    @property
+    def results(self):
+        """Row-record results (the original /api/get_results layout)."""
+        if self._results is None:
+            results = {key: df.to_dict('records') for key, df in self.frames.items()}
+            if self.summary is not None:
+                results['summary'] = self.summary
+            self._results = results
+        return self._results
+
+    @property
+    def row_keys(self):
+        if self._row_keys is None:
+            self._row_keys = {k: [_row_key(r) for r in self.results.get(k, [])] for k in TABLES}
+        return self._row_keys
+
+    @property
+    def body(self):
+        return self.encoded('records')
+
+    def etag_for(self, fmt):
+        """Distinct validator per representation (same version, different bytes)."""
+        return self.etag if fmt == 'records' else self.etag[:-1] + '-' + fmt + '"'
+
+    def encoded(self, fmt='records', table='anomalies'):
+        """
+        Body bytes for one representation.
+
+        records:  {"anomalies": [{...}, ...], "predictions": [...], "summary": {...}, "version": n}
+        columnar: {"format": "columnar", "anomalies": {"columns", "rows", "data"}, ..., "summary", "version"}
+        arrow:    Arrow IPC stream of one table (None without pyarrow)
+        """
+        key = (fmt, table) if fmt == 'arrow' else fmt
+        if key not in self._encoded:
+            if fmt == 'records':
+                body = json.dumps(dict(self.results, version=self.version)).encode()
+            elif fmt == 'columnar':
+                payload = {'format': 'columnar', 'version': self.version}
+                payload.update({k: columnar(df) for k, df in self.frames.items()})
+                if self.summary is not None:
+                    payload['summary'] = self.summary
+                body = dumps(payload)
+            else:
+                df = self.frames.get(table)
+                body = arrow_stream(df if df is not None else pd.DataFrame())
+            self._encoded[key] = body
+        return self._encoded[key]
+
+    def gzip_body(self, fmt='records', table='anomalies'):
+        key = (fmt, table) if fmt == 'arrow' else fmt
+        if key not in self._gzipped:
+            self._gzipped[key] = gzip.compress(self.encoded(fmt, table), compresslevel=5)
+        return self._gzipped[key]
+
+
+class ResultsCache:
+    """
+    Snapshot cache keyed by results directory.
+
+    A request only stats the result files; the CSVs are re-read and re-serialized
+    when a fingerprint (mtime + size of every file) changes, e.g. when a job
+    finishes writing or a newer job becomes the latest. Each rebuild gets a new
+    global version; the last `history` snapshots are kept so clients can ask for
+    only what changed since the version they already have.
+    """
+
+    def __init__(self, history=8):
+        self.history = history
+        self.lock = threading.Lock()
+        self.version = 0
+        self.current = {}   # results_dir -> Snapshot
+        self.snapshots = {}  # version -> Snapshot (bounded)
+
+    @staticmethod
+    def _fingerprint(results_dir):
+        stats = []
+        for name in RESULT_FILES:
+            try:
+                st = os.stat(os.path.join(results_dir, name))
+                stats.append((name, st.st_mtime_ns, st.st_size))
+            except OSError:
+                stats.append((name, None, None))
+        return stats
+
+    def get(self, results_dir):
+        """Current snapshot for results_dir, rebuilding it only if the files changed."""
+        results_dir = os.path.abspath(results_dir)
+        stats = self._fingerprint(results_dir)
+        etag = '"' + hashlib.sha1(repr((results_dir, stats)).encode()).hexdigest()[:20] + '"'
+        with self.lock:
+            snap = self.current.get(results_dir)
+            if snap is not None and snap.etag == etag:
+                return snap
+        frames, summary = load_frames(results_dir)
+        mtimes = [m for _, m, _ in stats if m is not None]
+        last_modified = max(mtimes) / 1e9 if mtimes else 0.0
+        with self.lock:
+            snap = self.current.get(results_dir)
+            if snap is not None and snap.etag == etag:  # another request rebuilt it meanwhile
+                return snap
+            self.version += 1
+            snap = Snapshot(self.version, etag, last_modified, frames, summary)
+            self.current[results_dir] = snap
+            self.snapshots[snap.version] = snap
+            for old in sorted(self.snapshots)[:-self.history]:
+                del self.snapshots[old]
+            return snap
+
+    def delta(self, snap, since):
+        """
+        Changes between version `since` and snap: rows added/removed per table.
+
+        Returns None when `since` is no longer (or never was) in the history,
+        in which case the caller should send the full snapshot.
+        """
+        with self.lock:
+            base = self.snapshots.get(since)
+        if base is None:
+            return None
+        payload = {'version': snap.version, 'base_version': since, 'delta': True}
+        for table in TABLES:
+            old_keys, new_keys = set(base.row_keys[table]), set(snap.row_keys[table])
+            rows = snap.results.get(table, [])
+            payload[f'{table}_added'] = [r for r, k in zip(rows, snap.row_keys[table]) if k not in old_keys]
+            payload[f'{table}_removed'] = [r for r, k in zip(base.results.get(table, []), base.row_keys[table])
+                                           if k not in new_keys]
+        if snap.summary != base.summary:
+            payload['summary'] = snap.summary
+        return payload
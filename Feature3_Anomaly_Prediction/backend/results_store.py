@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Gyatah Results Store - indexed SQLite history of fused anomaly events and forecasts
+Every analysis run upserts its events and predictions, so history accumulates across
+runs instead of being overwritten with the CSVs, and the dashboard can page through
+a time range / signal / partition with keyset cursors instead of loading every row.
+"""
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+
+# pandas is imported where rows are converted, so opening the store (at web_controller
+# startup) does not load it
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created TEXT NOT NULL,
+    output_dir TEXT,
+    params TEXT
+);
+CREATE TABLE IF NOT EXISTS anomalies (
+    id INTEGER PRIMARY KEY,
+    event_time TEXT NOT NULL,
+    partition TEXT NOT NULL DEFAULT '',
+    signals TEXT NOT NULL,
+    max_value REAL,
+    max_z REAL,
+    max_rel_change REAL,
+    run_id TEXT NOT NULL,
+    UNIQUE (event_time, partition)
+);
+CREATE INDEX IF NOT EXISTS anomalies_time ON anomalies (event_time, id);
+CREATE INDEX IF NOT EXISTS anomalies_partition_time ON anomalies (partition, event_time, id);
+CREATE INDEX IF NOT EXISTS anomalies_run ON anomalies (run_id);
+CREATE TABLE IF NOT EXISTS anomaly_signals (
+    signal TEXT NOT NULL,
+    event_time TEXT NOT NULL,
+    partition TEXT NOT NULL,
+    PRIMARY KEY (signal, event_time, partition)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS anomaly_signals_event ON anomaly_signals (event_time, partition);
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    forecast_time TEXT NOT NULL,
+    signal TEXT NOT NULL,
+    partition TEXT NOT NULL DEFAULT '',
+    horizon_hours INTEGER,
+    forecast_value REAL,
+    recent_mean REAL,
+    recent_std REAL,
+    z_score REAL,
+    rel_jump REAL,
+    flag_upcoming_anomaly INTEGER,
+    run_id TEXT NOT NULL,
+    UNIQUE (forecast_time, signal, partition)
+);
+CREATE INDEX IF NOT EXISTS predictions_signal_time ON predictions (signal, forecast_time, id);
+CREATE INDEX IF NOT EXISTS predictions_partition_time ON predictions (partition, forecast_time, id);
+CREATE INDEX IF NOT EXISTS predictions_run ON predictions (run_id);
+"""
+
+ANOMALY_COLUMNS = ['event_time', 'signals', 'max_value', 'max_z', 'max_rel_change', 'partition', 'run_id']
+PREDICTION_COLUMNS = ['signal', 'horizon_hours', 'forecast_time', 'forecast_value', 'recent_mean', 'recent_std',
+                      'z_score', 'rel_jump', 'flag_upcoming_anomaly', 'partition', 'run_id']
+
+
+def _time_key(value):
+    """Normalize a timestamp (string, datetime, np.datetime64) to the stored 'YYYY-MM-DD HH:MM:SS' form."""
+    import pandas as pd
+    return pd.Timestamp(value).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def encode_cursor(time_key, row_id):
+    return base64.urlsafe_b64encode(json.dumps([time_key, row_id]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(time_key, id) from an opaque cursor; ValueError if it was not produced by encode_cursor()."""
+    try:
+        time_key, row_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return str(time_key), int(row_id)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+def _records(df, columns):
+    """DataFrame rows as tuples in `columns` order (missing columns as None, NaN as NULL)."""
+    df = df.reindex(columns=columns).astype(object)
+    return list(df.where(df.notna(), None).itertuples(index=False, name=None))
+
+
+class ResultsStore:
+    """
+    SQLite file with one row per fused event and per (forecast_time, signal) forecast.
+
+    A re-run over the same hours replaces those rows (latest run wins) rather than
+    duplicating them: events of an earlier run inside the hours a new run covers are
+    deleted first, so an hour that no longer fires does not keep its old event.
+    Connections are per thread; WAL lets the HTTP workers read while a job is writing.
+    """
+
+    def __init__(self, db_path='results.db'):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # -------------------------
+    # Writing
+    # -------------------------
+    def add_run(self, run_id, events, predictions=None, output_dir=None, params=None, coverage=None):
+        """
+        Upsert one run's fused events (anomalies.csv layout) and forecasts
+        (predicted_upcoming_anoms.csv layout), in one transaction.
+
+        coverage: {partition: (first hour, last hour)} the run analysed ('' when not
+        partitioned). Stored events of those partitions in that range are replaced
+        by this run's; without it, the range spanned by the run's own events is used.
+        Stored forecasts are replaced over the forecast_time range of the new ones.
+
+        Returns (events written, predictions written).
+        """
+        from datetime import datetime
+        conn = self._conn()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO runs (run_id, created, output_dir, params) VALUES (?, ?, ?, ?)',
+                         (run_id, datetime.now().isoformat(), output_dir, json.dumps(params or {}, default=str)))
+            n_events = self._add_events(conn, run_id, events, coverage)
+            n_preds = self._add_predictions(conn, run_id, predictions)
+        return n_events, n_preds
+
+    def _add_events(self, conn, run_id, events, coverage=None):
+        import pandas as pd
+        if events is None or events.empty:
+            events = pd.DataFrame(columns=['event_time', 'signals', 'max_value', 'max_z', 'max_rel_change'])
+        ev = pd.DataFrame({
+            'event_time': [_time_key(t) for t in events['event_time']],
+            'signals': events['signals'].astype(str),
+            'max_value': events['max_value'],
+            'max_z': events['max_z'],
+            'max_rel_change': events['max_rel_change'],
+            'partition': events['partition'].astype(str) if 'partition' in events.columns else '',
+            'run_id': run_id
+        })
+        if coverage is None:
+            coverage = {p: (g.min(), g.max()) for p, g in ev.groupby('partition')['event_time']}
+        ranges = [(str(p), _time_key(start), _time_key(end)) for p, (start, end) in coverage.items()]
+        conn.executemany('DELETE FROM anomalies WHERE partition = ? AND event_time BETWEEN ? AND ?', ranges)
+        conn.executemany('DELETE FROM anomaly_signals WHERE partition = ? AND event_time BETWEEN ? AND ?', ranges)
+        if ev.empty:
+            return 0
+        conn.executemany(
+            'INSERT INTO anomalies (event_time, signals, max_value, max_z, max_rel_change, partition, run_id) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (event_time, partition) DO UPDATE SET '
+            'signals = excluded.signals, max_value = excluded.max_value, max_z = excluded.max_z, '
+            'max_rel_change = excluded.max_rel_change, run_id = excluded.run_id',
+            _records(ev, ANOMALY_COLUMNS))
+        # Signal index rows: replace those of every event this run touched
+        keys = list(zip(ev['event_time'], ev['partition']))
+        conn.executemany('DELETE FROM anomaly_signals WHERE event_time = ? AND partition = ?', keys)
+        conn.executemany('INSERT OR IGNORE INTO anomaly_signals (signal, event_time, partition) VALUES (?, ?, ?)',
+                         [(sig, t, p) for (t, p), sigs in zip(keys, ev['signals']) for sig in sigs.split(',') if sig])
+        return len(ev)
+
+    def _add_predictions(self, conn, run_id, preds):
+        if preds is None or preds.empty:
+            return 0
+        pr = preds.copy()
+        pr['forecast_time'] = [_time_key(t) for t in pr['forecast_time']]
+        pr['partition'] = pr['partition'].astype(str) if 'partition' in pr.columns else ''
+        if 'flag_upcoming_anomaly' in pr.columns:
+            pr['flag_upcoming_anomaly'] = pr['flag_upcoming_anomaly'].astype(bool).astype(int)
+        pr['run_id'] = run_id
+        # Forecasts of earlier runs for these hours are superseded, whichever signals they flagged
+        conn.executemany('DELETE FROM predictions WHERE partition = ? AND forecast_time BETWEEN ? AND ?',
+                         [(p, g.min(), g.max()) for p, g in pr.groupby('partition')['forecast_time']])
+        updates = ', '.join(f'{c} = excluded.{c}' for c in PREDICTION_COLUMNS
+                            if c not in ('signal', 'forecast_time', 'partition'))
+        conn.executemany(
+            f'INSERT INTO predictions ({", ".join(PREDICTION_COLUMNS)}) '
+            f'VALUES ({", ".join("?" * len(PREDICTION_COLUMNS))}) '
+            f'ON CONFLICT (forecast_time, signal, partition) DO UPDATE SET {updates}',
+            _records(pr, PREDICTION_COLUMNS))
+        return len(pr)
+
+    # -------------------------
+    # Querying
+    # -------------------------
+    @staticmethod
+    def _limit(limit):
+        return min(max(int(limit or DEFAULT_LIMIT), 1), MAX_LIMIT)
+
+    def _page(self, sql, args, time_col, limit):
+        rows = self._conn().execute(sql + f' LIMIT {limit + 1}', args).fetchall()
+        page = [dict(r) for r in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor(page[-1][time_col], page[-1]['id'])
+        for r in page:
+            r.pop('id')
+        return {'rows': page, 'count': len(page), 'next_cursor': next_cursor}
+
+    @staticmethod
+    def _filters(alias, time_col, start, end, partition, run_id, cursor):
+        where, args = [], []
+        if start is not None:
+            where.append(f'{alias}.{time_col} >= ?')
+            args.append(_time_key(start))
+        if end is not None:
+            where.append(f'{alias}.{time_col} <= ?')
+            args.append(_time_key(end))
+        if partition is not None:
+            where.append(f'{alias}.partition = ?')
+            args.append(partition)
+        if run_id is not None:
+            where.append(f'{alias}.run_id = ?')
+            args.append(run_id)
+        if cursor:
+            time_key, row_id = decode_cursor(cursor)
+            where.append(f'({alias}.{time_col} > ? OR ({alias}.{time_col} = ? AND {alias}.id > ?))')
+            args += [time_key, time_key, row_id]
+        return where, args
+
+    def query_anomalies(self, start=None, end=None, signal=None, partition=None, run_id=None,
+                        limit=DEFAULT_LIMIT, cursor=None):
+        """
+        One page of fused events ordered by event_time.
+
+        Returns {'rows': [...], 'count': n, 'next_cursor': str or None}; pass
+        next_cursor back (with the same filters) for the following page.
+        """
+        limit = self._limit(limit)
+        where, args = self._filters('a', 'event_time', start, end, partition, run_id, cursor)
+        if signal is not None:
+            sql = ('SELECT a.* FROM anomaly_signals s JOIN anomalies a '
+                   'ON a.event_time = s.event_time AND a.partition = s.partition')
+            where.insert(0, 's.signal = ?')
+            args.insert(0, signal)
+        else:
+            sql = 'SELECT a.* FROM anomalies a'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        return self._page(sql + ' ORDER BY a.event_time, a.id', args, 'event_time', limit)
+
+    def query_predictions(self, start=None, end=None, signal=None, partition=None, run_id=None,
+                          limit=DEFAULT_LIMIT, cursor=None, flagged_only=False):
+        """One page of forecasts ordered by forecast_time (same paging as query_anomalies)."""
+        limit = self._limit(limit)
+        where, args = self._filters('p', 'forecast_time', start, end, partition, run_id, cursor)
+        if signal is not None:
+            where.insert(0, 'p.signal = ?')
+            args.insert(0, signal)
+        if flagged_only:
+            where.append('p.flag_upcoming_anomaly = 1')
+        sql = 'SELECT p.* FROM predictions p'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        page = self._page(sql + ' ORDER BY p.forecast_time, p.id', args, 'forecast_time', limit)
+        for r in page['rows']:
+            if r['flag_upcoming_anomaly'] is not None:
+                r['flag_upcoming_anomaly'] = bool(r['flag_upcoming_anomaly'])
+        return page
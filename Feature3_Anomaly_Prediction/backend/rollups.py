@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Gyatah Rollups - pre-aggregated min/mean/max/count of every signal per day, week and month
+Built once per analysis from the merged hourly frame and saved next to the other outputs
+(rollups.npz), so chart requests over years of history are answered from a few hundred
+pre-computed buckets instead of tens of thousands of hourly points.
+"""
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+ROLLUP_FILE = 'rollups.npz'
+STATS = ('min', 'mean', 'max', 'count')
+
+# resolution -> (pandas resample rule, nominal bucket length in hours), finest first
+RESOLUTIONS = {
+    'hour': (None, 1),
+    'day': ('D', 24),
+    'week': ('W-MON', 24 * 7),
+    'month': ('MS', 24 * 30.44),
+}
+
+
+def build_rollups(merged, signals):
+    """
+    Aggregate the hourly signals of a merged frame at every resolution.
+
+    Returns:
+      {resolution: (timestamps datetime64[ns] (n,), stats float64 (n, signals, 4))}, with
+      stats in STATS order; 'hour' holds the hourly values themselves (min = mean = max).
+    """
+    signals = [s for s in signals if s in merged.columns]
+    hourly = merged.set_index(pd.DatetimeIndex(merged['timestamp']))[signals].astype(float)
+    values = hourly.to_numpy()
+    finite = np.isfinite(values)
+    rollups = {'hour': (hourly.index.to_numpy(dtype='datetime64[ns]'),
+                        np.stack([values, values, values, finite.astype(float)], axis=2))}
+    for res, (rule, _) in RESOLUTIONS.items():
+        if rule is None:
+            continue
+        # weeks are labelled by their Monday, months by their first day
+        grouped = hourly.resample(rule, label='left', closed='left')
+        stats = [grouped.min(), grouped.mean(), grouped.max(), grouped.count()]
+        rollups[res] = (stats[0].index.to_numpy(dtype='datetime64[ns]'),
+                        np.stack([s.to_numpy(dtype=float) for s in stats], axis=2))
+    return rollups
+
+
+def save_rollups(rollups, signals, path):
+    """Write build_rollups() output as one uncompressed .npz (atomic replace)."""
+    arrays = {'signals': np.array(signals, dtype=str)}
+    for res, (ts, stats) in rollups.items():
+        arrays[f'{res}_timestamp'] = ts
+        arrays[f'{res}_stats'] = stats
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+def pick_resolution(start, end, width):
+    """Finest resolution whose bucket count over start..end fits in `width` points (coarsest as a last resort)."""
+    hours = max((pd.Timestamp(end) - pd.Timestamp(start)) / pd.Timedelta(hours=1), 1.0)
+    for res, (_, bucket_hours) in RESOLUTIONS.items():
+        if hours / bucket_hours <= width:
+            return res
+    return list(RESOLUTIONS)[-1]
+
+
+def _jsonable(values):
+    """Float array as a list with None for NaN (valid JSON)."""
+    out = values.astype(object)
+    out[np.isnan(values)] = None
+    return out.tolist()
+
+
+class RollupReader:
+    """Reads a rollups.npz, reloading it only when the file changes (shared by the HTTP workers)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = {}  # abspath -> ((mtime_ns, size), {name: array})
+
+    def _arrays(self, path):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self.lock:
+            entry = self.loaded.get(path)
+            if entry is not None and entry[0] == stamp:
+                return entry[1]
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {k: data[k] for k in data.files}
+        with self.lock:
+            self.loaded[path] = (stamp, arrays)
+        return arrays
+
+    def series(self, path, signals, start=None, end=None, width=1000, resolution=None):
+        """
+        Chart payload for signals between start and end, at `resolution` or the one chosen by
+        pick_resolution() for `width` points.
+
+        Returns {'resolution', 'timestamps', 'series': {signal: {'min', 'mean', 'max', 'count'}}}
+        with NaN for empty buckets; KeyError for an unknown signal or resolution.
+        """
+        arrays = self._arrays(path)
+        names = arrays['signals'].tolist()
+        missing = [s for s in signals if s not in names]
+        if missing:
+            raise KeyError(f"unknown signal(s): {', '.join(missing)}")
+        if resolution is not None and resolution not in RESOLUTIONS:
+            raise KeyError(f"unknown resolution: {resolution}")
+
+        hourly_ts = arrays['hour_timestamp']
+        lo = np.datetime64(pd.Timestamp(start)) if start is not None else hourly_ts[0] if len(hourly_ts) else None
+        hi = np.datetime64(pd.Timestamp(end)) if end is not None else hourly_ts[-1] if len(hourly_ts) else None
+        if resolution is None:
+            resolution = pick_resolution(lo, hi, width) if lo is not None else 'hour'
+
+        ts = arrays[f'{resolution}_timestamp']
+        stats = arrays[f'{resolution}_stats']
+        # buckets overlapping [lo, hi]: the one containing lo (labelled at its start) onwards
+        i0 = max(int(np.searchsorted(ts, lo, side='right')) - 1, 0) if lo is not None else 0
+        i1 = int(np.searchsorted(ts, hi, side='right')) if hi is not None else len(ts)
+        cols = [names.index(s) for s in signals]
+        return {
+            'resolution': resolution,
+            'timestamps': pd.DatetimeIndex(ts[i0:i1]).strftime('%Y-%m-%d %H:%M:%S').tolist(),
+            'series': {s: {stat: _jsonable(stats[i0:i1, c, k]) for k, stat in enumerate(STATS)}
+                       for s, c in zip(signals, cols)}
+        }
@@ -1,17 +1,32 @@
 #!/usr/bin/env python3
 
+from bisect import bisect_left, insort
 from datetime import datetime
 import os
 import sys
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
 
 # -------------------------
 # Demo data generator
 # -------------------------
-def generate_demo_data(start='2024-11-01', hours=24*7, seed=0):
+def generate_demo_data(start='2024-11-01', hours=24*7, seed=0, sensors=1, anomaly_rate=0.0):
+    """
+    Synthetic Pune smart-city + AQI frames.
+
+    sensors > 1 stacks that many independent stations (rows x sensors, distinct
+    City and coordinates); anomaly_rate is the fraction of hours that get an
+    extra injected spike per frame, for benchmarking at scale.
+    """
+    if sensors > 1:
+        frames = [generate_demo_data(start, hours, seed + i, anomaly_rate=anomaly_rate) for i in range(sensors)]
+        for i, (p, a) in enumerate(frames[1:], 1):
+            p['Lattitude'] += 0.01 * i
+            p['Longitude'] += 0.01 * i
+            a['City'] = f'Pune-{i}'
+        return (pd.concat([p for p, _ in frames], ignore_index=True),
+                pd.concat([a for _, a in frames], ignore_index=True))
+
     rng = pd.date_range(start=start, periods=hours, freq='h')
     np.random.seed(seed)
     hour = rng.hour
@@ -66,75 +81,1148 @@ def generate_demo_data(start='2024-11-01', hours=24*7, seed=0):
     })
     # inject anomalies
     if len(rng) > 150:
-        aqi.loc[rng[100], 'PM2.5'] += 120
-        pune.loc[rng[150], 'traffic_count'] += 800
+        aqi.loc[100, 'PM2.5'] += 120
+        pune.loc[150, 'traffic_count'] += 800
+    if anomaly_rate > 0:
+        spikes = np.random.RandomState(seed + 7919)
+        n = min(len(rng), int(round(len(rng) * anomaly_rate)))
+        for frame, cols in ((aqi, ['PM2.5', 'PM10', 'NO2', 'AQI']), (pune, ['traffic_count', 'PM2_MAX', 'SOUND'])):
+            rows = spikes.choice(len(rng), n, replace=False)
+            which = spikes.randint(0, len(cols), n)
+            for j, col in enumerate(cols):
+                hit = rows[which == j]
+                frame.loc[hit, col] *= spikes.uniform(4.0, 8.0, len(hit))
     return pune, aqi
 
 # -------------------------
 # Helpers
 # -------------------------
+# Signals monitored by the detectors (only those present in the merged frame are used)
+CANDIDATE_SIGNALS = [
+    "PM2_MAX","PM2_MIN","PM10_MAX","PM10_MIN",
+    "NO_MAX","NO_MIN","NO2_MAX","NO2_MIN",
+    "OZONE_MAX","OZONE_MIN","SO2_MAX","SO2_MIN",
+    "CO_MAX","CO_MIN","AQI","PM2.5","PM10","NO2","CO","SO2","O3",
+    "traffic_count","Vehicle Count","Industrial Activity Index","SOUND"
+]
+
 def rolling_zscore(series, window=24):
     mu = series.rolling(window=window, min_periods=max(3, window//4)).mean()
     sd = series.rolling(window=window, min_periods=max(3, window//4)).std().replace(0, np.nan)
     z = (series - mu) / sd
     return z.fillna(0)
 
+def _rolling_window_sum(block, window):
+    """Trailing rolling sum along axis 0 of a 2-D block (partial windows at the start)."""
+    if window <= 8:
+        # short windows: a few shifted adds beat a cumulative sum
+        out = block.copy(order='K')
+        for k in range(1, min(window, len(block))):
+            out[k:] += block[:-k]
+        return out
+    csum = np.cumsum(block, axis=0)
+    if window >= len(block):
+        return csum
+    out = np.empty_like(csum)
+    out[:window] = csum[:window]
+    np.subtract(csum[window:], csum[:-window], out=out[window:])
+    return out
+
+def _rolling_window_count(finite, window):
+    """Number of finite observations in each trailing window."""
+    if finite.all():
+        return np.minimum(np.arange(1, len(finite) + 1), window).astype(float)[:, None]
+    return _rolling_window_sum(finite.astype(float), window)
+
+def anomaly_score_matrix(block, smooth_window=3, window=24):
+    """
+    Score every column of a (rows x signals) float block in one pass.
+
+    Mirrors detect_anomaly() column by column: rolling-mean smoothing with
+    min_periods=1, a trailing rolling z-score (see rolling_zscore) and the
+    relative jump against the previous smoothed value.
+
+    Returns:
+      (smoothed, z, jump) arrays with the same shape as block.
+    """
+    # column-major so every rolling pass walks contiguous memory
+    block = np.asfortranarray(block, dtype=float)
+    if block.ndim == 1:
+        block = block[:, None]
+
+    # smoothing: NaN-aware rolling mean, min_periods=1
+    finite = np.isfinite(block)
+    cnt = _rolling_window_count(finite, smooth_window)
+    tot = _rolling_window_sum(block if finite.all() else np.where(finite, block, 0.0), smooth_window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        s = tot / cnt
+
+    # rolling z-score: same min_periods and ddof as rolling_zscore().
+    # Values are centered on their column mean so the cumulative sums of
+    # squares stay small and the windowed variance keeps its precision.
+    finite = np.isfinite(s)
+    all_finite = finite.all()
+    n = _rolling_window_count(finite, window)
+    if all_finite:
+        c = s - s.mean(axis=0)
+    else:
+        offset = np.where(finite, s, 0.0).sum(axis=0) / np.maximum(finite.sum(axis=0), 1)
+        c = np.where(finite, s - offset, 0.0)
+    sum1 = _rolling_window_sum(c, window)
+    sum2 = _rolling_window_sum(c * c, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mu = sum1 / n
+        var = (sum2 - sum1 * mu) / (n - 1)
+    # pandas reports an exact 0 std for constant windows; the cumulative sums
+    # leave rounding noise there instead, so detect constant runs explicitly
+    changed = np.zeros(s.shape, order='F')
+    changed[1:] = s[1:] != s[:-1]
+    if not all_finite:
+        changed[1:] *= finite[1:] & finite[:-1]
+    varying = _rolling_window_sum(changed, max(window - 1, 1)) > 0
+    valid = (n >= max(3, window // 4)) & finite & varying & (var > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.where(valid, (c - mu) / np.sqrt(var), 0.0)
+
+    # relative jump against the previous smoothed value
+    prev = np.empty_like(s)
+    prev[0] = np.nan
+    prev[1:] = s[:-1]
+    prev[prev == 0] = np.nan
+    with np.errstate(invalid='ignore', divide='ignore'):
+        jump = np.abs(s - prev) / prev
+    jump[np.isnan(jump)] = 0.0
+    return s, z, jump
+
+class RollingMedianMAD:
+    """
+    Sliding-window median and MAD (median absolute deviation from the median).
+
+    The window is kept as a sorted list, updated per step with a binary-search
+    insert and delete (a memmove of at most `window` slots). The median is read
+    by index. The MAD is the median of two sorted distance sequences: the values
+    below the median, walking down, and those above it, walking up. It is found by
+    binary search for the k-th smallest element of their union, in O(log w),
+    without re-sorting the window. NaN values take a slot in the window but are
+    not counted.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.ring = [np.nan] * window
+        self.sorted = []
+        self.n_seen = 0
+
+    def push(self, x):
+        """Add one value (evicting the oldest once the window is full); returns (median, mad, count)."""
+        i = self.n_seen % self.window
+        old = self.ring[i]
+        srt = self.sorted
+        if old == old:  # not NaN
+            del srt[bisect_left(srt, old)]
+        self.ring[i] = x
+        if x == x:
+            insort(srt, x)
+        self.n_seen += 1
+        n = len(srt)
+        if not n:
+            return np.nan, np.nan, 0
+        h = n // 2
+        if n % 2:
+            med = srt[h]
+            mad = _kth_distance(srt, h, med, h)
+        else:
+            med = (srt[h - 1] + srt[h]) / 2
+            mad = (_kth_distance(srt, h, med, h - 1) + _kth_distance(srt, h, med, h)) / 2
+        return med, mad, n
+
+def _kth_distance(srt, h, m, k):
+    """
+    k-th smallest (0-based) of |srt[i] - m| for a sorted list split at h (srt[:h] <= m <= srt[h:]).
+
+    A[i] = m - srt[h-1-i] and B[j] = srt[h+j] - m are both ascending; binary search for
+    how many of the k+1 smallest come from A.
+    """
+    na, nb = h, len(srt) - h
+    lo, hi = max(0, k + 1 - nb), min(k + 1, na)
+    while lo < hi:
+        i = (lo + hi) // 2
+        if m - srt[h - 1 - i] < srt[h + k - i] - m:  # A[i] < B[k-i]: take more from A
+            lo = i + 1
+        else:
+            hi = i
+    a = m - srt[h - lo] if lo > 0 else -np.inf
+    b = srt[h + k - lo] - m if k - lo >= 0 else -np.inf
+    return max(a, b)
+
+def rolling_median_mad(values, window=24):
+    """Trailing rolling median, MAD and finite-value count of a 1-D array (RollingMedianMAD per step)."""
+    roll = RollingMedianMAD(window)
+    out = np.array([roll.push(x) for x in np.asarray(values, dtype=float).tolist()], dtype=float).reshape(-1, 3)
+    return out[:, 0], out[:, 1], out[:, 2]
+
+def robust_zscore(values, window=24):
+    """
+    Robust counterpart of rolling_zscore(): (x - rolling median) / (1.4826 * rolling MAD).
+
+    A spike moves the median and MAD far less than the mean and std, so one
+    spike does not mask the next one in the same window. Same min_periods as
+    rolling_zscore(); 0 where the MAD is 0 or too few values are available.
+    """
+    values = np.asarray(values, dtype=float)
+    med, mad, n = rolling_median_mad(values, window)
+    valid = (n >= max(3, window // 4)) & (mad > 0) & np.isfinite(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(valid, (values - med) / (1.4826 * mad), 0.0)
+
+def _nan_quantiles(values, qs, axis):
+    """np.nanquantile (linear) along an axis via one sort, without nanquantile's per-column Python loop."""
+    srt = np.moveaxis(np.sort(values, axis=axis), axis, -1)  # NaN sorts last
+    last = np.maximum(np.isfinite(srt).sum(axis=-1) - 1, 0)
+    out = []
+    for q in qs:
+        pos = q * last
+        lo = np.floor(pos).astype(np.int64)
+        a = np.take_along_axis(srt, lo[..., None], axis=-1)[..., 0]
+        b = np.take_along_axis(srt, np.minimum(lo + 1, last)[..., None], axis=-1)[..., 0]
+        out.append(a + (b - a) * (pos - lo))
+    return out
+
+def seasonal_slot(timestamps, period=168):
+    """Slot of each timestamp in a cycle of `period` hours starting Monday 00:00 (168: hour of week)."""
+    hours = np.asarray(timestamps, dtype='datetime64[h]').astype(np.int64)
+    return (hours - 96) % period  # 1970-01-05 (hour 96) was a Monday
+
+class SeasonalProfile:
+    """
+    Per-signal seasonal baseline: median and spread of each hour-of-week slot.
+
+    Every slot keeps the values of its last `weeks` occurrences in a ring
+    (period x weeks x signals), so the history held is bounded. The
+    median and spread (IQR / 1.349, at least min_spread x |median| so a few
+    near-identical weeks do not make every small wobble an anomaly) are cached
+    per slot. Scoring a point is a
+    table lookup: (x - median[slot]) / spread[slot]. update() only marks the
+    slots it writes as dirty, and refresh() recomputes just those slots. This
+    happens automatically every `refresh_every` observations, or on demand.
+    Rows at or before the last timestamp seen are ignored, so feeding
+    overlapping batches does not count the same hour twice. The ring also
+    records the hour of each value, so score_update() can score any row against
+    the values that came before it. State round-trips through to_dict() /
+    from_dict() and save() / load() (JSON).
+    """
+
+    NO_HOUR = np.iinfo(np.int64).min  # ring entry never written (or loaded from a profile without hours)
+
+    def __init__(self, signals, period=168, weeks=8, min_count=3, min_spread=0.05, refresh_every=24):
+        self.signals = list(signals)
+        self.period = period
+        self.weeks = weeks
+        self.min_count = min_count
+        self.min_spread = min_spread
+        self.refresh_every = refresh_every
+        self.last_timestamp = None
+        self.pending = 0
+        k = len(self.signals)
+        self.values = np.full((period, weeks, k), np.nan)
+        self.hours = np.full((period, weeks), self.NO_HOUR, dtype=np.int64)  # hours since epoch per ring entry
+        self.n_obs = np.zeros(period, dtype=np.int64)
+        self.dirty = np.zeros(period, dtype=bool)
+        self.median = np.full((period, k), np.nan)
+        self.spread = np.full((period, k), np.nan)
+        self.count = np.zeros((period, k), dtype=np.int64)
+
+    @classmethod
+    def from_history(cls, df, signals=None, **kwargs):
+        """Profile built from every row of an hourly frame (e.g. the merged frame)."""
+        if signals is None:
+            signals = [s for s in CANDIDATE_SIGNALS if s in df.columns]
+        prof = cls(signals, **kwargs)
+        prof.update(df['timestamp'], df[prof.signals].to_numpy(dtype=float))
+        prof.refresh()
+        return prof
+
+    def add_signals(self, signals):
+        """Start tracking signals not in the profile yet (empty history)."""
+        new = [s for s in signals if s not in self.signals]
+        if not new:
+            return
+        pad = len(new)
+        self.signals += new
+        self.values = np.concatenate([self.values, np.full((self.period, self.weeks, pad), np.nan)], axis=2)
+        self.median = np.concatenate([self.median, np.full((self.period, pad), np.nan)], axis=1)
+        self.spread = np.concatenate([self.spread, np.full((self.period, pad), np.nan)], axis=1)
+        self.count = np.concatenate([self.count, np.zeros((self.period, pad), dtype=np.int64)], axis=1)
+
+    def _new_rows(self, timestamps, block):
+        """
+        Rows of a (time, signals) block newer than the last timestamp seen, in time order.
+
+        Returns (row indices into the block, timestamps, values, slot, rank of the row among
+        the batch's rows of its slot).
+        """
+        ts = np.asarray(timestamps, dtype='datetime64[ns]')
+        block = np.asarray(block, dtype=float).reshape(len(ts), len(self.signals))
+        keep = ~np.isnat(ts)
+        if self.last_timestamp is not None:
+            keep &= ts > np.datetime64(self.last_timestamp, 'ns')
+        rows = np.flatnonzero(keep)
+        rows = rows[np.argsort(ts[rows], kind='stable')]
+        slot = seasonal_slot(ts[rows], self.period)
+        # group by slot with one stable sort
+        by_slot = np.argsort(slot, kind='stable')
+        grouped = slot[by_slot]
+        rank = np.empty_like(slot)
+        rank[by_slot] = np.arange(len(slot)) - np.searchsorted(grouped, grouped)
+        return rows, ts[rows], block[rows], slot, rank
+
+    def _add(self, ts, values, slot, rank):
+        counts = np.bincount(slot, minlength=self.period)
+        newest = rank >= counts[slot] - self.weeks  # only the newest `weeks` of a slot stay in the ring
+        pos = (self.n_obs[slot] + rank) % self.weeks
+        self.values[slot[newest], pos[newest]] = values[newest]
+        self.hours[slot[newest], pos[newest]] = np.asarray(ts, dtype='datetime64[h]').astype(np.int64)[newest]
+        self.n_obs += counts
+        self.dirty |= counts > 0
+        self.last_timestamp = pd.Timestamp(ts[-1])
+        self.pending += len(ts)
+        if self.pending >= self.refresh_every:
+            self.refresh()
+
+    def update(self, timestamps, block):
+        """
+        Add the rows of a (time, signals) block newer than the last timestamp seen.
+
+        Args:
+          timestamps: row timestamps.
+          block: values (n, len(self.signals)) in self.signals order.
+
+        Returns:
+          number of rows added.
+        """
+        rows, ts, values, slot, rank = self._new_rows(timestamps, block)
+        if len(rows):
+            self._add(ts, values, slot, rank)
+        return len(rows)
+
+    def score_update(self, timestamps, block):
+        """
+        Score a block and add its new rows, as if each row were scored and then added in time order.
+
+        Every row, new or already covered by the profile, is scored against the last
+        `weeks` values of its slot at earlier hours: the stored ring plus earlier rows
+        of the block (the block's value wins where both hold an hour). A long history
+        is not judged against the baseline of its final weeks, and re-scoring the same
+        or a longer history gives the first pass's z-scores. A block that starts inside
+        the stored range only matches from its `weeks`-th occurrence of each slot on:
+        older values have left the ring. Returns z-scores like score() (NaN for rows
+        without a timestamp).
+        """
+        ts = np.asarray(timestamps, dtype='datetime64[ns]')
+        block = np.asarray(block, dtype=float).reshape(len(ts), len(self.signals))
+        z = np.full(block.shape, np.nan)
+        timed = np.flatnonzero(~np.isnat(ts))
+        if len(timed):
+            z[timed] = self._score_before(ts[timed], block[timed])
+        rows, ts, values, slot, rank = self._new_rows(timestamps, block)
+        if len(rows):
+            self._add(ts, values, slot, rank)
+            self.refresh()
+        return z
+
+    def _score_before(self, ts, values):
+        """Z-score of each row against the last `weeks` values of its slot at earlier hours."""
+        from numpy.lib.stride_tricks import sliding_window_view
+        hours = ts.astype('datetime64[h]').astype(np.int64)
+        slot = seasonal_slot(ts, self.period)
+        # Ring entries oldest first (stable sorting keeps that order for entries without an hour)
+        ring = (self.n_obs[:, None] + np.arange(self.weeks)) % self.weeks
+        ring_hours = np.take_along_axis(self.hours, ring, axis=1).ravel()
+        ring_values = self.values[np.arange(self.period)[:, None], ring].reshape(-1, len(self.signals))
+        keep = ~np.isin(ring_hours, hours)
+        all_slot = np.concatenate([np.repeat(np.arange(self.period), self.weeks)[keep], slot])
+        all_hours = np.concatenate([ring_hours[keep], hours])
+        order = np.lexsort((all_hours, all_slot))
+        grouped = all_slot[order]
+        rank = np.empty_like(all_slot)
+        rank[order] = np.arange(len(order)) - np.searchsorted(grouped, grouped)
+        # per slot: its values in hour order, after `weeks` empty entries
+        seq = np.full((self.period, self.weeks + int(rank.max()) + 1, len(self.signals)), np.nan)
+        seq[all_slot, self.weeks + rank] = np.concatenate([ring_values[keep], values])
+        row_rank = rank[len(all_slot) - len(slot):]
+        before = sliding_window_view(seq, self.weeks, axis=1)[slot, row_rank]  # (rows, signals, weeks)
+        q1, med, q3 = _nan_quantiles(before, [0.25, 0.5, 0.75], axis=-1)
+        spread = np.maximum((q3 - q1) / 1.349, self.min_spread * np.abs(med))
+        valid = (np.isfinite(before).sum(axis=-1) >= self.min_count) & (spread > 0) & np.isfinite(values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(valid, (values - med) / spread, np.nan)
+
+    def refresh(self):
+        """Recompute median / spread / count of the dirty slots only; returns how many were refreshed."""
+        slots = np.flatnonzero(self.dirty)
+        if len(slots):
+            vals = self.values[slots]
+            q1, med, q3 = _nan_quantiles(vals, [0.25, 0.5, 0.75], axis=1)
+            self.median[slots] = med
+            self.spread[slots] = np.maximum((q3 - q1) / 1.349, self.min_spread * np.abs(med))
+            self.count[slots] = np.isfinite(vals).sum(axis=1)
+            self.dirty[slots] = False
+        self.pending = 0
+        return len(slots)
+
+    def score(self, timestamps, block):
+        """
+        Seasonal z-scores of a (time, signals) block, by lookup of each row's slot.
+
+        NaN where the slot has fewer than min_count values, no spread, or the value is missing.
+        """
+        slot = seasonal_slot(timestamps, self.period)
+        block = np.asarray(block, dtype=float).reshape(len(slot), len(self.signals))
+        spread = self.spread[slot]
+        valid = (self.count[slot] >= self.min_count) & (spread > 0) & np.isfinite(block)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(valid, (block - self.median[slot]) / spread, np.nan)
+
+    def info(self):
+        return {
+            'signals': self.signals,
+            'period': self.period,
+            'weeks': self.weeks,
+            'observations': int(self.n_obs.sum()),
+            'slots_ready': int((self.count >= self.min_count).all(axis=1).sum()) if self.signals else 0,
+            'last_timestamp': None if self.last_timestamp is None else str(self.last_timestamp)
+        }
+
+    def to_dict(self):
+        """JSON-serializable snapshot of the profile (ring values included; stats are recomputed on load)."""
+        return {
+            'signals': self.signals,
+            'period': self.period,
+            'weeks': self.weeks,
+            'min_count': self.min_count,
+            'min_spread': self.min_spread,
+            'refresh_every': self.refresh_every,
+            'last_timestamp': None if self.last_timestamp is None else str(self.last_timestamp),
+            'n_obs': self.n_obs.tolist(),
+            'hours': self.hours.tolist(),
+            'values': self.values.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        prof = cls(state['signals'], period=state['period'], weeks=state['weeks'], min_count=state['min_count'],
+                   min_spread=state['min_spread'], refresh_every=state['refresh_every'])
+        prof.last_timestamp = pd.Timestamp(state['last_timestamp']) if state['last_timestamp'] else None
+        prof.n_obs = np.array(state['n_obs'], dtype=np.int64)
+        prof.values = np.array(state['values'], dtype=float).reshape(prof.period, prof.weeks, len(prof.signals))
+        if 'hours' in state:
+            prof.hours = np.array(state['hours'], dtype=np.int64).reshape(prof.period, prof.weeks)
+        prof.dirty[:] = prof.n_obs > 0
+        prof.refresh()
+        return prof
+
+    def save(self, path):
+        """Write the profile as JSON (atomically: readers see the old or the new profile)."""
+        import json
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        import json
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+# Detector engines selectable per signal (detect_anomalies_matrix(methods=...))
+DETECTORS = ('zscore', 'robust', 'seasonal')
+
+def score_matrix(block, signals, methods=None, smooth_window=3, window=24, timestamps=None, profile=None):
+    """
+    anomaly_score_matrix() with a per-signal choice of engine.
+
+    methods: {signal: 'zscore' | 'robust' | 'seasonal'}; signals not listed use 'zscore'.
+    Other engines keep the same smoothing and jump and only swap the z column:
+    robust uses the rolling median/MAD (robust_zscore on the smoothed values), and
+    seasonal scores the smoothed values against their hour-of-week slot of a
+    SeasonalProfile (each row against the earlier weeks of its slot). A slot with
+    too little history keeps the rolling z-score. Seasonal signals need the row
+    timestamps. profile is an existing SeasonalProfile, e.g. loaded from a previous
+    run; the rows newer than its last timestamp are scored and added to it. Without
+    one, a profile is built from this block.
+    """
+    methods = methods or {}
+    unknown = {m for m in methods.values() if m not in DETECTORS}
+    if unknown:
+        raise ValueError(f"Unknown detector(s): {', '.join(sorted(unknown))} (expected one of {', '.join(DETECTORS)})")
+    s, z, jump = anomaly_score_matrix(block, smooth_window=smooth_window, window=window)
+    for k, sig in enumerate(signals):
+        if methods.get(sig) == 'robust':
+            z[:, k] = robust_zscore(s[:, k], window)
+    seasonal = [k for k, sig in enumerate(signals) if methods.get(sig) == 'seasonal']
+    if seasonal:
+        if timestamps is None:
+            raise ValueError("The seasonal detector needs the row timestamps")
+        names = [signals[k] for k in seasonal]
+        if profile is None:
+            profile = SeasonalProfile(names)
+        profile.add_signals(names)
+        cols = [profile.signals.index(sig) for sig in names]
+        values = np.full((len(s), len(profile.signals)), np.nan)
+        values[:, cols] = s[:, seasonal]
+        zs = profile.score_update(timestamps, values)[:, cols]
+        z[:, seasonal] = np.where(np.isnan(zs), z[:, seasonal], zs)
+    return s, z, jump
+
+def detect_anomalies_matrix(df, signals, z_threshold=3.0, jump_threshold=0.6, smooth_window=3, window=24,
+                            scores=None, methods=None):
+    """
+    Detect spike anomalies for all signals at once and return one tidy DataFrame of events.
+
+    Columns: timestamp | signal | value | z_score | jump, ordered by signal
+    (in the order given) and then by time, i.e. the same rows as concatenating
+    detect_anomaly() over each signal. scores: (smoothed, z, jump) already computed
+    by score_matrix() for exactly these signals (e.g. shared with a sweep);
+    methods: per-signal detector engine (see score_matrix).
+    """
+    signals = [c for c in signals if c in df.columns]
+    if not signals:
+        return pd.DataFrame(columns=['timestamp','signal','value','z_score','jump'])
+    if scores is None:
+        block = df[signals].to_numpy(dtype=float)
+        scores = score_matrix(block, signals, methods, smooth_window=smooth_window, window=window,
+                              timestamps=df['timestamp'])
+    s, z, jump = scores
+    mask = (np.abs(z) >= z_threshold) & (jump >= jump_threshold)
+    # transpose so hits come out signal-major
+    cols, rows = np.nonzero(mask.T)
+    return pd.DataFrame({
+        'timestamp': df['timestamp'].to_numpy()[rows],
+        'signal': np.asarray(signals, dtype=object)[cols],
+        'value': s[rows, cols],
+        'z_score': z[rows, cols],
+        'jump': jump[rows, cols]
+    })
+
+def sweep_thresholds(df, signals, z_grid, rel_grid, smooth_window=3, window=24, tolerance='60min',
+                     scores=None, methods=None):
+    """
+    Anomaly and fused-event counts for every (z, rel) threshold pair from one scoring pass.
+
+    Smoothing, rolling z-scores and jumps do not depend on the thresholds, so they
+    are computed once; every grid cell is then a comparison over the points that
+    pass the loosest cell. Cell (i, j) matches running detect_anomalies_matrix()
+    with z_grid[i], rel_grid[j] followed by fuse_events(tolerance).
+
+    Returns:
+      dict with z_grid, rel_grid and len(z_grid) x len(rel_grid) lists 'anomalies'
+      and 'events', plus 'per_signal' {signal: anomaly-count grid}.
+    """
+    z_grid = np.sort(np.asarray(z_grid, dtype=float))
+    rel_grid = np.sort(np.asarray(rel_grid, dtype=float))
+    signals = [c for c in signals if c in df.columns]
+    shape = (len(z_grid), len(rel_grid))
+    result = {'z_grid': z_grid.tolist(), 'rel_grid': rel_grid.tolist(),
+              'anomalies': np.zeros(shape, dtype=int).tolist(), 'events': np.zeros(shape, dtype=int).tolist(),
+              'per_signal': {}}
+    if not signals or not len(z_grid) or not len(rel_grid):
+        return result
+    if scores is None:
+        scores = score_matrix(df[signals].to_numpy(dtype=float), signals, methods,
+                              smooth_window=smooth_window, window=window, timestamps=df['timestamp'])
+    _, z, jump = scores
+
+    # candidates: points flagged by the loosest thresholds, in time order
+    az = np.abs(z)
+    rows, cols = np.nonzero((az >= z_grid[0]) & (jump >= rel_grid[0]))
+    ts = df['timestamp'].to_numpy(dtype='datetime64[ns]').view('int64')[rows]
+    cz, cj = az[rows, cols], jump[rows, cols]
+
+    # hit[i, j, k]: candidate k flagged in cell (i, j)
+    hit = (cz[None, None, :] >= z_grid[:, None, None]) & (cj[None, None, :] >= rel_grid[None, :, None])
+    result['anomalies'] = hit.sum(axis=2).tolist()
+    result['per_signal'] = {sig: hit[:, :, cols == k].sum(axis=2).tolist() for k, sig in enumerate(signals)}
+
+    # events, as fuse_events() does it: a hit starts a new event when it follows the
+    # previous hit of the same cell by at least the tolerance
+    tol = pd.Timedelta(tolerance).value
+    last = np.where(hit, ts[None, None, :], np.iinfo(np.int64).min)
+    np.maximum.accumulate(last, axis=2, out=last)
+    prev = np.full_like(last, np.iinfo(np.int64).min)
+    prev[:, :, 1:] = last[:, :, :-1]
+    with np.errstate(over='ignore'):
+        gap = ts[None, None, :] - prev
+    new_event = hit & ((prev == np.iinfo(np.int64).min) | (gap >= tol))
+    result['events'] = new_event.sum(axis=2).tolist()
+    return result
+
 def detect_anomaly(df, column, z_threshold=3.0, jump_threshold=0.6, smooth_window=3):
     """Detect spike anomalies for a single column and return DataFrame of events."""
     if column not in df.columns:
         return pd.DataFrame(columns=['timestamp','signal','value','z_score','jump'])
-    s = df[column].astype(float).rolling(smooth_window, min_periods=1).mean()
-    z = rolling_zscore(s, window=24)
-    prev = s.shift(1)
-    jump = ((s - prev).abs() / prev.replace(0, np.nan)).fillna(0)
-    mask = (z.abs() >= z_threshold) & (jump >= jump_threshold)
-    out = df.loc[mask, ['timestamp']].copy()
-    out['signal'] = column
-    out['value'] = s[mask]
-    out['z_score'] = z[mask]
-    out['jump'] = jump[mask]
-    return out.reset_index(drop=True)
-
-def hourly_align_merge_safe(pune_df, aqi_df):
-    """Safely parse timestamps, coerce numeric columns, resample hourly, and merge numeric-only."""
+    return detect_anomalies_matrix(df, [column], z_threshold=z_threshold,
+                                   jump_threshold=jump_threshold, smooth_window=smooth_window)
+
+def fuse_events(anomalies, tolerance='60min'):
+    """
+    Fuse per-signal anomalies that occur close together in time into multi-signal events.
+
+    One sorted sweep: an anomaly joins the current event when it follows the
+    previous anomaly by less than `tolerance`, otherwise it starts a new event.
+    Unlike bucketing by rounded time, events are never split at a bucket edge.
+    On hourly data the default 60min tolerance fuses anomalies sharing a timestamp.
+
+    Args:
+      anomalies: DataFrame (or list of DataFrames) with timestamp | signal | value | z_score | jump.
+      tolerance: maximum gap between consecutive anomalies of one event (Timedelta or string).
+
+    Returns:
+      DataFrame: event_time | signals | max_value | max_z | max_rel_change, ordered by time.
+    """
+    if isinstance(anomalies, (list, tuple)):
+        anomalies = [a for a in anomalies if a is not None and not a.empty]
+        anomalies = pd.concat(anomalies, ignore_index=True) if anomalies else None
+    if anomalies is None or anomalies.empty:
+        return pd.DataFrame(columns=['event_time','signals','max_value','max_z','max_rel_change'])
+
+    ts = pd.to_datetime(anomalies['timestamp']).to_numpy(dtype='datetime64[ns]').view('int64')
+    order = np.argsort(ts, kind='stable')
+    ts = ts[order]
+    # event boundaries: gap to the previous anomaly >= tolerance
+    tol = pd.Timedelta(tolerance).value
+    new_event = np.ones(len(ts), dtype=bool)
+    new_event[1:] = np.diff(ts) >= tol
+    starts = np.flatnonzero(new_event)
+
+    def event_max(col):
+        return np.fmax.reduceat(anomalies[col].to_numpy(dtype=float)[order], starts)
+
+    # signal lists from categorical codes; categories are sorted, so sets come out sorted
+    cat = pd.Categorical(anomalies['signal'].astype(str))
+    names = np.asarray(cat.categories, dtype=object)
+    codes = cat.codes[order].astype(np.int64)
+    if len(names) <= 63:
+        # one bitmask per event; only the distinct combinations are turned into strings
+        masks = np.bitwise_or.reduceat(np.left_shift(1, codes), starts)
+        uniq, inverse = np.unique(masks, return_inverse=True)
+        labels = np.array([','.join(names[[b for b in range(len(names)) if m >> b & 1]]) for m in uniq], dtype=object)
+        signals = labels[inverse.ravel()]
+    else:
+        event_id = np.cumsum(new_event) - 1
+        pairs = np.unique(event_id * len(names) + codes)
+        pair_event = pairs // len(names)
+        parts = np.array([n + ',' for n in names], dtype=object)[pairs % len(names)]
+        firsts = np.flatnonzero(np.r_[True, pair_event[1:] != pair_event[:-1]])
+        signals = np.array([j[:-1] for j in np.add.reduceat(parts, firsts)], dtype=object)
+
+    return pd.DataFrame({
+        'event_time': ts[starts].view('datetime64[ns]'),
+        'signals': signals,
+        'max_value': event_max('value'),
+        'max_z': event_max('z_score'),
+        'max_rel_change': event_max('jump')
+    })
+
+# -------------------------
+# Streaming detector (one new hourly row at a time)
+# -------------------------
+class StreamingDetector:
+    """
+    Stateful, incremental counterpart of detect_anomaly() for live hourly feeds.
+
+    Keeps per-signal ring buffers of the last raw values (smoothing window) and
+    smoothed values (z-score window) with running sums, so each new row is
+    scored in O(1) per signal with the same smoothing, 24h rolling z-score and
+    jump rule as the batch detectors. State round-trips through to_dict() /
+    from_dict() and save() / load() (JSON).
+    """
+
+    RESYNC_EVERY = 1024  # rebuild running sums from the buffers to stop float drift
+
+    def __init__(self, signals, z_threshold=3.0, jump_threshold=0.6, smooth_window=3, window=24):
+        self.signals = list(signals)
+        self.z_threshold = z_threshold
+        self.jump_threshold = jump_threshold
+        self.smooth_window = smooth_window
+        self.window = window
+        self.min_periods = max(3, window // 4)
+        k = len(self.signals)
+        self.n_seen = 0
+        self.last_timestamp = None
+        self.raw = np.full((smooth_window, k), np.nan)
+        self.smoothed = np.full((window, k), np.nan)
+        self.changed = np.zeros((max(window - 1, 1), k))
+        self.prev = np.full(k, np.nan)
+        self.shift = np.full(k, np.nan)
+        self._resync()
+
+    @classmethod
+    def from_history(cls, df, signals=None, **kwargs):
+        """Warm up a detector from the tail of an hourly frame (e.g. the merged frame)."""
+        if signals is None:
+            signals = [s for s in CANDIDATE_SIGNALS if s in df.columns]
+        det = cls(signals, **kwargs)
+        tail = df.tail(det.window + det.smooth_window)
+        det.update_frame(tail)
+        return det
+
+    def _resync(self):
+        """Recompute the running sums from the ring buffers."""
+        raw_ok = np.isfinite(self.raw)
+        self.raw_sum = np.where(raw_ok, self.raw, 0.0).sum(axis=0)
+        self.raw_cnt = raw_ok.sum(axis=0).astype(float)
+        sm_ok = np.isfinite(self.smoothed)
+        cnt = sm_ok.sum(axis=0)
+        # re-center on the current window mean so sums of squares stay small
+        mean = np.where(sm_ok, self.smoothed, 0.0).sum(axis=0) / np.maximum(cnt, 1)
+        self.shift = np.where(cnt > 0, mean, self.shift)
+        c = np.where(sm_ok, self.smoothed - self.shift, 0.0)
+        self.sm_sum = c.sum(axis=0)
+        self.sm_sq = (c * c).sum(axis=0)
+        self.sm_cnt = cnt.astype(float)
+        self.n_changes = self.changed.sum(axis=0)
+
+    def update(self, timestamp, values):
+        """
+        Score one new row.
+
+        Args:
+          timestamp: timestamp of the row.
+          values: mapping signal -> value (missing signals count as NaN).
+
+        Returns:
+          list of event dicts (timestamp, signal, value, z_score, jump) for signals flagged at this row.
+        """
+        x = np.array([values.get(sig, np.nan) for sig in self.signals], dtype=float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # smoothing ring
+            i = self.n_seen % self.smooth_window
+            old = self.raw[i]
+            old_ok = np.isfinite(old)
+            new_ok = np.isfinite(x)
+            self.raw_sum += np.where(new_ok, x, 0.0) - np.where(old_ok, old, 0.0)
+            self.raw_cnt += new_ok.astype(float) - old_ok
+            self.raw[i] = x
+            s = np.where(self.raw_cnt > 0, self.raw_sum / self.raw_cnt, np.nan)
+
+            # z-score ring
+            s_ok = np.isfinite(s)
+            self.shift = np.where(np.isnan(self.shift) & s_ok, s, self.shift)
+            j = self.n_seen % self.window
+            old = self.smoothed[j] - self.shift
+            old_ok = np.isfinite(old)
+            c = np.where(s_ok, s - self.shift, 0.0)
+            old_c = np.where(old_ok, old, 0.0)
+            self.sm_sum += c - old_c
+            self.sm_sq += c * c - old_c * old_c
+            self.sm_cnt += s_ok.astype(float) - old_ok
+            self.smoothed[j] = s
+
+            # constant-window tracking (see anomaly_score_matrix)
+            ch = (s_ok & np.isfinite(self.prev) & (s != self.prev)).astype(float)
+            m = self.n_seen % len(self.changed)
+            self.n_changes += ch - self.changed[m]
+            self.changed[m] = ch
+
+            n = self.sm_cnt
+            mu = self.sm_sum / n
+            var = (self.sm_sq - self.sm_sum * mu) / (n - 1)
+            valid = (n >= self.min_periods) & s_ok & (self.n_changes > 0) & (var > 0)
+            z = np.where(valid, (c - mu) / np.sqrt(var), 0.0)
+
+            prev = np.where(self.prev == 0, np.nan, self.prev)
+            jump = np.abs(s - prev) / prev
+            jump[np.isnan(jump)] = 0.0
+
+        self.prev = s
+        self.n_seen += 1
+        self.last_timestamp = timestamp
+        if self.n_seen % self.RESYNC_EVERY == 0:
+            self._resync()
+
+        hits = np.nonzero((np.abs(z) >= self.z_threshold) & (jump >= self.jump_threshold))[0]
+        return [{
+            'timestamp': timestamp,
+            'signal': self.signals[h],
+            'value': float(s[h]),
+            'z_score': float(z[h]),
+            'jump': float(jump[h])
+        } for h in hits]
+
+    def update_frame(self, df):
+        """Feed every row of an hourly frame in order and return the events as a DataFrame."""
+        cols = [c for c in self.signals if c in df.columns]
+        events = []
+        for ts, row in zip(df['timestamp'], df[cols].to_dict('records')):
+            events.extend(self.update(ts, row))
+        return pd.DataFrame(events, columns=['timestamp','signal','value','z_score','jump'])
+
+    def to_dict(self):
+        """JSON-serializable snapshot of the detector state."""
+        return {
+            'signals': self.signals,
+            'z_threshold': self.z_threshold,
+            'jump_threshold': self.jump_threshold,
+            'smooth_window': self.smooth_window,
+            'window': self.window,
+            'n_seen': self.n_seen,
+            'last_timestamp': None if self.last_timestamp is None else str(self.last_timestamp),
+            'raw': self.raw.tolist(),
+            'smoothed': self.smoothed.tolist(),
+            'changed': self.changed.tolist(),
+            'prev': self.prev.tolist(),
+            'shift': self.shift.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        det = cls(state['signals'], z_threshold=state['z_threshold'], jump_threshold=state['jump_threshold'],
+                  smooth_window=state['smooth_window'], window=state['window'])
+        det.n_seen = state['n_seen']
+        det.last_timestamp = pd.Timestamp(state['last_timestamp']) if state['last_timestamp'] else None
+        k = len(det.signals)
+        det.raw = np.array(state['raw'], dtype=float).reshape(-1, k)
+        det.smoothed = np.array(state['smoothed'], dtype=float).reshape(-1, k)
+        det.changed = np.array(state['changed'], dtype=float).reshape(-1, k)
+        det.prev = np.array(state['prev'], dtype=float)
+        det.shift = np.array(state['shift'], dtype=float)
+        det._resync()
+        return det
+
+    def save(self, path):
+        import json
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        import json
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+def hourly_align_merge_safe(pune_df, aqi_df, compact=False, store=None):
+    """
+    Safely parse timestamps, coerce numeric columns, resample hourly, and merge numeric-only.
+
+    The inputs are not modified or copied column by column: each frame is turned
+    straight into one timestamp-indexed numeric block. compact=True keeps that
+    block (and the merged result) in float32, halving its memory. If store (an
+    hourly_store.HourlyStore) is given, hours after its current end are appended to it.
+    """
     # Ensure timestamp columns exist and parse safely
     if 'timestamp' not in pune_df.columns and 'LASTUPDATEDATETIME' in pune_df.columns:
         pune_df = pune_df.rename(columns={'LASTUPDATEDATETIME': 'timestamp'})
 
-    pune_df['timestamp'] = pd.to_datetime(pune_df.get('timestamp'), errors='coerce')
-    aqi_df['timestamp'] = pd.to_datetime(aqi_df.get('timestamp'), errors='coerce')
+    pune_num = _numeric_hourly_input(pune_df, compact)
+    aqi_num = _numeric_hourly_input(aqi_df, compact)
 
-    # Drop rows without valid timestamp
-    pune_df = pune_df.dropna(subset=['timestamp']).copy()
-    aqi_df = aqi_df.dropna(subset=['timestamp']).copy()
+    # Resample to hourly using only numeric columns
+    merged = merge_hourly_frames(pune_num.resample('h').mean(), aqi_num.resample('h').mean())
+    if store is not None:
+        appended = store.append(merged)
+        print(f"Appended {appended} new hours to hourly store {store.store_dir}")
+    return merged
 
-    # Coerce numeric-looking columns to numeric, keep non-numeric as NaN
-    def coerce_numeric(df):
-        df = df.copy()
-        for c in df.columns:
-            if c == 'timestamp':
-                continue
-            df[c] = pd.to_numeric(df[c], errors='coerce')
-        return df
+def _numeric_hourly_input(df, compact=False):
+    """Timestamp-indexed, sorted numeric frame: rows without a valid timestamp dropped, non-numeric values as NaN."""
+    dtype = np.float32 if compact else np.float64
+    if 'timestamp' in df.columns:
+        ts = pd.to_datetime(df['timestamp'], errors='coerce')
+    else:
+        ts = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    keep = ts.notna().to_numpy()
 
-    pune_num = coerce_numeric(pune_df)
-    aqi_num = coerce_numeric(aqi_df)
+    cols = {}
+    for c in df.columns:
+        if c == 'timestamp':
+            continue
+        s = df[c]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            # Convert the (few) categories once and gather by code
+            cats = pd.to_numeric(pd.Series(s.cat.categories), errors='coerce').to_numpy(dtype=dtype)
+            codes = s.cat.codes.to_numpy()
+            values = np.append(cats, np.nan).astype(dtype)[np.where(codes >= 0, codes, len(cats))]
+        else:
+            values = pd.to_numeric(s, errors='coerce').to_numpy(dtype=dtype, na_value=np.nan)
+        cols[c] = values[keep]
 
-    pune_num = pune_num.set_index('timestamp').sort_index()
-    aqi_num = aqi_num.set_index('timestamp').sort_index()
+    out = pd.DataFrame(cols, index=pd.DatetimeIndex(ts[keep], name='timestamp'))
+    return out.sort_index()
 
-    # Resample to hourly using only numeric columns
-    pune_hourly = pune_num.resample('h').mean().interpolate(limit=3).ffill().bfill()
-    aqi_hourly = aqi_num.resample('h').mean().interpolate(limit=3).ffill().bfill()
+def compact_frame(df):
+    """
+    Shrink a raw input frame: float64 → float32, low-cardinality text columns
+    (City, Area, Road, weather, ...) → category. Returns (frame, bytes_saved).
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    converted = {}
+    for c in df.columns:
+        s = df[c]
+        if c == 'timestamp':
+            continue
+        if pd.api.types.is_float_dtype(s.dtype) and s.dtype != np.float32:
+            converted[c] = s.astype(np.float32)
+        elif (s.dtype == object or pd.api.types.is_string_dtype(s.dtype)) and s.nunique() <= len(s) // 2:
+            converted[c] = s.astype('category')
+    if converted:
+        df = df.assign(**converted)
+    return df, before - int(df.memory_usage(deep=True).sum())
+
+def verify_compact_detection(reference, compact, signals=None, z_threshold=3.0, jump_threshold=0.6,
+                             methods=None, tolerance=1e-3):
+    """
+    Check that a compact (float32) merged frame detects the same anomalies as the float64 one.
 
-    merged = pd.concat([pune_hourly, aqi_hourly], axis=1)
-    merged = merged.reset_index().rename(columns={'index':'timestamp'})
+    Both frames are scored on the reference timestamps. A point flagged by only one
+    of them counts as unexplained unless its reference z-score or jump lies within
+    `tolerance` of the threshold. The check passes when the max |z| difference is
+    within `tolerance` and nothing is unexplained.
+
+    Returns:
+      dict with anomalies_float64, anomalies_float32, mismatched, unexplained,
+      max_abs_z_diff, max_abs_jump_diff, tolerance and ok.
+    """
+    if signals is None:
+        signals = CANDIDATE_SIGNALS
+    signals = [s for s in signals if s in reference.columns and s in compact.columns]
+    compact = compact.set_index('timestamp').reindex(pd.DatetimeIndex(reference['timestamp'])).reset_index()
+    s64 = score_matrix(reference[signals].to_numpy(dtype=float), signals, methods, timestamps=reference['timestamp'])
+    s32 = score_matrix(compact[signals].to_numpy(dtype=float), signals, methods, timestamps=reference['timestamp'])
+    (_, z64, j64), (_, z32, j32) = s64, s32
+    hit64 = (np.abs(z64) >= z_threshold) & (j64 >= jump_threshold)
+    hit32 = (np.abs(z32) >= z_threshold) & (j32 >= jump_threshold)
+    differ = hit64 != hit32
+    borderline = (np.abs(np.abs(z64) - z_threshold) <= tolerance) | (np.abs(j64 - jump_threshold) <= tolerance)
+    with np.errstate(invalid='ignore'):
+        dz, dj = np.abs(z64 - z32), np.abs(j64 - j32)
+    result = {
+        'anomalies_float64': int(hit64.sum()),
+        'anomalies_float32': int(hit32.sum()),
+        'mismatched': int(differ.sum()),
+        'unexplained': int((differ & ~borderline).sum()),
+        'max_abs_z_diff': float(np.nanmax(dz)) if np.isfinite(dz).any() else 0.0,
+        'max_abs_jump_diff': float(np.nanmax(dj)) if np.isfinite(dj).any() else 0.0,
+        'tolerance': tolerance
+    }
+    result['ok'] = result['max_abs_z_diff'] <= tolerance and result['unexplained'] == 0
+    return result
+
+def merge_hourly_frames(*hourly_frames):
+    """Gap-fill hourly-mean frames (indexed by timestamp, e.g. Pune + AQI) and merge them side by side."""
+    filled = [h.resample('h').mean().interpolate(limit=3).ffill().bfill() for h in hourly_frames]
+
+    merged = pd.concat(filled, axis=1)
+    merged.index.name = 'timestamp'
+    merged = merged.reset_index()
 
     return merged
 
+# -------------------------
+# Merged-frame cache (content-hash keyed)
+# -------------------------
+_FILE_HASHES = {}  # (path, size, mtime_ns) -> sha256, so unchanged files are hashed once per process
+
+def file_content_hash(path, chunk_size=1 << 20):
+    """sha256 of a file's contents, read in fixed-size chunks."""
+    import hashlib
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if memo_key not in _FILE_HASHES:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(chunk_size), b''):
+                h.update(block)
+        _FILE_HASHES[memo_key] = h.hexdigest()
+    return _FILE_HASHES[memo_key]
+
+def register_file_hash(path, digest):
+    """Record a sha256 already computed elsewhere (e.g. while streaming an upload) so it is not re-read."""
+    st = os.stat(path)
+    _FILE_HASHES[(os.path.abspath(path), st.st_size, st.st_mtime_ns)] = digest
+
+class MergedFrameCache:
+    """
+    On-disk cache of merged hourly frames, keyed by input content hash + merge settings.
+
+    Each entry is an uncompressed .npz (int64 timestamps, one float64 or float32
+    block and the column names), so a hit is a couple of array reads instead of CSV
+    parsing and resampling. Least-recently-used entries are evicted once the
+    directory grows past max_bytes.
+    """
+
+    VERSION = 1  # bump when the merge logic changes so stale entries are never reused
+
+    def __init__(self, cache_dir='merged_cache', max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def key_for(self, paths, **settings):
+        """Cache key for the given input files (None = demo data) and merge settings."""
+        import hashlib
+        import json
+        parts = [file_content_hash(p) if p else 'demo' for p in paths]
+        payload = json.dumps({'v': self.VERSION, 'inputs': parts, 'settings': settings}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'merged_{key}.npz')
+
+    def get(self, key):
+        """Return the cached merged frame, or None on a miss."""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                merged = pd.DataFrame(data['values'], columns=data['columns'].tolist())
+                merged.insert(0, 'timestamp', pd.to_datetime(data['timestamp']))
+            os.utime(path)  # mark as recently used
+            return merged
+        except Exception as e:
+            print(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+
+    def put(self, key, merged):
+        """Store a merged frame (timestamp + numeric columns). Returns False if it cannot be cached."""
+        cols = [c for c in merged.columns if c != 'timestamp']
+        if not all(pd.api.types.is_numeric_dtype(merged[c]) for c in cols):
+            return False
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        # float32 (compact) frames stay float32 on disk and come back that way
+        dtype = np.float32 if all(merged[c].dtype == np.float32 for c in cols) else np.float64
+        # Unique temp file: concurrent jobs merging the same inputs each publish a complete npz
+        import tempfile
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, prefix=os.path.basename(path) + '.',
+                                         suffix='.tmp.npz', delete=False) as f:
+            tmp = f.name
+            try:
+                np.savez(f,
+                         timestamp=merged['timestamp'].to_numpy(dtype='datetime64[ns]'),
+                         values=merged[cols].to_numpy(dtype=dtype),
+                         columns=np.array(cols, dtype=str))
+            except BaseException:
+                f.close()
+                os.remove(tmp)
+                raise
+        try:
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.evict()
+        return True
+
+    def evict(self):
+        """Delete least-recently-used entries until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.startswith('merged_') and name.endswith('.npz') and '.tmp' not in name:
+                try:
+                    st = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:  # evicted by a concurrent job
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+        total = sum(e[1] for e in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
 # -------------------------
 # NEW: Lightweight upcoming-anomaly predictor (EWMA-based)
 # -------------------------
+def _recent_tail(block, recent_window):
+    """
+    Last recent_window finite values of every column of a (rows x signals) block.
+
+    Returns a right-aligned (recent_window x signals) array, NaN-padded at the top
+    for columns with fewer observations, and the per-column observation counts.
+    """
+    rows, k = block.shape
+    w = min(recent_window, rows) if rows else 0
+    finite = np.isfinite(block)
+    if rows and finite[-w:].all():
+        return block[-w:], np.full(k, w)
+    tail = np.full((max(w, 1), k), np.nan)
+    n = np.zeros(k, dtype=int)
+    for j in range(k):
+        vals = block[finite[:, j], j][-w:] if w else block[:0, j]
+        if len(vals):
+            tail[-len(vals):, j] = vals
+        n[j] = len(vals)
+    return tail, n
+
+def _recent_stats(tail, n):
+    """Per-column mean, population std (0 -> 1e-6) and least-squares slope of a right-aligned tail."""
+    ok = np.isfinite(tail)
+    mu = np.where(ok, tail, 0.0).sum(axis=0) / n
+    dev = np.where(ok, tail - mu, 0.0)
+    sigma = np.sqrt((dev * dev).sum(axis=0) / n)
+    sigma = np.where(sigma > 0, sigma, 1e-6)
+    # slope over positions 0..n-1 (equivalent to np.polyfit(x, recent, 1)[0])
+    x = np.arange(len(tail), dtype=float)[:, None]
+    xm = np.where(ok, x, 0.0).sum(axis=0) / n
+    dx = np.where(ok, x - xm, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = (dx * dev).sum(axis=0) / (dx * dx).sum(axis=0)
+    slope = np.where(n >= 3, slope, 0.0)
+    return mu, sigma, slope
+
+def ewma_trend_forecast(level, last, slope, alpha, hs):
+    """
+    Closed-form EWMA + linear-trend forecasts as a (signals x horizons) matrix.
+
+    Iterating s_h = alpha * last + (1 - alpha) * s_(h-1) from s_0 = level gives
+    s_h = last + (level - last) * (1 - alpha)^h; the trend adds slope * h.
+    """
+    level, last, slope = (np.atleast_1d(np.asarray(a, dtype=float))[:, None] for a in (level, last, slope))
+    hs = np.asarray(hs, dtype=float)[None, :]
+    return last + (level - last) * (1 - alpha) ** hs + slope * hs
+
+def forecast_signals(merged):
+    """Default signals to forecast: PM2.5 and traffic_count, then other common names, if present."""
+    signals = []
+    if 'PM2.5' in merged.columns:
+        signals.append('PM2.5')
+    if 'traffic_count' in merged.columns:
+        signals.append('traffic_count')
+    # fallback to other common names
+    for alt in ['PM2_MAX','PM2_MIN','PM10_MAX','Vehicle Count','SOUND']:
+        if alt in merged.columns and alt not in signals:
+            signals.append(alt)
+    return signals
+
+def _forecast_frame(signals, last_ts, last, mu, sigma, slope, horizon, ewma_alpha, z_warn, rel_warn):
+    """Forecasts and flags for the next `horizon` hours after last_ts, one row per (signal, hour)."""
+    # EWMA state starts at the last observed value and is fed that value every step:
+    # s_h = last + (s_0 - last) * (1 - alpha)^h, plus the linear trend * h
+    hs = np.arange(1, horizon + 1)
+    forecast = ewma_trend_forecast(last, last, slope, ewma_alpha, hs)
+    z = (forecast - mu[:, None]) / sigma[:, None]
+    denom = np.where(np.abs(last) > 1e-6, np.abs(last), 1e-6)
+    rel_jump = np.abs(forecast - last[:, None]) / denom[:, None]
+    flag = (np.abs(z) >= z_warn) | (rel_jump >= rel_warn)
+
+    k = len(signals)
+    times = (pd.Timestamp(last_ts) + pd.to_timedelta(hs, unit='h')).strftime('%Y-%m-%d %H:%M:%S')
+    return pd.DataFrame({
+        'signal': np.repeat(np.asarray(signals, dtype=object), horizon),
+        'horizon_hours': np.tile(hs, k),
+        'forecast_time': np.tile(np.asarray(times, dtype=object), k),
+        'forecast_value': forecast.ravel(),
+        'recent_mean': np.repeat(mu, horizon),
+        'recent_std': np.repeat(sigma, horizon),
+        'z_score': z.ravel(),
+        'rel_jump': rel_jump.ravel(),
+        'flag_upcoming_anomaly': flag.ravel()
+    })
+
 def predict_upcoming_anomalies(merged, signals=None, horizon=6, recent_window=24,
                                ewma_alpha=0.3, z_warn=3.0, rel_warn=0.5, out_csv='predicted_upcoming_anoms.csv'):
     """
@@ -148,91 +1236,462 @@ def predict_upcoming_anomalies(merged, signals=None, horizon=6, recent_window=24
       ewma_alpha: smoothing factor for EWMA forecasting (0-1). Higher -> reacts faster.
       z_warn: z-score threshold used to mark a forecast as likely anomaly.
       rel_warn: relative jump threshold (fraction) used to flag likely anomaly.
-      out_csv: path to save predictions.
+      out_csv: path to save predictions (None -> return the DataFrame without writing it).
 
     Returns:
       DataFrame of forecasts and flags, saved to out_csv.
     """
     if signals is None:
-        signals = []
-        if 'PM2.5' in merged.columns:
-            signals.append('PM2.5')
-        if 'traffic_count' in merged.columns:
-            signals.append('traffic_count')
-        # fallback to other common names
-        for alt in ['PM2_MAX','PM2_MIN','PM10_MAX','Vehicle Count','SOUND']:
-            if alt in merged.columns and alt not in signals:
-                signals.append(alt)
+        signals = forecast_signals(merged)
     signals = [s for s in signals if s in merged.columns]
     if not signals:
         print("No suitable signals found for prediction.")
         return pd.DataFrame()
 
-    df = merged.sort_values('timestamp').reset_index(drop=True).copy()
-    results = []
+    df = merged.sort_values('timestamp')
+    if df.empty:
+        print("No forecasts produced.")
+        return pd.DataFrame()
+    last_ts = df['timestamp'].iloc[-1]
+    tail, n = _recent_tail(df[signals].to_numpy(dtype=float), recent_window)
+    keep = n > 0  # signals with no observations at all are skipped
+    signals = [sig for sig, k in zip(signals, keep) if k]
+    if not signals:
+        print("No forecasts produced.")
+        return pd.DataFrame()
+    tail, n = tail[:, keep], n[keep]
 
-    for sig in signals:
-        series = df[sig].astype(float).dropna()
-        if series.empty:
-            continue
-        # Use last available value as starting point; compute EWMA forecast iteratively
-        last_ts = df['timestamp'].iloc[-1]
-        # recent stats for z calculation
-        recent = series.iloc[-recent_window:] if len(series) >= recent_window else series
-        mu = recent.mean()
-        sigma = recent.std(ddof=0) if recent.std(ddof=0) > 0 else 1e-6
-
-        # initial EWMA state = last observed value
-        s_ewma = series.iloc[-1]
-        # Also compute simple linear trend (slope over recent_window) to improve forecast
-        if len(recent) >= 3:
-            x = np.arange(len(recent))
-            # slope via polyfit on recent
-            slope = np.polyfit(x, recent.values, 1)[0]
-        else:
-            slope = 0.0
-
-        for h in range(1, horizon+1):
-            # baseline EWMA forecast: s_t+1 = alpha * last + (1-alpha) * prev_ewma
-            # we simulate iteratively and add linear trend * h to allow gradual drift
-            s_ewma = ewma_alpha * series.iloc[-1] + (1 - ewma_alpha) * s_ewma
-            # add simple trend
-            forecast = s_ewma + slope * h
-            # compute z and relative jump against recent mean / last value
-            z = (forecast - mu) / sigma
-            prev = series.iloc[-1]
-            rel_jump = abs(forecast - prev) / (abs(prev) if abs(prev) > 1e-6 else 1e-6)
-
-            flag = (abs(z) >= z_warn) or (rel_jump >= rel_warn)
-            results.append({
-                'signal': sig,
-                'horizon_hours': h,
-                'forecast_time': (last_ts + pd.Timedelta(hours=h)).strftime('%Y-%m-%d %H:%M:%S'),
-                'forecast_value': float(forecast),
-                'recent_mean': float(mu),
-                'recent_std': float(sigma),
-                'z_score': float(z),
-                'rel_jump': float(rel_jump),
-                'flag_upcoming_anomaly': bool(flag)
-            })
-
-    preds = pd.DataFrame(results)
-    if not preds.empty:
+    # recent stats for z calculation and linear trend (least-squares slope) over the recent window
+    mu, sigma, slope = _recent_stats(tail, n)
+    preds = _forecast_frame(signals, last_ts, tail[-1], mu, sigma, slope, horizon, ewma_alpha, z_warn, rel_warn)
+    if preds.empty:
+        print("No forecasts produced.")
+    elif out_csv:
         preds.to_csv(out_csv, index=False)
         print(f"Saved upcoming forecasts -> {out_csv}")
-    else:
-        print("No forecasts produced.")
     return preds
 
+class ForecasterState:
+    """
+    Incremental counterpart of predict_upcoming_anomalies() for hourly refreshes.
+
+    Per signal it keeps a ring of the last recent_window finite values, the running
+    sums of the (re-centered) values, their squares and position-weighted values, and
+    the number of changes inside the window. Together these give the window mean,
+    population std and least-squares slope. Each new hour updates them in O(1) per
+    signal. predict() then needs no pass over the history: the EWMA level starts at the
+    last value, as in predict_upcoming_anomalies(), and ewma_trend_forecast() extends
+    it by the slope. All signals are numpy columns, so one update or forecast covers
+    thousands of streams. State round-trips through to_dict() / from_dict() and
+    save() / load() (JSON).
+    """
+
+    RESYNC_EVERY = 1024  # rebuild running sums from the rings to stop float drift
+
+    def __init__(self, signals, recent_window=24):
+        self.signals = list(signals)
+        self.window = recent_window
+        self.last_timestamp = None
+        self.n_updates = 0
+        k = len(self.signals)
+        self.ring = np.full((recent_window, k), np.nan)
+        self.count = np.zeros(k, dtype=np.int64)  # finite values written to the ring (mod window = next slot)
+        self.last = np.full(k, np.nan)
+        self.shift = np.full(k, np.nan)
+        self._resync()
+
+    @classmethod
+    def from_history(cls, df, signals=None, recent_window=24):
+        """State after the rows of an hourly frame (only their last recent_window finite values per signal are read)."""
+        if signals is None:
+            signals = forecast_signals(df)
+        state = cls([s for s in signals if s in df.columns], recent_window)
+        state.update_frame(df)
+        return state
+
+    def add_signals(self, signals):
+        """Start tracking signals not in the state yet (no observations)."""
+        new = [s for s in signals if s not in self.signals]
+        if not new:
+            return
+        pad = len(new)
+        self.signals += new
+        self.ring = np.concatenate([self.ring, np.full((self.window, pad), np.nan)], axis=1)
+        self.count = np.concatenate([self.count, np.zeros(pad, dtype=np.int64)])
+        self.last = np.concatenate([self.last, np.full(pad, np.nan)])
+        self.shift = np.concatenate([self.shift, np.full(pad, np.nan)])
+        self._resync()
+
+    def _ordered(self):
+        """Ring contents oldest -> newest, right-aligned and NaN-padded like _recent_tail(), and their counts."""
+        n = np.minimum(self.count, self.window)
+        idx = (self.count[None, :] - self.window + np.arange(self.window)[:, None]) % self.window
+        tail = np.take_along_axis(self.ring, idx, axis=0)
+        tail[np.arange(self.window)[:, None] < self.window - n[None, :]] = np.nan
+        return tail, n
+
+    def _resync(self):
+        """Recompute the running sums from the rings (re-centered on the window means)."""
+        tail, n = self._ordered()
+        ok = np.isfinite(tail)
+        mean = np.where(ok, tail, 0.0).sum(axis=0) / np.maximum(n, 1)
+        self.shift = np.where(n > 0, mean, self.shift)
+        y = np.where(ok, tail - self.shift, 0.0)
+        pos = np.arange(self.window)[:, None] - (self.window - n)[None, :]  # 0 = oldest value in the window
+        self.s1 = y.sum(axis=0)
+        self.s2 = (y * y).sum(axis=0)
+        self.sxy = (np.where(ok, pos, 0) * y).sum(axis=0)
+        self.n_changes = (ok[1:] & ok[:-1] & (tail[1:] != tail[:-1])).sum(axis=0)
+
+    def _reseed(self, tail, n):
+        """Replace the rings with a right-aligned (window x signals) tail holding n values per column."""
+        self.ring = np.full((self.window, len(self.signals)), np.nan)
+        rows = np.arange(self.window)[:, None]
+        src = rows + (self.window - n)[None, :]  # ring slot i <- i-th oldest tail value
+        take = rows < n[None, :]
+        self.ring[take] = np.take_along_axis(tail, np.minimum(src, self.window - 1), axis=0)[take]
+        self.count = n.astype(np.int64)
+        self.last = np.where(n > 0, tail[-1], self.last)
+        self._resync()
+
+    def update(self, timestamp, values):
+        """
+        Add one hour of observations.
+
+        Args:
+          timestamp: timestamp of the row.
+          values: mapping signal -> value, or an array in self.signals order (NaN / missing = no observation).
+        """
+        if isinstance(values, dict):
+            x = np.array([values.get(sig, np.nan) for sig in self.signals], dtype=float)
+        else:
+            x = np.asarray(values, dtype=float)
+        ok = np.isfinite(x)
+        w = self.window
+        cols = np.arange(len(self.signals))
+        self.shift = np.where(np.isnan(self.shift) & ok, x, self.shift)
+        n = np.minimum(self.count, w)
+        slot = self.count % w
+        full = ok & (self.count >= w)
+        grow = ok & ~full
+        with np.errstate(invalid='ignore'):
+            y = np.where(ok, x - self.shift, 0.0)
+            old = self.ring[slot, cols]
+            yo = np.where(full, old - self.shift, 0.0)
+            # sliding out the oldest value moves every other one a position down: sxy -= (s1 - yo)
+            self.sxy += np.where(full, (w - 1) * y - (self.s1 - yo), np.where(grow, n * y, 0.0))
+            self.s1 += y - yo
+            self.s2 += y * y - yo * yo
+            second = self.ring[(slot + 1) % w, cols]
+            self.n_changes -= full & (old != second)
+            self.n_changes += ok & (self.count > 0) & (x != self.last)
+        self.ring[slot[ok], cols[ok]] = x[ok]
+        self.last = np.where(ok, x, self.last)
+        self.count += ok
+        self.last_timestamp = pd.Timestamp(timestamp)
+        self.n_updates += 1
+        if self.n_updates % self.RESYNC_EVERY == 0:
+            self._resync()
+
+    def update_frame(self, df):
+        """
+        Add the rows of an hourly frame newer than the last timestamp seen; returns how many.
+
+        Up to recent_window rows are added one by one; a longer batch only needs its last
+        recent_window finite values per signal, so the rings are rebuilt from those instead.
+        """
+        ts = pd.to_datetime(df['timestamp'])
+        if self.last_timestamp is not None:
+            df = df[(ts > self.last_timestamp).to_numpy()]
+            ts = ts[ts > self.last_timestamp]
+        if df.empty:
+            return 0
+        order = np.argsort(ts.to_numpy(), kind='stable')
+        block = df.reindex(columns=self.signals).to_numpy(dtype=float)[order]
+        if len(block) <= self.window:
+            for t, row in zip(ts.to_numpy()[order], block):
+                self.update(t, row)
+            return len(block)
+        tail, _ = self._ordered()
+        self._reseed(*_recent_tail(np.vstack([tail, block]), self.window))
+        self.last_timestamp = pd.Timestamp(ts.max())
+        self.n_updates += len(block)
+        return len(block)
+
+    def stats(self):
+        """Window mean, population std (0 -> 1e-6) and least-squares slope per signal, from the running sums."""
+        n = np.minimum(self.count, self.window).astype(float)
+        varying = self.n_changes > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            m1 = self.s1 / n
+            mu = self.shift + m1
+            var = np.where(varying, np.maximum(self.s2 / n - m1 * m1, 0.0), 0.0)
+            sigma = np.sqrt(var)
+            sx = n * (n - 1) / 2
+            sxx = (n - 1) * n * (2 * n - 1) / 6
+            slope = (self.sxy - sx * m1) / (sxx - sx * sx / n)
+        sigma = np.where(sigma > 0, sigma, 1e-6)
+        slope = np.where((n >= 3) & varying, slope, 0.0)
+        return mu, sigma, slope
+
+    def predict(self, horizon=6, ewma_alpha=0.3, z_warn=3.0, rel_warn=0.5, out_csv=None):
+        """Forecast frame in the predict_upcoming_anomalies() layout, from the state alone."""
+        keep = self.count > 0
+        if not keep.any() or self.last_timestamp is None:
+            print("No forecasts produced.")
+            return pd.DataFrame()
+        mu, sigma, slope = self.stats()
+        signals = [sig for sig, k in zip(self.signals, keep) if k]
+        preds = _forecast_frame(signals, self.last_timestamp, self.last[keep], mu[keep], sigma[keep], slope[keep],
+                                horizon, ewma_alpha, z_warn, rel_warn)
+        if out_csv:
+            preds.to_csv(out_csv, index=False)
+            print(f"Saved upcoming forecasts -> {out_csv}")
+        return preds
+
+    def info(self):
+        return {
+            'signals': self.signals,
+            'recent_window': self.window,
+            'updates': self.n_updates,
+            'last_timestamp': None if self.last_timestamp is None else str(self.last_timestamp)
+        }
+
+    def to_dict(self):
+        """JSON-serializable snapshot of the state (running sums are rebuilt on load)."""
+        return {
+            'signals': self.signals,
+            'recent_window': self.window,
+            'n_updates': self.n_updates,
+            'last_timestamp': None if self.last_timestamp is None else str(self.last_timestamp),
+            'ring': self.ring.tolist(),
+            'count': self.count.tolist(),
+            'last': self.last.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        fc = cls(state['signals'], recent_window=state['recent_window'])
+        fc.n_updates = state['n_updates']
+        fc.last_timestamp = pd.Timestamp(state['last_timestamp']) if state['last_timestamp'] else None
+        fc.ring = np.array(state['ring'], dtype=float).reshape(fc.window, len(fc.signals))
+        fc.count = np.array(state['count'], dtype=np.int64)
+        fc.last = np.array(state['last'], dtype=float)
+        fc._resync()
+        return fc
+
+    def save(self, path):
+        import json
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        import json
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+# -------------------------
+# Partitioned analysis (per city / area / sensor on a process pool)
+# -------------------------
+def _numeric_block(df, key, default_start='2024-01-01'):
+    """
+    Flatten one raw input into (keys, int64 ns timestamps, float64 block, columns).
+
+    Rows without a valid timestamp are dropped. Inputs without a timestamp get
+    one row per hour from default_start within each partition, in file order.
+    """
+    if 'timestamp' not in df.columns and 'LASTUPDATEDATETIME' in df.columns:
+        df = df.rename(columns={'LASTUPDATEDATETIME': 'timestamp'})
+    keys = df[key].astype(str).to_numpy() if key in df.columns else np.full(len(df), '', dtype=object)
+    if 'timestamp' in df.columns:
+        ts = pd.to_datetime(df['timestamp'], errors='coerce')
+    else:
+        order = pd.Series(keys).groupby(keys).cumcount().to_numpy()
+        ts = pd.Series(pd.Timestamp(default_start) + pd.to_timedelta(order, unit='h'))
+    ok = ts.notna().to_numpy()
+    cols = [c for c in df.columns if c not in ('timestamp', key)]
+    values = np.column_stack([pd.to_numeric(df[c], errors='coerce').to_numpy(dtype=float) for c in cols]) \
+        if cols else np.empty((len(df), 0))
+    return keys[ok], ts[ok].to_numpy(dtype='datetime64[ns]').view('int64'), values[ok], cols
+
+def _share_block(ts, values):
+    """Copy timestamps + values of one input into a single shared-memory segment."""
+    from multiprocessing import shared_memory
+    n, c = values.shape
+    shm = shared_memory.SharedMemory(create=True, size=max(8 * n * (c + 1), 8))
+    np.ndarray((n,), dtype='int64', buffer=shm.buf)[:] = ts
+    np.ndarray((n, c), dtype=float, buffer=shm.buf, offset=8 * n)[:] = values
+    return shm
+
+def _attach_block(spec):
+    """Worker side of _share_block(): hourly-mean frame for rows [start, stop) of a shared input."""
+    from multiprocessing import shared_memory
+    # pool workers share the parent's resource tracker, which unlinks the segment exactly once
+    shm = shared_memory.SharedMemory(name=spec['shm'])
+    try:
+        n, c = spec['n_rows'], len(spec['columns'])
+        start, stop = spec['start'], spec['stop']
+        ts = np.ndarray((n,), dtype='int64', buffer=shm.buf)[start:stop]
+        values = np.ndarray((n, c), dtype=float, buffer=shm.buf, offset=8 * n)[start:stop]
+        index = pd.DatetimeIndex(ts.view('datetime64[ns]'), name='timestamp')
+        hourly = pd.DataFrame(values, columns=spec['columns'], index=index).sort_index().resample('h').mean()
+    finally:
+        # views into the segment must be gone before it can be closed
+        ts = values = index = None
+        shm.close()
+    return hourly
+
+def _analyze_partition(task):
+    """Ingest, detect, fuse and (optionally) predict for one partition. Runs in a worker process."""
+    name = task['partition']
+    hourly = [_attach_block(spec) for spec in task['inputs']]
+    merged = merge_hourly_frames(*hourly)
+    signals = [s for s in CANDIDATE_SIGNALS if s in merged.columns]
+    anoms = detect_anomalies_matrix(merged, signals, z_threshold=task['z_threshold'], jump_threshold=task['rel_threshold'],
+                                    methods=task.get('detectors'))
+    events = fuse_events(anoms, tolerance=task['fuse_tolerance'])
+    preds = pd.DataFrame()
+    if task['run_prediction'] and not merged.empty:
+        preds = predict_upcoming_anomalies(merged, horizon=task['horizon'], z_warn=task['z_threshold'],
+                                           rel_warn=task['rel_threshold'], out_csv=None)
+    return {
+        'partition': name,
+        'events': events.assign(partition=name),
+        'predictions': preds.assign(partition=name) if not preds.empty else preds,
+        'rows': len(merged),
+        'signals': signals,
+        'time_range': f"{merged['timestamp'].min()} to {merged['timestamp'].max()}" if not merged.empty else ''
+    }
+
+def run_partitioned_analysis(frames, key='City', z_threshold=3.0, rel_threshold=0.6, run_prediction=False,
+                             horizon=6, fuse_tolerance='60min', max_workers=None, detectors=None):
+    """
+    Run ingestion, detection and prediction separately for every value of a key column.
+
+    Args:
+      frames: raw input DataFrames (e.g. [pune_df, aqi_df]). Inputs that have the key
+              column are split by it; inputs without it are shared by every partition.
+      key: partition column (e.g. 'City', 'Area Name', a sensor id).
+      max_workers: process pool size (default: all cores).
+      detectors: per-signal detector engine, e.g. {'PM2.5': 'robust'} (see score_matrix).
+
+    The numeric part of every input is coerced once in the parent, sorted by key
+    and placed in shared memory; workers attach and read only their row range.
+
+    Returns:
+      dict with 'events' and 'predictions' (tagged with a 'partition' column) and per-partition 'partitions' info.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    blocks, shms = [], []
+    try:
+        for df in frames:
+            keys, ts, values, cols = _numeric_block(df, key)
+            order = np.argsort(keys, kind='stable')
+            keys, ts, values = keys[order], ts[order], values[order]
+            shm = _share_block(ts, values)
+            shms.append(shm)
+            uniq, first, counts = np.unique(keys, return_index=True, return_counts=True)
+            bounds = {k: (int(f), int(f + c)) for k, f, c in zip(uniq, first, counts)}
+            blocks.append({'shm': shm.name, 'n_rows': len(ts), 'columns': cols,
+                           'bounds': bounds, 'keyed': key in df.columns})
+
+        names = sorted({k for b in blocks if b['keyed'] for k in b['bounds']})
+        tasks = []
+        for name in names:
+            inputs = []
+            for b in blocks:
+                start, stop = b['bounds'].get(name if b['keyed'] else '', (0, 0))
+                inputs.append({'shm': b['shm'], 'n_rows': b['n_rows'], 'columns': b['columns'],
+                               'start': start, 'stop': stop})
+            tasks.append({'partition': name, 'inputs': inputs, 'z_threshold': z_threshold,
+                          'rel_threshold': rel_threshold, 'run_prediction': run_prediction, 'horizon': horizon,
+                          'fuse_tolerance': fuse_tolerance, 'detectors': detectors})
+        print(f"Analyzing {len(tasks)} partitions by '{key}' on up to {max_workers or os.cpu_count()} processes")
+
+        results = []
+        if tasks:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                for res in pool.map(_analyze_partition, tasks):
+                    print(f" → {res['partition']}: {len(res['events'])} events, {res['rows']} hourly rows")
+                    results.append(res)
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+    events = [r['events'] for r in results if not r['events'].empty]
+    preds = [r['predictions'] for r in results if not r['predictions'].empty]
+    return {
+        'events': pd.concat(events, ignore_index=True) if events else
+                  pd.DataFrame(columns=['event_time','signals','max_value','max_z','max_rel_change','partition']),
+        'predictions': pd.concat(preds, ignore_index=True) if preds else pd.DataFrame(),
+        'partitions': {r['partition']: {'rows': r['rows'], 'events': len(r['events']),
+                                        'signals': r['signals'], 'time_range': r['time_range']} for r in results}
+    }
+
 # -------------------------
 # Reporting & visualization
 # -------------------------
-def build_and_save_report(merged, events_df, out_folder):
+def lttb_downsample(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of n_out - 2 equal buckets,
+    the point forming the largest triangle with the previously kept point and
+    the next bucket's average, which preserves peaks and the overall shape.
+
+    Returns:
+      indices of the selected points (all indices if no downsampling is needed).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = x - x[0]
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(int) + 1
+    edges[-1] = n - 1
+    # average of every bucket, vectorized; the "next" of the last bucket is the final point
+    counts = np.diff(edges)
+    avg_x = np.append(np.add.reduceat(x[:-1], edges[:-1]) / counts, x[-1])
+    avg_y = np.append(np.add.reduceat(y[:-1], edges[:-1]) / counts, y[-1])
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+def _report_hash(merged, events):
+    """Content hash of the report inputs (merged frame + fused events)."""
+    import hashlib
+    h = hashlib.sha256()
+    for frame in (merged, events):
+        h.update(','.join(map(str, frame.columns)).encode())
+        h.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def build_and_save_report(merged, events_df, out_folder, max_points=2000, force=False):
     """
     Create PNGs and a PDF report. events_df is expected to have:
       event_time | signals | max_value | max_z | max_rel_change
     If events_df is empty, the report will note that no anomalies were detected.
+
+    Figures are drawn once and written straight into the PDF as vector pages;
+    their PNG copies are rasterized in parallel. Time series longer than
+    max_points are LTTB-downsampled before plotting. Rendering is skipped when
+    the content hash of merged + events matches the previous report in
+    out_folder (pass force=True to always render).
     """
+    from concurrent.futures import ThreadPoolExecutor
+    import matplotlib
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_pdf import PdfPages
     os.makedirs(out_folder, exist_ok=True)
 
     # Normalize events_df
@@ -250,47 +1709,67 @@ def build_and_save_report(merged, events_df, out_folder):
         if 'signals' not in events.columns:
             events['signals'] = 'unknown'
 
-    # Save anomalies CSV as part of report folder (also returned earlier)
     anomalies_csv = os.path.join(out_folder, 'anomalies_summary.csv')
+    p1 = os.path.join(out_folder, 'pm25_timeseries.png')
+    p2 = os.path.join(out_folder, 'anomaly_counts.png')
+    p3 = os.path.join(out_folder, 'anomaly_timeline.png')
+    pdf_path = os.path.join(out_folder, 'gyatah_anomaly_report.pdf')
+    paths = {
+        'pdf': pdf_path,
+        'pngs': [p1, p2, p3],
+        'csv': anomalies_csv
+    }
+
+    # Skip rendering when nothing changed since the last report
+    hash_path = os.path.join(out_folder, '.report_hash')
+    digest = _report_hash(merged, events)
+    if not force and all(os.path.exists(p) for p in [pdf_path, anomalies_csv, p1, p2, p3]) and os.path.exists(hash_path):
+        with open(hash_path) as f:
+            if f.read().strip() == digest:
+                print(f"Report inputs unchanged — reusing {pdf_path}")
+                return paths
+
+    # Save anomalies CSV as part of report folder (also returned earlier)
     events.to_csv(anomalies_csv, index=False)
 
     # --- Plot 1: PM2.5 time series with anomaly markers ---
-    p1 = os.path.join(out_folder, 'pm25_timeseries.png')
-    fig1, ax1 = plt.subplots(figsize=(12,4))
+    fig1 = Figure(figsize=(12,4))
+    ax1 = fig1.subplots()
     if 'PM2.5' in merged.columns:
-        ax1.plot(merged['timestamp'], merged['PM2.5'], linewidth=0.8, label='PM2.5')
-        pm_events = events[events['signals'].str.contains('PM2.5', na=False)]
+        series = merged[['timestamp', 'PM2.5']].dropna()
+        keep = lttb_downsample(series['timestamp'].to_numpy(dtype='datetime64[ns]').view('int64'),
+                               series['PM2.5'].to_numpy(dtype=float), max_points)
+        ax1.plot(series['timestamp'].iloc[keep], series['PM2.5'].iloc[keep], linewidth=0.8, label='PM2.5')
+        pm_events = events[events['signals'].str.contains('PM2.5', na=False, regex=False)]
         if not pm_events.empty:
             ax1.scatter(pm_events['event_time'], pm_events['max_value'], color='red', marker='x', label='Anomaly')
-        ax1.set_title('PM2.5 time series (hourly)')
+        ax1.set_title('PM2.5 time series (hourly)' if len(keep) == len(series) else
+                      f'PM2.5 time series (hourly, {len(keep)} of {len(series)} points, LTTB)')
         ax1.set_xlabel('Time')
         ax1.set_ylabel('PM2.5')
         ax1.legend()
     else:
         ax1.text(0.5, 0.5, 'PM2.5 not available in merged data', ha='center')
     fig1.tight_layout()
-    fig1.savefig(p1, dpi=150)
-    plt.close(fig1)
 
     # --- Plot 2: Anomaly counts by signal ---
-    p2 = os.path.join(out_folder, 'anomaly_counts.png')
-    fig2, ax2 = plt.subplots(figsize=(8,3))
+    fig2 = Figure(figsize=(8,3))
+    ax2 = fig2.subplots()
     if not events.empty:
         counts = events['signals'].value_counts().sort_values(ascending=False)
-        counts.plot(kind='bar', ax=ax2)
+        ax2.bar(range(len(counts)), counts.values)
+        ax2.set_xticks(range(len(counts)))
+        ax2.set_xticklabels(counts.index, rotation=45, ha='right')
         ax2.set_title('Anomaly counts by signal')
         ax2.set_ylabel('Count')
         ax2.set_xlabel('Signal')
-        plt.xticks(rotation=45, ha='right')
     else:
         ax2.text(0.5, 0.5, 'No anomalies detected', ha='center')
     fig2.tight_layout()
-    fig2.savefig(p2, dpi=150)
-    plt.close(fig2)
 
     # --- Plot 3: Timeline scatter of events ---
-    p3 = os.path.join(out_folder, 'anomaly_timeline.png')
-    fig3, ax3 = plt.subplots(figsize=(12,3))
+    fig3 = Figure(figsize=(12,3))
+    ax3 = fig3.subplots()
     if not events.empty:
         sigs = sorted(events['signals'].unique())
         sig_map = {s:i for i,s in enumerate(sigs)}
@@ -303,42 +1782,38 @@ def build_and_save_report(merged, events_df, out_folder):
     else:
         ax3.text(0.5,0.5,'No anomalies detected', ha='center')
     fig3.tight_layout()
-    fig3.savefig(p3, dpi=150)
-    plt.close(fig3)
+
+    # PNG copies are independent, so rasterize them in parallel
+    figures = [(fig1, p1), (fig2, p2), (fig3, p3)]
+    with ThreadPoolExecutor(max_workers=len(figures)) as pool:
+        list(pool.map(lambda fp: fp[0].savefig(fp[1], dpi=150), figures))
 
     # --- Build PDF ---
-    pdf_path = os.path.join(out_folder, 'gyatah_anomaly_report.pdf')
     with PdfPages(pdf_path) as pdf:
         # cover
-        figc = plt.figure(figsize=(11,8.5))
+        figc = Figure(figsize=(11,8.5))
         figc.text(0.5, 0.6, "Gyatah — Urban Anomaly Report", fontsize=24, ha='center')
         figc.text(0.5, 0.5, f"Generated: {datetime.now().isoformat(sep=' ', timespec='seconds')}", fontsize=10, ha='center')
         pdf.savefig(figc)
-        plt.close(figc)
 
-        # add images
-        for image_path in (p1, p2, p3):
-            img = plt.imread(image_path)
-            figimg = plt.figure(figsize=(11,8.5))
-            plt.imshow(img)
-            plt.axis('off')
-            pdf.savefig(figimg)
-            plt.close(figimg)
+        # figures as vector pages
+        for fig, _ in figures:
+            pdf.savefig(fig)
 
         # add anomaly table (first 100 rows)
-        fig_table = plt.figure(figsize=(11,8.5))
-        fig_table.text(0.01, 0.95, "Top Anomaly Events (first 100 rows):", fontsize=12)
+        fig_table = Figure(figsize=(11,8.5))
+        fig_table.text(0.01, 0.95, "Top Anomaly Events (first 100 rows):", fontsize=12, weight='medium')
         txt = events.head(100).to_string(index=False) if not events.empty else "No anomalies detected."
-        fig_table.text(0.01, 0.02, txt, fontsize=8, family='monospace')
-        pdf.savefig(fig_table)
-        plt.close(fig_table)
+        fig_table.text(0.01, 0.02, txt, fontsize=8, family='monospace', weight='medium')
+        # built-in PDF Courier: no per-glyph font embedding for the large text block
+        with matplotlib.rc_context({'pdf.use14corefonts': True}):
+            pdf.savefig(fig_table)
+
+    with open(hash_path, 'w') as f:
+        f.write(digest)
 
     # Return paths for user
-    return {
-        'pdf': pdf_path,
-        'pngs': [p1, p2, p3],
-        'csv': anomalies_csv
-    }
+    return paths
 
 # -------------------------
 # Menu & Main Flow
@@ -347,6 +1822,9 @@ def prompt_path(label):
     p = input(f"Enter path to {label} CSV (or press Enter to use demo data): ").strip()
     return p if p else None
 
+# Column names recognised as the timestamp, in order of preference
+TIMESTAMP_CANDIDATES = ['LASTUPDATEDATETIME','lastupdatedat​​etime','timestamp','time','date','Date','TIME']
+
 def load_csv_safe(path, hint=''):
     if path is None:
         return None
@@ -357,7 +1835,7 @@ def load_csv_safe(path, hint=''):
         df = pd.read_csv(path)
         print(f"Loaded {path} → {len(df)} rows, columns: {list(df.columns)[:8]}...")
         # unify timestamp column names if present
-        for cand in ['LASTUPDATEDATETIME','lastupdatedat​​etime','timestamp','time','date','Date','TIME']:
+        for cand in TIMESTAMP_CANDIDATES:
             if cand in df.columns:
                 df = df.rename(columns={cand:'timestamp'})
                 break
@@ -366,6 +1844,71 @@ def load_csv_safe(path, hint=''):
         print("Failed to load CSV:", e)
         return None
 
+def load_csv_hourly(path, hint='', columns=None, chunksize=100_000, default_start='2024-01-01',
+                    sample_rows=1000):
+    """
+    Stream a (possibly multi-GB) CSV into an hourly-mean frame without materializing it.
+
+    Only the timestamp column and the signal columns are read: `columns` if given,
+    else every column with numeric values in the first sample_rows rows (text
+    columns such as City or Road are never read, as they would be all-NaN after
+    the numeric coercion of the in-memory path anyway). Each chunk
+    is parsed as numeric and reduced to hourly partial sums/counts, so peak
+    memory is bounded by chunksize rather than by the file size. Files without
+    a timestamp column get one row per hour from default_start, as in
+    run_analysis_with_params().
+
+    Returns:
+      DataFrame of hourly means indexed by 'timestamp', or None if the file cannot be used.
+    """
+    if path is None:
+        return None
+    if not os.path.exists(path):
+        print(f"File not found: {path}")
+        return None
+    try:
+        header = pd.read_csv(path, nrows=0).columns
+        ts_col = next((c for c in TIMESTAMP_CANDIDATES if c in header), None)
+        if columns is None:
+            sample = pd.read_csv(path, nrows=sample_rows)
+            columns = [c for c in sample.columns if pd.to_numeric(sample[c], errors='coerce').notna().any()]
+        wanted = [c for c in columns if c in header and c != ts_col]
+        if not wanted:
+            print(f"No numeric signal columns in {path}")
+            return None
+        usecols = wanted + ([ts_col] if ts_col else [])
+
+        sums = counts = None
+        n_rows = 0
+        for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunksize):
+            if ts_col:
+                hours = pd.to_datetime(chunk[ts_col], errors='coerce').dt.floor('h')
+            else:
+                offsets = pd.to_timedelta(np.arange(n_rows, n_rows + len(chunk)), unit='h')
+                hours = pd.Series(pd.Timestamp(default_start) + offsets, index=chunk.index)
+            n_rows += len(chunk)
+            vals = chunk[wanted]
+            # clean columns are already parsed as numbers by the C parser; coerce only the dirty ones
+            dirty = [c for c in wanted if not pd.api.types.is_numeric_dtype(vals[c])]
+            if dirty:
+                vals = vals.assign(**{c: pd.to_numeric(vals[c], errors='coerce') for c in dirty})
+            ok = hours.notna()
+            grouped = vals[ok].groupby(hours[ok])
+            part_sum, part_cnt = grouped.sum(), grouped.count()
+            sums = part_sum if sums is None else sums.add(part_sum, fill_value=0)
+            counts = part_cnt if counts is None else counts.add(part_cnt, fill_value=0)
+
+        if sums is None or sums.empty:
+            print(f"No rows with a valid timestamp in {path}")
+            return None
+        hourly = (sums / counts.where(counts > 0)).sort_index().resample('h').mean()
+        hourly.index.name = 'timestamp'
+        print(f"Streamed {path} → {n_rows} rows into {len(hourly)} hourly rows, columns: {wanted[:8]}...")
+        return hourly
+    except Exception as e:
+        print("Failed to stream CSV:", e)
+        return None
+
 def interactive():
     print("=== Gyatah — Urban Anomaly Engine (menu) ===")
     pune_path = prompt_path("Pune Smart City dataset (columns: LASTUPDATEDATETIME, PM2_MAX, PM10_MAX, traffic_count, etc.)")
@@ -406,52 +1949,19 @@ def interactive():
         rel_thresh = 0.6
 
     # Candidate signals (use only those present)
-    candidate_signals = [
-        "PM2_MAX","PM2_MIN","PM10_MAX","PM10_MIN",
-        "NO_MAX","NO_MIN","NO2_MAX","NO2_MIN",
-        "OZONE_MAX","OZONE_MIN","SO2_MAX","SO2_MIN",
-        "CO_MAX","CO_MIN","AQI","PM2.5","PM10","NO2","CO","SO2","O3",
-        "traffic_count","Vehicle Count","Industrial Activity Index","SOUND"
-    ]
-    signals = [s for s in candidate_signals if s in merged.columns]
+    signals = [s for s in CANDIDATE_SIGNALS if s in merged.columns]
     print("Monitoring signals:", signals)
 
-    # Detect per-signal anomalies
+    # Detect anomalies for all signals in one pass
     anomaly_frames = []
-    for sig in signals:
-        try:
-            # pass only timestamp + that column to detector to avoid accidental non-numeric columns
-            df_slice = merged[['timestamp'] + [c for c in merged.columns if c == sig]]
-            df_anom = detect_anomaly(df_slice, sig, z_threshold=z_thresh, jump_threshold=rel_thresh)
-            if not df_anom.empty:
-                print(f" → {len(df_anom)} anomalies detected in {sig}")
-                anomaly_frames.append(df_anom)
-        except Exception as e:
-            print(f"Error detecting {sig}: {e}")
+    all_anoms = detect_anomalies_matrix(merged, signals, z_threshold=z_thresh, jump_threshold=rel_thresh)
+    if not all_anoms.empty:
+        for sig, n in all_anoms['signal'].value_counts(sort=False).items():
+            print(f" → {n} anomalies detected in {sig}")
+        anomaly_frames.append(all_anoms)
 
     # Fuse events occurring near same time (within 60 minutes)
-    if anomaly_frames:
-        all_anoms = pd.concat(anomaly_frames).sort_values('timestamp').reset_index(drop=True)
-        all_anoms['rounded'] = all_anoms['timestamp'].dt.round('60min')
-        grouped = all_anoms.groupby('rounded').agg({
-            'timestamp': ['min'],
-            'signal': lambda s: ','.join(sorted(s.unique())),
-            'value': 'max',
-            'z_score': 'max',
-            'jump': 'max'
-        })
-        # flatten columns
-        grouped.columns = ['timestamp_min', 'signals', 'max_value', 'max_z', 'max_rel_change']
-        grouped = grouped.reset_index(drop=True)
-        events = pd.DataFrame({
-            'event_time': grouped['timestamp_min'],
-            'signals': grouped['signals'],
-            'max_value': grouped['max_value'],
-            'max_z': grouped['max_z'],
-            'max_rel_change': grouped['max_rel_change']
-        })
-    else:
-        events = pd.DataFrame(columns=['event_time','signals','max_value','max_z','max_rel_change'])
+    events = fuse_events(anomaly_frames)
 
     print("\n=== Anomaly Summary ===")
     if events.empty:
@@ -572,130 +2082,458 @@ if __name__ == '__main__':
         print("\nInterrupted by user. Exiting.")
         sys.exit(0)
 
-def run_analysis_with_params(params):
+# -------------------------
+# Instrumentation
+# -------------------------
+def current_rss():
+    """Resident set size in bytes (Linux /proc; falls back to the process peak elsewhere)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+class RssSampler:
+    """Peak process RSS while the block runs, sampled from a background thread."""
+
+    def __init__(self, interval=0.01):
+        import threading
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+class StageMetrics:
+    """
+    Wall time, CPU time, rows in/out and peak RSS per pipeline stage.
+
+    CPU time is that of the calling thread (so concurrent jobs do not inflate
+    each other); peak RSS is process-wide, sampled every 10 ms.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.signals = {}
+        self._name = None
+
+    def start(self, name, rows_in=None):
+        import time
+        self.stop()
+        self._name = name
+        self.stages[name] = {'rows_in': rows_in, 'rows_out': None}
+        self._sampler = RssSampler().__enter__()
+        self._wall, self._cpu = time.perf_counter(), time.thread_time()
+
+    def record(self, rows_in=None, rows_out=None):
+        """Set row counts on the current stage."""
+        if self._name is None:
+            return
+        if rows_in is not None:
+            self.stages[self._name]['rows_in'] = int(rows_in)
+        if rows_out is not None:
+            self.stages[self._name]['rows_out'] = int(rows_out)
+
+    def stop(self):
+        import time
+        if self._name is None:
+            return
+        wall, cpu = time.perf_counter() - self._wall, time.thread_time() - self._cpu
+        self._sampler.__exit__(None, None, None)
+        self.stages[self._name].update({
+            'wall_seconds': round(wall, 4),
+            'cpu_seconds': round(cpu, 4),
+            'peak_rss_mb': round(self._sampler.peak / 2**20, 1)
+        })
+        self._name = None
+
+    def to_dict(self):
+        self.stop()
+        return {
+            'stages': self.stages,
+            'signals': self.signals,
+            'total': {
+                'wall_seconds': round(sum(s['wall_seconds'] for s in self.stages.values()), 4),
+                'cpu_seconds': round(sum(s['cpu_seconds'] for s in self.stages.values()), 4),
+                'peak_rss_mb': max((s['peak_rss_mb'] for s in self.stages.values()), default=None)
+            }
+        }
+
+def signal_metrics(merged, signals, anomalies=None, events=None, preds=None):
+    """Per-signal rows in (non-null hours), anomalies, fused events and flagged forecasts."""
+    counts = merged[signals].notna().sum()
+    per = {sig: {'rows_in': int(counts[sig]), 'anomalies': 0, 'events': 0, 'flagged_forecasts': 0}
+           for sig in signals}
+    if anomalies is not None and not anomalies.empty:
+        for sig, n in anomalies['signal'].value_counts().items():
+            per[sig]['anomalies'] = int(n)
+    if events is not None and not events.empty:
+        for sig, n in events['signals'].str.split(',').explode().value_counts().items():
+            per[sig]['events'] = int(n)
+    if preds is not None and not preds.empty:
+        for sig, n in preds.groupby('signal')['flag_upcoming_anomaly'].sum().items():
+            per[sig]['flagged_forecasts'] = int(n)
+    return per
+
+def _dump_profile(profiler, out):
+    """Write a cProfile run as pstats plus a text top-40 (cumulative time)."""
+    import io
+    import pstats
+    profiler.dump_stats(out('analysis_profile.pstats'))
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(40)
+    with open(out('analysis_profile.txt'), 'w') as f:
+        f.write(text.getvalue())
+    print(f"Saved profile -> {out('analysis_profile.pstats')}")
+
+def _persist_results(params, events, preds, coverage=None):
+    """
+    Upsert a run's events/forecasts into the params['results_db'] SQLite store; returns summary info.
+    coverage: {partition: (first, last hour)} analysed, so stored events there that this run
+    no longer reports are dropped (see ResultsStore.add_run()).
+    """
+    from results_store import ResultsStore
+    out_dir = params.get('output_dir') or '.'
+    run_id = params.get('run_id') or os.path.basename(os.path.abspath(out_dir))
+    try:
+        store = ResultsStore(params['results_db'])
+        try:
+            n_events, n_preds = store.add_run(run_id, events, preds, output_dir=out_dir, params=params,
+                                              coverage=coverage)
+        finally:
+            store.close()
+    except Exception as e:
+        # The CSV outputs are already written; a locked/corrupt database must not fail the run
+        print(f"Could not store results in {params['results_db']}: {e}")
+        return {'db': params['results_db'], 'error': str(e)}
+    print(f"Stored {n_events} events and {n_preds} forecasts in {params['results_db']} (run {run_id})")
+    return {'db': params['results_db'], 'run_id': run_id, 'events': n_events, 'predictions': n_preds}
+
+class AnalysisCancelled(Exception):
+    """Raised from a progress callback to stop run_analysis_with_params() between stages."""
+
+# Default threshold grid for params['sweep'] = True
+SWEEP_Z_GRID = [1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 5.0]
+SWEEP_REL_GRID = [0.1, 0.2, 0.3, 0.4, 0.6, 0.8, 1.0]
+
+# Hour-of-week profile for 'seasonal' detectors, kept next to the hourly store (or the merged
+# cache) unless params['seasonal_profile'] names a path, so every job extends the same baseline
+SEASONAL_PROFILE_FILE = 'seasonal_profile.json'
+
+# Stages reported to run_analysis_with_params() progress callbacks, in order
+ANALYSIS_STAGES = ['loading', 'merging', 'detecting', 'fusing', 'predicting', 'saving']
+
+def run_analysis_with_params(params, progress=None):
     """
     Run analysis with parameters from web UI
     params: dict containing z_threshold, rel_threshold, run_prediction, horizon, window_start, window_end
-            and optionally pune_path, aqi_path
+            and optionally pune_path, aqi_path, chunked_ingest, chunksize,
+            use_cache, cache_dir, cache_max_bytes, partition_by, max_workers, fuse_tolerance,
+            output_dir (where the CSV/JSON outputs are written, default: current directory),
+            profile (dump cProfile stats to analysis_profile.pstats/.txt),
+            compact (float32 signals + categorical text columns; bytes saved go in the summary),
+            verify_compact (with compact: also merge the inputs in float64 and compare the detected
+                            anomalies, see verify_compact_detection(); result in summary['compact'];
+                            skipped on a cache hit or chunked ingest, where the raw inputs are not loaded),
+            store_dir (append the merged hours to an hourly_store.HourlyStore there and detect on
+                       the stored series, optionally limited to store_from..store_to),
+            results_db (also upsert events/forecasts into this results_store.ResultsStore SQLite
+                        file, tagged with run_id, default: the output directory name),
+            rollups (default True: save day/week/month min/mean/max/count per signal to rollups.npz),
+            sweep (True or {'z': [...], 'rel': [...]}: also count anomalies/events for every threshold
+                   pair from the same scores, saved to sweep.json and summary['sweep']),
+            detectors ({signal: 'zscore' | 'robust' | 'seasonal'}: rolling median/MAD, or the
+                       hour-of-week baseline, instead of the rolling mean/std per signal),
+            seasonal_profile (SeasonalProfile JSON for the seasonal signals, loaded if present and
+                              updated with this run's new hours under an exclusive lock; default:
+                              seasonal_profile.json in store_dir, else in cache_dir)
+            forecaster_state (ForecasterState JSON: predictions come from this state, loaded if present
+                              and advanced by the hours after its last timestamp, instead of a refit
+                              over the merged history)
+    progress: optional callable(stage, **info) invoked as each stage in ANALYSIS_STAGES starts
+              (it may raise AnalysisCancelled to abort the run), and as
+              progress('output', file=<name>, rows=<n>) once each output file is written.
+    Returns the summary dict (or the error summary if the analysis failed).
     """
     import json
     from datetime import datetime
+
+    out_dir = params.get('output_dir') or '.'
+    os.makedirs(out_dir, exist_ok=True)
+
+    def out(name):
+        return os.path.join(out_dir, name)
+
+    metrics = StageMetrics()
+
+    def stage(name, **info):
+        if progress is not None:
+            progress(name, **info)
+        if name in ANALYSIS_STAGES:
+            metrics.start(name)
+
+    profiler = None
+    if params.get('profile'):
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiler (e.g. a concurrent job) is active
+            print("Profiler busy, running without profile")
+            profiler = None
     
     try:
         print(f"Starting analysis with parameters: {params}")
         
         # Load datasets
+        stage('loading')
         pune_path = params.get('pune_path')
         aqi_path = params.get('aqi_path')
         
-        pune_df = load_csv_safe(pune_path, "Pune") if pune_path else None
-        aqi_df = load_csv_safe(aqi_path, "AQI") if aqi_path else None
-
-        if pune_df is None or aqi_df is None:
-            print("Using demo data")
-            pune_df, aqi_df = generate_demo_data()
-
-        # Ensure timestamps
-        if 'timestamp' not in pune_df.columns and 'LASTUPDATEDATETIME' in pune_df.columns:
-            pune_df = pune_df.rename(columns={'LASTUPDATEDATETIME':'timestamp'})
-
-        if 'timestamp' not in aqi_df.columns:
-            print("AQI dataset lacks timestamp column — generating hourly index.")
-            aqi_df['timestamp'] = pd.date_range(start='2024-01-01', periods=len(aqi_df), freq='h')
-
-        # Merge data
-        merged = hourly_align_merge_safe(pune_df, aqi_df)
+        if params.get('partition_by'):
+            return _run_partitioned_with_params(params, pune_path, aqi_path, out, stage, metrics,
+                                                profiler is not None)
+
+        merged = None
+        cache = key = None
+        compact = bool(params.get('compact'))
+        compact_saved = {'raw_bytes_saved': 0, 'merged_bytes_saved': 0}
+        store = None
+        if params.get('store_dir'):
+            from hourly_store import HourlyStore
+            store = HourlyStore(params['store_dir'])
+        stored = False  # set once hourly_align_merge_safe() has appended to the store
+        if params.get('use_cache', True):
+            # threshold-only re-runs hit this and skip ingestion/resampling entirely
+            cache = MergedFrameCache(params.get('cache_dir', 'merged_cache'),
+                                     params.get('cache_max_bytes', 512 * 1024 * 1024))
+            have_files = pune_path and aqi_path and os.path.exists(pune_path) and os.path.exists(aqi_path)
+            inputs = [pune_path, aqi_path] if have_files else [None, None]
+            key = cache.key_for(inputs, chunked_ingest=bool(params.get('chunked_ingest')), compact=compact)
+            merged = cache.get(key)
+            if merged is not None:
+                print(f"Loaded merged frame from cache ({key})")
+                metrics.record(rows_out=len(merged))
+
+        if merged is None and params.get('chunked_ingest') and pune_path and aqi_path:
+            # Large exports: stream timestamp + signal columns straight into hourly means
+            chunksize = params.get('chunksize', 100_000)
+            pune_hourly = load_csv_hourly(pune_path, "Pune", chunksize=chunksize)
+            aqi_hourly = load_csv_hourly(aqi_path, "AQI", chunksize=chunksize)
+            if pune_hourly is not None and aqi_hourly is not None:
+                metrics.record(rows_out=len(pune_hourly) + len(aqi_hourly))
+                stage('merging')
+                metrics.record(rows_in=len(pune_hourly) + len(aqi_hourly))
+                merged = merge_hourly_frames(pune_hourly, aqi_hourly)
+                if compact:
+                    merged = merged.astype({c: np.float32 for c in merged.columns if c != 'timestamp'})
+                if cache is not None:
+                    cache.put(key, merged)
+
+        if merged is None:
+            pune_df = load_csv_safe(pune_path, "Pune") if pune_path else None
+            aqi_df = load_csv_safe(aqi_path, "AQI") if aqi_path else None
+
+            if pune_df is None or aqi_df is None:
+                print("Using demo data")
+                pune_df, aqi_df = generate_demo_data()
+
+            # Ensure timestamps
+            if 'timestamp' not in pune_df.columns and 'LASTUPDATEDATETIME' in pune_df.columns:
+                pune_df = pune_df.rename(columns={'LASTUPDATEDATETIME':'timestamp'})
+
+            if 'timestamp' not in aqi_df.columns:
+                print("AQI dataset lacks timestamp column — generating hourly index.")
+                aqi_df['timestamp'] = pd.date_range(start='2024-01-01', periods=len(aqi_df), freq='h')
+
+            reference_inputs = (pune_df, aqi_df) if compact and params.get('verify_compact') else None
+            if compact:
+                pune_df, saved_pune = compact_frame(pune_df)
+                aqi_df, saved_aqi = compact_frame(aqi_df)
+                compact_saved['raw_bytes_saved'] = saved_pune + saved_aqi
+                print(f"Compact mode: input frames {(saved_pune + saved_aqi) / 2**20:.1f} MB smaller")
+
+            # Merge data
+            metrics.record(rows_out=len(pune_df) + len(aqi_df))
+            stage('merging')
+            metrics.record(rows_in=len(pune_df) + len(aqi_df))
+            merged = hourly_align_merge_safe(pune_df, aqi_df, compact=compact, store=store)
+            if cache is not None:
+                cache.put(key, merged)
+            stored = True
+            if reference_inputs is not None:
+                check = verify_compact_detection(hourly_align_merge_safe(*reference_inputs), merged,
+                                                 z_threshold=params.get('z_threshold', 3.0),
+                                                 jump_threshold=params.get('rel_threshold', 0.6),
+                                                 methods=params.get('detectors') or None)
+                compact_saved['verification'] = check
+                print(f"Compact check: {check['anomalies_float32']} vs {check['anomalies_float64']} anomalies, "
+                      f"{check['mismatched']} mismatched, max |dz| {check['max_abs_z_diff']:.2e} "
+                      f"-> {'ok' if check['ok'] else 'EXCEEDS TOLERANCE'}")
+        if store is not None:
+            if not stored:  # cached / chunked merge: append here (already stored hours are skipped)
+                print(f"Appended {store.append(merged)} new hours to hourly store {store.store_dir}")
+            # Detectors read the stored history, not just this upload (frame() copies the mapped
+            # range; HourlyStore.arrays() is the zero-copy view)
+            merged = store.frame(params.get('store_from'), params.get('store_to'))
+        metrics.record(rows_out=len(merged))
         print(f"Merged timeseries rows: {len(merged)}")
+        if compact:
+            compact_saved['merged_bytes_saved'] = 4 * len(merged) * int((merged.dtypes == np.float32).sum())
 
         # Get parameters
         z_thresh = params.get('z_threshold', 3.0)
         rel_thresh = params.get('rel_threshold', 0.6)
         
         # Detect anomalies
-        candidate_signals = [
-            "PM2_MAX","PM2_MIN","PM10_MAX","PM10_MIN","NO_MAX","NO_MIN",
-            "NO2_MAX","NO2_MIN","OZONE_MAX","OZONE_MIN","SO2_MAX","SO2_MIN",
-            "CO_MAX","CO_MIN","AQI","PM2.5","PM10","NO2","CO","SO2","O3",
-            "traffic_count","Vehicle Count","Industrial Activity Index","SOUND"
-        ]
-        signals = [s for s in candidate_signals if s in merged.columns]
+        stage('detecting')
+        signals = [s for s in CANDIDATE_SIGNALS if s in merged.columns]
         
         print(f"Monitoring {len(signals)} signals with z_threshold={z_thresh}, rel_threshold={rel_thresh}")
         
         anomaly_frames = []
-        for sig in signals:
-            try:
-                df_slice = merged[['timestamp'] + [c for c in merged.columns if c == sig]]
-                df_anom = detect_anomaly(df_slice, sig, z_threshold=z_thresh, jump_threshold=rel_thresh)
-                if not df_anom.empty:
-                    print(f" → {len(df_anom)} anomalies in {sig}")
-                    anomaly_frames.append(df_anom)
-            except Exception as e:
-                print(f"Error detecting {sig}: {e}")
+        scores = sweep = profile = None
+        detectors = params.get('detectors') or None
+        if detectors:
+            print(f"Detectors: {', '.join(f'{sig}={m}' for sig, m in detectors.items())}")
+        if detectors and 'seasonal' in detectors.values() and signals:
+            # One hour-of-week profile shared by every run: load, extend and save it under an
+            # exclusive lock so concurrent jobs (or processes) do not drop each other's hours
+            from hourly_store import exclusive_lock
+            profile_path = params.get('seasonal_profile') or os.path.join(
+                params.get('store_dir') or params.get('cache_dir', 'merged_cache'), SEASONAL_PROFILE_FILE)
+            if os.path.dirname(profile_path):
+                os.makedirs(os.path.dirname(profile_path), exist_ok=True)
+            with exclusive_lock(profile_path + '.lock'):
+                profile = SeasonalProfile.load(profile_path) if os.path.exists(profile_path) else SeasonalProfile([])
+                scores = score_matrix(merged[signals].to_numpy(dtype=float), signals, detectors,
+                                      timestamps=merged['timestamp'], profile=profile)
+                profile.save(profile_path)
+            print(f"Seasonal profile ({profile.info()['slots_ready']}/{profile.period} slots ready) -> {profile_path}")
+        elif params.get('sweep') and signals:
+            # Score once; the sweep and the detection below only compare against thresholds
+            scores = score_matrix(merged[signals].to_numpy(dtype=float), signals, detectors,
+                                  timestamps=merged['timestamp'])
+        if params.get('sweep') and signals:
+            grid = params['sweep'] if isinstance(params['sweep'], dict) else {}
+            sweep = sweep_thresholds(merged, signals, grid.get('z') or SWEEP_Z_GRID, grid.get('rel') or SWEEP_REL_GRID,
+                                     tolerance=params.get('fuse_tolerance', '60min'), scores=scores)
+            with open(out('sweep.json'), 'w') as f:
+                json.dump(sweep, f)
+            print(f"Threshold sweep: {len(sweep['z_grid'])} x {len(sweep['rel_grid'])} grid -> {out('sweep.json')}")
+            stage('output', file='sweep.json', rows=len(sweep['z_grid']) * len(sweep['rel_grid']))
+        all_anoms = detect_anomalies_matrix(merged, signals, z_threshold=z_thresh, jump_threshold=rel_thresh,
+                                            scores=scores, methods=detectors)
+        metrics.record(rows_in=len(merged) * len(signals), rows_out=len(all_anoms))
+        if not all_anoms.empty:
+            for sig, n in all_anoms['signal'].value_counts(sort=False).items():
+                print(f" → {n} anomalies in {sig}")
+            anomaly_frames.append(all_anoms)
 
         # Fuse events
-        if anomaly_frames:
-            all_anoms = pd.concat(anomaly_frames).sort_values('timestamp').reset_index(drop=True)
-            all_anoms['rounded'] = all_anoms['timestamp'].dt.round('60min')
-            grouped = all_anoms.groupby('rounded').agg({
-                'timestamp': ['min'],
-                'signal': lambda s: ','.join(sorted(s.unique())),
-                'value': 'max',
-                'z_score': 'max',
-                'jump': 'max'
-            })
-            grouped.columns = ['timestamp_min', 'signals', 'max_value', 'max_z', 'max_rel_change']
-            grouped = grouped.reset_index(drop=True)
-            events = pd.DataFrame({
-                'event_time': grouped['timestamp_min'],
-                'signals': grouped['signals'],
-                'max_value': grouped['max_value'],
-                'max_z': grouped['max_z'],
-                'max_rel_change': grouped['max_rel_change']
-            })
-        else:
-            events = pd.DataFrame(columns=['event_time','signals','max_value','max_z','max_rel_change'])
+        stage('fusing')
+        events = fuse_events(anomaly_frames, tolerance=params.get('fuse_tolerance', '60min'))
+        metrics.record(rows_in=len(all_anoms), rows_out=len(events))
 
         # Save anomalies
-        events.to_csv('anomalies.csv', index=False)
-        print(f"Saved {len(events)} anomalies to anomalies.csv")
+        events.to_csv(out('anomalies.csv'), index=False)
+        print(f"Saved {len(events)} anomalies to {out('anomalies.csv')}")
+        stage('output', file='anomalies.csv', rows=len(events))
 
         # Run predictions if requested
         predictions_made = False
-        preds = None
+        preds = forecaster = None
         if params.get('run_prediction', False):
+            stage('predicting')
             horizon = params.get('horizon', 6)
             window_start = params.get('window_start', 7)
             window_end = params.get('window_end', 12)
             
             print(f"Running predictions: horizon={horizon}, alert_window={window_start}-{window_end}")
             
-            preds = predict_upcoming_anomalies(
-                merged,
-                horizon=horizon,
-                recent_window=24,
-                ewma_alpha=0.3,
-                z_warn=z_thresh,
-                rel_warn=rel_thresh,
-                out_csv='predicted_upcoming_anoms.csv'
-            )
+            state_path = params.get('forecaster_state')
+            if state_path:
+                # Incremental: only the hours after the saved state are read, no refit over the history
+                forecaster = ForecasterState.load(state_path) if os.path.exists(state_path) else ForecasterState([])
+                forecaster.add_signals(forecast_signals(merged))
+                print(f"Forecaster state: {forecaster.update_frame(merged)} new hours -> {state_path}")
+                forecaster.save(state_path)
+                preds = forecaster.predict(horizon=horizon, ewma_alpha=0.3, z_warn=z_thresh, rel_warn=rel_thresh,
+                                           out_csv=out('predicted_upcoming_anoms.csv'))
+            else:
+                preds = predict_upcoming_anomalies(
+                    merged,
+                    horizon=horizon,
+                    recent_window=24,
+                    ewma_alpha=0.3,
+                    z_warn=z_thresh,
+                    rel_warn=rel_thresh,
+                    out_csv=out('predicted_upcoming_anoms.csv')
+                )
             predictions_made = True
+            metrics.record(rows_in=len(merged) * len(signals), rows_out=len(preds))
+            if not preds.empty:
+                stage('output', file='predicted_upcoming_anoms.csv', rows=len(preds))
             
         # Save analysis summary
+        stage('saving')
+        if params.get('rollups', True) and signals:
+            from rollups import ROLLUP_FILE, build_rollups, save_rollups
+            rollups = build_rollups(merged, signals)
+            save_rollups(rollups, signals, out(ROLLUP_FILE))
+            print(f"Saved rollups ({', '.join(f'{r}: {len(ts)}' for r, (ts, _) in rollups.items())}) -> {out(ROLLUP_FILE)}")
+            stage('output', file=ROLLUP_FILE, rows=len(rollups['day'][0]))
+        metrics.signals = signal_metrics(merged, signals, all_anoms, events, preds)
         summary = {
             'total_anomalies': len(events),
             'total_predictions': len(preds) if predictions_made and preds is not None else 0,
             'parameters_used': params,
             'signals_monitored': signals,
             'time_range': f"{merged['timestamp'].min()} to {merged['timestamp'].max()}",
-            'analysis_time': datetime.now().isoformat()
+            'analysis_time': datetime.now().isoformat(),
+            'metrics': metrics.to_dict()  # 'saving' itself is measured up to this point
         }
+        if sweep is not None:
+            summary['sweep'] = sweep
+        if profile is not None:
+            summary['seasonal_profile'] = profile.info()
+        if forecaster is not None:
+            summary['forecaster_state'] = forecaster.info()
+        if compact:
+            summary['compact'] = compact_saved
+        if store is not None:
+            summary['hourly_store'] = store.info()
+        if params.get('results_db'):
+            coverage = {'': (merged['timestamp'].min(), merged['timestamp'].max())} if len(merged) else {}
+            summary['results_db'] = _persist_results(params, events, preds, coverage)
+        if profiler is not None:
+            summary['profile_file'] = 'analysis_profile.pstats'
         
-        with open('analysis_summary.json', 'w') as f:
+        with open(out('analysis_summary.json'), 'w') as f:
             json.dump(summary, f, indent=2, default=str)
             
         print("Analysis completed successfully!")
+        return summary
         
+    except AnalysisCancelled:
+        print("Analysis cancelled.")
+        raise
     except Exception as e:
         print(f"Analysis failed: {e}")
         import traceback
@@ -705,8 +2543,79 @@ def run_analysis_with_params(params):
         error_summary = {
             'error': str(e),
             'analysis_time': datetime.now().isoformat(),
-            'parameters_used': params
+            'parameters_used': params,
+            'metrics': metrics.to_dict()
         }
-        with open('analysis_error.json', 'w') as f:
+        with open(out('analysis_error.json'), 'w') as f:
+
+            json.dump(error_summary, f, indent=2, default=str)
+        return error_summary
+    finally:
+        metrics.stop()
+        if profiler is not None:
+            profiler.disable()
+            _dump_profile(profiler, out)
+
+def _run_partitioned_with_params(params, pune_path, aqi_path, out, stage, metrics, profiled=False):
+    """run_analysis_with_params() for params['partition_by']: one analysis per partition, combined outputs."""
+    import json
+    from datetime import datetime
 
-            json.dump(error_summary, f, indent=2)
+    frames = [load_csv_safe(pune_path, "Pune") if pune_path else None,
+              load_csv_safe(aqi_path, "AQI") if aqi_path else None]
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        print("Using demo data")
+        frames = list(generate_demo_data())
+    metrics.record(rows_out=sum(len(f) for f in frames))
+
+    z_thresh = params.get('z_threshold', 3.0)
+    rel_thresh = params.get('rel_threshold', 0.6)
+    # Merge, detection, fusion and prediction all run inside the partition workers;
+    # their CPU time is not included in this thread's cpu_seconds
+    stage('detecting')
+    metrics.record(rows_in=sum(len(f) for f in frames))
+    result = run_partitioned_analysis(
+        frames,
+        key=params['partition_by'],
+        z_threshold=z_thresh,
+        rel_threshold=rel_thresh,
+        run_prediction=params.get('run_prediction', False),
+        horizon=params.get('horizon', 6),
+        fuse_tolerance=params.get('fuse_tolerance', '60min'),
+        max_workers=params.get('max_workers'),
+        detectors=params.get('detectors') or None
+    )
+
+    events, preds = result['events'], result['predictions']
+    metrics.record(rows_out=len(events))
+    stage('saving')
+    events.to_csv(out('anomalies.csv'), index=False)
+    print(f"Saved {len(events)} anomalies across {len(result['partitions'])} partitions to {out('anomalies.csv')}")
+    stage('output', file='anomalies.csv', rows=len(events))
+    if not preds.empty:
+        preds.to_csv(out('predicted_upcoming_anoms.csv'), index=False)
+        print(f"Saved upcoming forecasts -> {out('predicted_upcoming_anoms.csv')}")
+        stage('output', file='predicted_upcoming_anoms.csv', rows=len(preds))
+
+    summary = {
+        'total_anomalies': len(events),
+        'total_predictions': len(preds),
+        'parameters_used': params,
+        'partition_by': params['partition_by'],
+        'partitions': result['partitions'],
+        'signals_monitored': sorted({s for p in result['partitions'].values() for s in p['signals']}),
+        'analysis_time': datetime.now().isoformat(),
+        'metrics': metrics.to_dict()
+    }
+    if profiled:
+        summary['profile_file'] = 'analysis_profile.pstats'
+    if params.get('results_db'):
+        coverage = {str(p): tuple(info['time_range'].split(' to '))
+                    for p, info in result['partitions'].items() if info['time_range']}
+        summary['results_db'] = _persist_results(params, events, preds, coverage)
+    with open(out('analysis_summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2, default=str)
+
+    print("Analysis completed successfully!")
+    return summary
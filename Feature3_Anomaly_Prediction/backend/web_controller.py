@@ -9,174 +9,655 @@ import socketserver
 import webbrowser
 import os
 import json
-import cgi
+import gzip
+import queue
+import socket
 import threading
-from urban_anomaly import run_analysis_with_params
-import pandas as pd
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import urlparse, parse_qs
+from job_manager import Job, JobManager, QueueFull
+from results_store import ResultsStore
+from multipart_upload import parse_multipart, MultipartError, UploadTooLarge
+
+# urban_anomaly, results_cache and rollups (numpy/pandas) are imported where they are
+# used: the first analysis job or results request pays for them, not server startup
 
 PORT = 8000
+MAX_CONCURRENT_JOBS = int(os.environ.get('GYATAH_MAX_JOBS', 2))
+MAX_QUEUED_JOBS = int(os.environ.get('GYATAH_MAX_QUEUED', 16))
+GZIP_MIN_BYTES = 1024
+UPLOAD_DIR = 'uploads'
+MAX_UPLOAD_BYTES = int(os.environ.get('GYATAH_MAX_UPLOAD_MB', 200)) * 1024 * 1024
+# Whole request body: both CSV uploads plus 1 MB for form fields and multipart framing
+MAX_REQUEST_BYTES = int(os.environ.get('GYATAH_MAX_REQUEST_MB', 2 * MAX_UPLOAD_BYTES // (1024 * 1024) + 1)) * 1024 * 1024
+HTTP_WORKERS = int(os.environ.get('GYATAH_HTTP_WORKERS', 32))
+KEEPALIVE_TIMEOUT = 15  # seconds an idle keep-alive connection may hold a worker
+MAX_EVENT_STREAMS = max(1, HTTP_WORKERS // 2)  # each open /api/events stream holds one HTTP worker
+SSE_HEARTBEAT = 15  # seconds between keep-alive comments on an idle event stream
+HOURLY_STORE_DIR = os.environ.get('GYATAH_HOURLY_STORE') or None  # persistent hourly history (off by default)
+RESULTS_DB = os.environ.get('GYATAH_RESULTS_DB', 'results.db')  # queryable event/forecast history
+SEASONAL_PROFILE = os.environ.get('GYATAH_SEASONAL_PROFILE') or None  # hour-of-week baselines (default: next to the store/cache)
+FORECASTER_STATE = os.environ.get('GYATAH_FORECASTER_STATE') or None  # incremental forecaster state (off by default)
+
+# Created in main() once the working directory is the backend dir
+job_manager = None
+results_store = None
+results_cache = None
+rollup_reader = None
+_lazy_lock = threading.Lock()
+
+def get_results_cache():
+    """Shared results_cache.ResultsCache, created on first use"""
+    global results_cache
+    if results_cache is None:
+        with _lazy_lock:
+            if results_cache is None:
+                from results_cache import ResultsCache
+                results_cache = ResultsCache()
+    return results_cache
+
+def get_rollup_reader():
+    """Shared rollups.RollupReader, created on first use"""
+    global rollup_reader
+    if rollup_reader is None:
+        with _lazy_lock:
+            if rollup_reader is None:
+                from rollups import RollupReader
+                rollup_reader = RollupReader()
+    return rollup_reader
+
+def run_analysis(params, progress=None):
+    """JobManager runner: urban_anomaly.run_analysis_with_params(), imported on the first job"""
+    from urban_anomaly import run_analysis_with_params
+    return run_analysis_with_params(params, progress=progress)
 
 class GyatahRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # Keep-alive: every response carries Content-Length, so clients can reuse connections
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+    # Headers and body go out as separate writes; without TCP_NODELAY a reused
+    # connection stalls ~40 ms per response on Nagle + delayed ACK
+    disable_nagle_algorithm = True
+    
     def __init__(self, *args, **kwargs):
         frontend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend')
+        self.cache_control = None
         super().__init__(*args, directory=frontend_dir, **kwargs)
     
+    def send_error(self, code, message=None, explain=None):
+        self.cache_control = None  # never let clients cache an error
+        super().send_error(code, message, explain)
+    
+    def end_headers(self):
+        if self.cache_control:
+            self.send_header('Cache-Control', self.cache_control)
+        # An idle keep-alive connection pins a worker; release it when others are waiting
+        saturated = getattr(self.server, 'saturated', None)
+        if not self.close_connection and saturated is not None and saturated():
+            self.send_header('Connection', 'close')
+        super().end_headers()
+    
     def do_GET(self):
-        if self.path == '/api/status':
+        url = urlparse(self.path)
+        self.cache_control = None  # the handler lives for the whole keep-alive connection
+        if url.path == '/api/status':
             self.handle_get_status()
-        elif self.path == '/api/get_results':
-            self.handle_get_results()
+        elif url.path == '/api/get_results':
+            self.handle_get_results(parse_qs(url.query))
+        elif url.path in ('/api/anomalies', '/api/predictions'):
+            self.handle_query_results(url.path[len('/api/'):], parse_qs(url.query))
+        elif url.path == '/api/series':
+            self.handle_get_series(parse_qs(url.query))
+        elif url.path == '/api/events':
+            self.handle_events(parse_qs(url.query))
+        elif url.path == '/api/jobs':
+            self.send_json({'jobs': [j.to_dict() for j in job_manager.list()]})
+        elif url.path.startswith('/api/jobs/'):
+            job_id, _, sub = url.path[len('/api/jobs/'):].strip('/').partition('/')
+            if sub == 'metrics':
+                self.handle_get_metrics(job_id)
+            elif sub == 'sweep':
+                self.handle_get_sweep(job_id)
+            elif sub == 'profile':
+                self.handle_get_profile(job_id)
+            else:
+                self.handle_get_job(job_id)
         else:
+            # Static assets: the dashboard revalidates (Last-Modified → 304), the rest may be cached
+            self.cache_control = 'no-cache' if url.path in ('/', '/gyatah_dashboard.html') else 'public, max-age=3600'
             super().do_GET()
     
-    def handle_get_status(self):
-        """Handle status check"""
-        self.send_response(200)
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload, default=str).encode()
+        self.send_response(status)
         self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
+        self.wfile.write(body)
+    
+    def handle_get_status(self):
+        """Handle status check"""
+        latest = job_manager.latest_completed()
+        results_dir = latest.output_dir if latest else '.'
         status = {
-            'analysis_running': False,  # We don't have a way to track yet, so always false
+            'analysis_running': job_manager.active_count() > 0,
+            'active_jobs': job_manager.active_count(),
+            'latest_job': latest.id if latest else None,
             'csv_files_exist': {
-                'anomalies': os.path.exists('anomalies.csv'),
-                'predictions': os.path.exists('predicted_upcoming_anoms.csv')
+                'anomalies': os.path.exists(os.path.join(results_dir, 'anomalies.csv')),
+                'predictions': os.path.exists(os.path.join(results_dir, 'predicted_upcoming_anoms.csv'))
             }
         }
-        self.wfile.write(json.dumps(status).encode())
+        self.send_json(status)
     
-    def handle_get_results(self):
-        """Handle GET request for results"""
+    def handle_get_job(self, job_id):
+        """Status, progress and stage timings of one job"""
+        job = job_manager.get(job_id)
+        if job is None:
+            self.send_error(404, "Unknown job")
+            return
+        self.send_json(job.to_dict())
+    
+    def send_event(self, event, data):
+        """Write one server-sent event; data is a JSON-able object or pre-encoded JSON bytes"""
+        if not isinstance(data, bytes):
+            data = json.dumps(data, default=str).encode()
+        self.wfile.write(b'event: ' + event.encode() + b'\ndata: ' + data + b'\n\n')
+        self.wfile.flush()
+    
+    def send_job_events(self, state, fmt='records'):
+        """Job state (a Job.to_dict() snapshot), plus the full results (from the snapshot cache) once it has completed"""
+        self.send_event('job', state)
+        if state['status'] == 'completed':
+            snap = get_results_cache().get(state['params']['output_dir'])
+            self.send_event('results', b'{"job_id": ' + json.dumps(state['job_id']).encode() +
+                            b', "results": ' + snap.encoded(fmt) + b'}')
+    
+    def handle_events(self, query):
+        """Server-sent events: job stage transitions, written outputs and final results (?job=<id> to follow one job)"""
+        job_id = (query.get('job') or [None])[0]
+        if job_id and job_manager.get(job_id) is None:
+            self.send_error(404, "Unknown job")
+            return
+        fmt = 'columnar' if (query.get('format') or [None])[0] == 'columnar' else 'records'
+        if job_manager.listener_count() >= MAX_EVENT_STREAMS:
+            self.send_json({'error': 'Too many event streams, poll /api/jobs instead'}, status=503)
+            return
+        events = job_manager.subscribe()
         try:
-            # Load and return analysis results
-            results = {}
+            # No Content-Length: the stream ends when the connection does
+            self.close_connection = True
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(b'retry: 3000\n\n')
             
-            if os.path.exists('anomalies.csv'):
-                try:
-                    anomalies_df = pd.read_csv('anomalies.csv')
-                    # Convert any date columns to string to avoid JSON serialization issues
-                    for col in anomalies_df.columns:
-                        if 'time' in col.lower() or 'date' in col.lower():
-                            anomalies_df[col] = anomalies_df[col].astype(str)
-                    results['anomalies'] = anomalies_df.to_dict('records')
-                except Exception as e:
-                    print(f"Error reading anomalies.csv: {e}")
-                    results['anomalies'] = []
+            # Current state first, so a (re)connecting client never misses a transition
+            if job_id:
+                job = job_manager.get(job_id)
+                self.send_job_events(job.to_dict(), fmt)
+                if job.done:
+                    return
+            else:
+                for job in job_manager.list():
+                    if not job.done:
+                        self.send_event('job', job.to_dict())
             
-            if os.path.exists('predicted_upcoming_anoms.csv'):
+            closing = getattr(self.server, 'closing', None)
+            last_write = time.time()
+            while closing is None or not closing.is_set():
                 try:
-                    predictions_df = pd.read_csv('predicted_upcoming_anoms.csv')
-                    # Convert any date columns to string
-                    for col in predictions_df.columns:
-                        if 'time' in col.lower() or 'date' in col.lower():
-                            predictions_df[col] = predictions_df[col].astype(str)
-                    results['predictions'] = predictions_df.to_dict('records')
-                except Exception as e:
-                    print(f"Error reading predictions.csv: {e}")
-                    results['predictions'] = []
-            
-            if os.path.exists('analysis_summary.json'):
+                    kind, event_job_id, data = events.get(timeout=1.0)
+                except queue.Empty:
+                    if time.time() - last_write >= SSE_HEARTBEAT:
+                        self.wfile.write(b': keep-alive\n\n')
+                        self.wfile.flush()
+                        last_write = time.time()
+                    continue
+                last_write = time.time()
+                if job_id and event_job_id != job_id:
+                    continue
+                if kind == 'output':
+                    self.send_event('output', dict(data, job_id=event_job_id))
+                    continue
+                self.send_job_events(data, fmt)
+                if job_id and data['status'] in Job.FINAL_STATES:
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client went away
+        finally:
+            job_manager.unsubscribe(events)
+    
+    def job_summary(self, job):
+        """The job's summary, falling back to the JSON it wrote (error summary for failed runs)"""
+        if job.summary is not None:
+            return job.summary
+        for name in ('analysis_summary.json', 'analysis_error.json'):
+            path = os.path.join(job.output_dir, name)
+            if os.path.exists(path):
+                with open(path) as f:
+                    return json.load(f)
+        return {}
+    
+    def handle_get_metrics(self, job_id):
+        """Per-stage and per-signal cost of one job (wall/CPU time, rows in/out, peak RSS)"""
+        job = job_manager.get(job_id)
+        if job is None:
+            self.send_error(404, "Unknown job")
+            return
+        summary = self.job_summary(job)
+        self.send_json({
+            'job_id': job.id,
+            'status': job.status,
+            'stage_timings': job.to_dict()['stage_timings'],
+            'metrics': summary.get('metrics'),
+            'profile': f"/api/jobs/{job.id}/profile" if summary.get('profile_file') else None
+        })
+    
+    def handle_get_sweep(self, job_id):
+        """Anomaly/event counts per (z, rel) threshold pair of a job run with sweep=true"""
+        job = job_manager.get(job_id)
+        if job is None:
+            self.send_error(404, "Unknown job")
+            return
+        sweep = self.job_summary(job).get('sweep')
+        if sweep is None:
+            self.send_error(404, "No threshold sweep for this job")
+            return
+        self.send_json(dict(sweep, job_id=job.id))
+    
+    def handle_get_profile(self, job_id):
+        """cProfile top functions of a job run with profile=true (text/plain)"""
+        job = job_manager.get(job_id)
+        path = os.path.join(job.output_dir, 'analysis_profile.txt') if job else None
+        if path is None or not os.path.exists(path):
+            self.send_error(404, "No profile for this job")
+            return
+        with open(path, 'rb') as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header('Content-type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def results_dir(self, query):
+        """Output directory for ?job=<id>, else the latest completed job (legacy: backend dir)"""
+        job_id = (query.get('job') or [None])[0]
+        if job_id:
+            job = job_manager.get(job_id)
+            return job.output_dir if job else None
+        latest = job_manager.latest_completed()
+        return latest.output_dir if latest else '.'
+    
+    def result_format(self, query):
+        """
+        Representation for /api/get_results: ?format=records|columnar|arrow, else the Accept header
+        (application/vnd.gyatah.columnar+json, application/vnd.apache.arrow.stream), else records.
+        """
+        from results_cache import FORMATS, ARROW_MIME, COLUMNAR_MIME
+        fmt = (query.get('format') or [None])[0]
+        if fmt:
+            return fmt if fmt in FORMATS else None
+        accept = self.headers.get('Accept', '')
+        if ARROW_MIME in accept:
+            return 'arrow'
+        if COLUMNAR_MIME in accept:
+            return 'columnar'
+        return 'records'
+    
+    def handle_get_results(self, query=None):
+        """
+        Handle GET request for results (cached snapshot, conditional, optional ?since=<version> delta).
+        ?format=columnar returns one array per column; ?format=arrow&table=anomalies|predictions an
+        Arrow IPC stream (requires pyarrow).
+        """
+        from results_cache import FORMATS, ARROW_MIME
+        try:
+            query = query or {}
+            results_dir = self.results_dir(query)
+            if results_dir is None:
+                self.send_error(404, "Unknown job")
+                return
+            fmt = self.result_format(query)
+            table = (query.get('table') or ['anomalies'])[0]
+            if fmt is None:
+                self.send_error(400, f"format must be one of {', '.join(FORMATS)}")
+                return
+            if fmt == 'arrow' and table not in ('anomalies', 'predictions'):
+                self.send_error(400, "table must be anomalies or predictions")
+                return
+            cache = get_results_cache()
+            snap = cache.get(results_dir)
+            last_modified = formatdate(snap.last_modified, usegmt=True)
+            etag = snap.etag_for(fmt if fmt != 'arrow' else f'arrow-{table}')
+
+            # Conditional request: nothing changed since the client's copy
+            if self.not_modified(etag, snap.last_modified):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                return
+
+            body = snap.encoded(fmt, table)
+            if body is None:
+                self.send_error(406, "Arrow output requires pyarrow on the server")
+                return
+            content_type = {'records': 'application/json', 'columnar': 'application/json',
+                            'arrow': ARROW_MIME}[fmt]
+            cache_control = 'no-cache'
+            since = (query.get('since') or [None])[0]
+            if since is not None and fmt == 'records':
                 try:
-                    with open('analysis_summary.json', 'r') as f:
-                        results['summary'] = json.load(f)
-                except Exception as e:
-                    print(f"Error reading summary: {e}")
-            
+                    delta = cache.delta(snap, int(since))
+                except ValueError:
+                    self.send_error(400, "since must be an integer version")
+                    return
+                if delta is not None:  # unknown/evicted base version falls back to the full snapshot
+                    body = json.dumps(delta).encode()
+                    # A partial body must never be stored or replayed as the full result
+                    etag = f'W/"{snap.version}-since-{int(since)}"'
+                    cache_control = 'no-store'
+                    
             self.send_response(200)
-            self.send_header('Content-type', 'application/json')
+            self.send_header('Content-type', content_type)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            self.send_header('Cache-Control', cache_control)
+            self.send_header('Vary', 'Accept, Accept-Encoding')
+            self.send_header('X-Results-Version', str(snap.version))
             self.send_header('Access-Control-Allow-Origin', '*')
+            if len(body) >= GZIP_MIN_BYTES and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                if body is snap.encoded(fmt, table):
+                    body = snap.gzip_body(fmt, table)
+                else:
+                    body = gzip.compress(body, compresslevel=5)
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(body)))
             self.end_headers()
-            self.wfile.write(json.dumps(results).encode())
+            self.wfile.write(body)
             
         except Exception as e:
             print(f"Error in handle_get_results: {e}")
             self.send_error(500, f"Error loading results: {str(e)}")
     
+    def handle_query_results(self, table, query):
+        """One page of stored history: ?from=&to=&signal=&partition=&run=&limit=&cursor="""
+        if results_store is None:
+            self.send_error(503, "Results store disabled")
+            return
+        def arg(name):
+            return (query.get(name) or [None])[0] or None
+        kwargs = {
+            'start': arg('from'),
+            'end': arg('to'),
+            'signal': arg('signal'),
+            'partition': arg('partition'),
+            'run_id': arg('run'),
+            'limit': arg('limit'),
+            'cursor': arg('cursor')
+        }
+        try:
+            if table == 'anomalies':
+                page = results_store.query_anomalies(**kwargs)
+            else:
+                page = results_store.query_predictions(flagged_only=arg('flagged') == 'true', **kwargs)
+        except ValueError as e:  # bad timestamp, limit or cursor
+            self.send_error(400, str(e))
+            return
+        self.send_json(page)
+    
+    def handle_get_series(self, query):
+        """
+        Chart series from the pre-computed rollups: ?signal=<name>[&signal=...]&from=&to=&width=<points>
+        (&resolution=hour|day|week|month to force one, &job=<id>). The resolution is the finest
+        whose bucket count over the range fits in width, so payloads stay bounded.
+        """
+        from rollups import ROLLUP_FILE
+        results_dir = self.results_dir(query)
+        if results_dir is None:
+            self.send_error(404, "Unknown job")
+            return
+        path = os.path.join(results_dir, ROLLUP_FILE)
+        if not os.path.exists(path):
+            self.send_error(404, "No rollups for these results")
+            return
+        signals = query.get('signal') or []
+        if not signals:
+            self.send_error(400, "signal is required")
+            return
+        def arg(name):
+            return (query.get(name) or [None])[0] or None
+        try:
+            width = min(max(int(arg('width') or 1000), 10), 10000)
+            payload = get_rollup_reader().series(path, signals, start=arg('from'), end=arg('to'), width=width,
+                                                 resolution=arg('resolution'))
+        except KeyError as e:
+            self.send_error(404, e.args[0])
+            return
+        except ValueError as e:  # bad timestamp or width
+            self.send_error(400, str(e))
+            return
+        self.cache_control = 'no-cache'
+        self.send_json(payload)
+    
+    def not_modified(self, etag, last_modified):
+        """True if the request's If-None-Match / If-Modified-Since validators still match"""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return if_none_match.strip() == '*' or etag in [t.strip() for t in if_none_match.split(',')]
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+    
     def do_POST(self):
-        if self.path == '/api/run_analysis':
+        path = urlparse(self.path).path
+        if path == '/api/run_analysis':
             self.handle_run_analysis()
+        elif path.startswith('/api/jobs/') and path.rstrip('/').endswith('/cancel'):
+            self.handle_cancel_job(path[len('/api/jobs/'):].rstrip('/')[:-len('/cancel')])
+        else:
+            self.send_error(404, "Endpoint not found")
+    
+    def do_DELETE(self):
+        path = urlparse(self.path).path
+        if path.startswith('/api/jobs/'):
+            self.handle_cancel_job(path[len('/api/jobs/'):].strip('/'))
         else:
             self.send_error(404, "Endpoint not found")
     
+    def handle_cancel_job(self, job_id):
+        """Cancel a queued job, or stop a running one at its next stage"""
+        if job_manager.get(job_id) is None:
+            self.send_error(404, "Unknown job")
+            return
+        cancelled = job_manager.cancel(job_id)
+        self.send_json({'job_id': job_id, 'cancel_requested': cancelled,
+                        'status': job_manager.get(job_id).status})
+    
     def handle_run_analysis(self):
         """Handle analysis request"""
         try:
             # Parse form data
             content_type = self.headers.get('Content-Type', '')
             if not content_type.startswith('multipart/form-data'):
+                self.close_connection = True  # body left unread
                 self.send_error(400, "Only multipart/form-data supported")
                 return
             
-            form = cgi.FieldStorage(
-                fp=self.rfile,
-                headers=self.headers,
-                environ={'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': content_type}
-            )
+            # Stream the body: uploads go to disk in chunks, hashed and deduplicated
+            try:
+                form, files = parse_multipart(self.rfile, content_type, self.headers.get('Content-Length'),
+                                              UPLOAD_DIR, max_file_bytes=MAX_UPLOAD_BYTES,
+                                              max_request_bytes=MAX_REQUEST_BYTES)
+            except UploadTooLarge as e:
+                self.close_connection = True
+                self.send_json({'status': 'rejected', 'error': str(e)}, status=413)
+                return
+            except MultipartError as e:
+                self.close_connection = True
+                self.send_json({'status': 'rejected', 'error': str(e)}, status=400)
+                return
             
             # Extract parameters with safe defaults
             params = {
-                'z_threshold': float(form.getvalue('z_threshold', 3.0)),
-                'rel_threshold': float(form.getvalue('rel_threshold', 0.6)),
-                'run_prediction': form.getvalue('run_prediction') == 'true',
-                'horizon': int(form.getvalue('horizon', 6)),
-                'window_start': int(form.getvalue('window_start', 7)),
-                'window_end': int(form.getvalue('window_end', 12))
+                'z_threshold': float(form.get('z_threshold', 3.0)),
+                'rel_threshold': float(form.get('rel_threshold', 0.6)),
+                'run_prediction': form.get('run_prediction') == 'true',
+                'horizon': int(form.get('horizon', 6)),
+                'window_start': int(form.get('window_start', 7)),
+                'window_end': int(form.get('window_end', 12)),
+                'chunked_ingest': form.get('chunked_ingest') == 'true',
+                'partition_by': form.get('partition_by') or None,
+                'profile': form.get('profile') == 'true',
+                'compact': form.get('compact') == 'true',
+                'verify_compact': form.get('verify_compact') == 'true',
+                'store_dir': HOURLY_STORE_DIR,
+                'store_from': form.get('store_from') or None,
+                'store_to': form.get('store_to') or None,
+                'results_db': RESULTS_DB if results_store is not None else None,
+                'sweep': parse_sweep(form) if form.get('sweep') == 'true' else None,
+                'detectors': parse_detectors(form),
+                'seasonal_profile': SEASONAL_PROFILE,
+                'forecaster_state': FORECASTER_STATE
             }
             
             print(f"Received parameters: {params}")
             
-            # Handle file uploads - FIXED: Proper FieldStorage checking
-            if 'pune_file' in form:
-                pune_file = form['pune_file']
-                if pune_file.filename:  # Check if filename is not empty
-                    pune_path = 'uploaded_pune.csv'
-                    with open(pune_path, 'wb') as f:
-                        f.write(pune_file.file.read())
-                    params['pune_path'] = pune_path
-                    print(f"Saved Pune file: {pune_file.filename}")
+            # Each job gets its own directory for outputs
+            job_id, _ = job_manager.create()
             
-            if 'aqi_file' in form:
-                aqi_file = form['aqi_file']
-                if aqi_file.filename:  # Check if filename is not empty
-                    aqi_path = 'uploaded_aqi.csv'
-                    with open(aqi_path, 'wb') as f:
-                        f.write(aqi_file.file.read())
-                    params['aqi_path'] = aqi_path
-                    print(f"Saved AQI file: {aqi_file.filename}")
+            # Uploads are stored by content hash, so re-uploading the same CSV reuses the
+            # stored file and (via the merged-frame cache) skips parsing it again
+            from urban_anomaly import register_file_hash
+            for field, key, label in (('pune_file', 'pune_path', 'Pune'), ('aqi_file', 'aqi_path', 'AQI')):
+                upload = files.get(field)
+                if upload is None:
+                    continue
+                register_file_hash(upload.path, upload.sha256)
+                params[key] = upload.path
+                print(f"{'Reused' if upload.deduplicated else 'Saved'} {label} file: "
+                      f"{upload.filename} → {upload.path} ({upload.size} bytes)")
             
-            # Run analysis in background thread
-            def run_analysis():
-                try:
-                    run_analysis_with_params(params)
-                except Exception as e:
-                    print(f"Analysis error: {e}")
-                    import traceback
-                    traceback.print_exc()
-            
-            analysis_thread = threading.Thread(target=run_analysis, daemon=True)
-            analysis_thread.start()
+            # Queue the analysis on the bounded worker pool
+            try:
+                job = job_manager.submit(job_id, params)
+            except QueueFull as e:
+                self.send_json({'status': 'rejected', 'error': f"Server busy: {e}"}, status=503)
+                return
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            response = {'status': 'analysis_started', 'params': params}
-            self.wfile.write(json.dumps(response).encode())
+            response = {'status': 'analysis_started', 'job_id': job.id, 'params': job.params}
+            self.send_json(response)
             
         except Exception as e:
             print(f"Error handling analysis request: {e}")
             import traceback
             traceback.print_exc()
+            self.close_connection = True
             self.send_error(500, f"Server error: {str(e)}")
 
+def parse_sweep(form):
+    """Threshold grid from the sweep_z / sweep_rel form fields (comma-separated; empty = default grid)"""
+    grid = {}
+    for key, field in (('z', 'sweep_z'), ('rel', 'sweep_rel')):
+        values = [float(v) for v in (form.get(field) or '').split(',') if v.strip()]
+        if values:
+            grid[key] = values[:50]  # the sweep is O(grid cells x candidate points)
+    return grid or True
+
+def parse_detectors(form):
+    """Per-signal detector engines from the robust_signals / seasonal_signals form fields (comma-separated)"""
+    detectors = {}
+    for method in ('robust', 'seasonal'):
+        for s in (form.get(f'{method}_signals') or '').split(','):
+            if s.strip():
+                detectors[s.strip()] = method
+    return detectors or None
+
+class BoundedThreadingHTTPServer(http.server.HTTPServer):
+    """HTTPServer that handles each connection on a fixed-size thread pool."""
+
+    request_queue_size = 128  # listen backlog; the default of 5 drops SYNs under a burst of pollers
+
+    def __init__(self, server_address, handler_class, workers=HTTP_WORKERS):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='http')
+        super().__init__(server_address, handler_class)
+        self.waiting = 0  # accepted connections not yet picked up by a worker
+        self.waiting_lock = threading.Lock()
+        self.active = set()  # connections currently held by a worker
+        self.closing = threading.Event()
+
+    def saturated(self):
+        """True while connections are queued; keep-alive clients are then asked to reconnect."""
+        return self.waiting > 0
+
+    def process_request(self, request, client_address):
+        with self.waiting_lock:
+            self.waiting += 1
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        with self.waiting_lock:
+            self.waiting -= 1
+            self.active.add(request)
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            with self.waiting_lock:
+                self.active.discard(request)
+            self.shutdown_request(request)
+
+    def server_close(self):
+        # Wake workers parked on keep-alive reads or event streams so shutdown is prompt
+        self.closing.set()
+        super().server_close()
+        with self.waiting_lock:
+            active = list(self.active)
+        for request in active:
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+def make_server(port=PORT, workers=HTTP_WORKERS):
+    """Concurrent server; workers=1 gives the old one-request-at-a-time behaviour."""
+    if workers <= 1:
+        # Keep-alive would let a single idle client block everyone else
+        handler = type('GyatahRequestHandler10', (GyatahRequestHandler,), {'protocol_version': 'HTTP/1.0'})
+        return socketserver.TCPServer(("", port), handler)
+    return BoundedThreadingHTTPServer(("", port), GyatahRequestHandler, workers)
+
 def main():
     # Change to backend directory
     backend_dir = os.path.dirname(os.path.abspath(__file__))
     os.chdir(backend_dir)
     
     # Create necessary directories if they don't exist
-    os.makedirs('uploads', exist_ok=True)
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    
+    global job_manager, results_store
+    results_store = ResultsStore(RESULTS_DB) if RESULTS_DB else None
+    job_manager = JobManager(run_analysis, jobs_dir='jobs',
+                             max_workers=MAX_CONCURRENT_JOBS, max_queued=MAX_QUEUED_JOBS)
     
-    with socketserver.TCPServer(("", PORT), GyatahRequestHandler) as httpd:
-        print(f"Gyatah Web Controller running at: http://localhost:{PORT}/")
+    with make_server(PORT, HTTP_WORKERS) as httpd:
+        print(f"Gyatah Web Controller running at: http://localhost:{PORT}/ ({HTTP_WORKERS} HTTP workers)")
         print("Press Ctrl+C to stop the server")
         
         # Open browser automatically
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark: cold `python -X importtime` for each service entry module,
+checked against a time budget and a list of heavy packages that must stay lazy.
+Exits 1 when a module is over budget or eagerly imports a forbidden package.
+Run: python benchmarks/bench_import_time.py [--repeat 5] [--top 10] [--json out.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+# (name, directory to import from, module, budget in ms, packages that must not load at import)
+TARGETS = [
+    ('urban_anomaly', 'Feature3_Anomaly_Prediction/backend', 'urban_anomaly', 600,
+     ['matplotlib']),
+    ('web_controller', 'Feature3_Anomaly_Prediction/backend', 'web_controller', 300,
+     ['matplotlib', 'numpy', 'pandas']),
+    ('AimlMapInsights.app', 'AimlMapInsights', 'app', 800,
+     ['sklearn', 'pandas', 'geopy', 'openai', 'numpy']),
+    ('Feature1_Map_AQI.app', 'Feature1_Map_AQI', 'app', 800,
+     ['sklearn', 'pandas', 'geopy', 'openai', 'numpy']),
+]
+
+
+def import_time(directory, module):
+    """One cold import in a fresh interpreter. Returns ({package: (self_us, cumulative_us)}, error)."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=os.path.join(ROOT, directory), capture_output=True, text=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    if proc.returncode != 0:
+        last = [l for l in proc.stderr.splitlines() if not l.startswith('import time:')]
+        return times, (last[-1] if last else f'exit code {proc.returncode}')
+    return times, None
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--repeat', type=int, default=5, help='fresh interpreters per module (median is reported)')
+    ap.add_argument('--top', type=int, default=8, help='heaviest top-level packages to list')
+    ap.add_argument('--scale', type=float, default=1.0, help='multiply all budgets (slow CI machines)')
+    ap.add_argument('--json', help='write results to this file')
+    args = ap.parse_args()
+
+    results, failed = {}, False
+    for name, directory, module, budget_ms, forbidden in TARGETS:
+        runs, error = [], None
+        for _ in range(args.repeat):
+            times, error = import_time(directory, module)
+            if error:
+                break
+            runs.append(times)
+        if error:
+            print(f"{name:<22} skipped ({error})")
+            results[name] = {'skipped': error}
+            continue
+
+        totals = sorted(r[module][1] / 1000 for r in runs)
+        median = totals[len(totals) // 2]
+        budget = budget_ms * args.scale
+        loaded = set(runs[0])
+        eager = [p for p in forbidden if p in loaded]
+        ok = median <= budget and not eager
+        failed |= not ok
+
+        print(f"{name:<22} {median:8.1f} ms (budget {budget:.0f} ms)  {'ok' if ok else 'FAIL'}"
+              + (f"  eagerly imports: {', '.join(eager)}" if eager else ''))
+        # Heaviest top-level packages (cumulative time of the outermost import of each)
+        top = sorted(((n, c / 1000) for n, (_, c) in runs[0].items() if '.' not in n and n != module),
+                     key=lambda x: -x[1])[:args.top]
+        for pkg, ms in top:
+            print(f"{'':<24}{pkg:<28} {ms:8.1f} ms")
+        results[name] = {'median_ms': median, 'runs_ms': totals, 'budget_ms': budget,
+                         'eager_forbidden': eager, 'ok': ok, 'top_packages_ms': dict(top)}
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.json}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
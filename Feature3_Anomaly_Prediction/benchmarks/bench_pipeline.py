@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite: every stage of the urban_anomaly pipeline on scaled demo data.
+Times load_csv_safe, hourly_align_merge_safe, detection, fuse_events,
+predict_upcoming_anomalies and build_and_save_report separately, with rows/s and
+peak RSS per stage, and writes a JSON result that --compare can diff against.
+With --compact it also merges in compact (float32) mode, reports the bytes saved and
+the anomaly mismatches / max |z| difference against float64, and exits 1 past --compact-tolerance.
+Run: python benchmarks/bench_pipeline.py [--sensors 4] [--years 2] [--anomaly-rate 0.002]
+                                         [--json out.json] [--compare baseline.json] [--compact]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from urban_anomaly import (CANDIDATE_SIGNALS, generate_demo_data, load_csv_safe, hourly_align_merge_safe,
+                           detect_anomalies_matrix, fuse_events, predict_upcoming_anomalies,
+                           build_and_save_report, compact_frame, verify_compact_detection, RssSampler)
+
+
+def run_stage(name, fn, rows_in, repeat, verbose, count=len):
+    """Best-of-repeat wall time; CPU time and peak RSS from the first run."""
+    best, out, peak = float('inf'), None, 0
+    for i in range(repeat):
+        quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with quiet, RssSampler(interval=0.005) as rss:
+            c0, t0 = time.process_time(), time.perf_counter()
+            out = fn()
+            wall, cpu = time.perf_counter() - t0, time.process_time() - c0
+        if i == 0:
+            peak, first_cpu = rss.peak, cpu
+        best = min(best, wall)
+    rows_out = count(out) if out is not None else None
+    result = {
+        'seconds': best,
+        'cpu_seconds': first_cpu,
+        'rows_in': rows_in,
+        'rows_out': rows_out,
+        'rows_per_sec': rows_in / best if best > 0 else None,
+        'peak_rss_mb': peak / 2**20
+    }
+    print(f"{name:<10} {best*1000:10.1f} ms  {result['rows_per_sec'] or 0:14,.0f} rows/s  "
+          f"{rows_in:>11,} → {rows_out if rows_out is not None else '-':>9}  peak {result['peak_rss_mb']:8.1f} MB")
+    return result, out
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, baseline_path, tolerance):
+    """Print per-stage time ratios against a previous run; returns the stages slower than tolerance."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline['meta'].get('commit')}):")
+    regressions = []
+    for name, stage in current['stages'].items():
+        old = baseline['stages'].get(name)
+        if not old:
+            continue
+        ratio = stage['seconds'] / old['seconds'] if old['seconds'] else float('inf')
+        mem = stage['peak_rss_mb'] - old['peak_rss_mb']
+        # Millisecond-scale stages are mostly noise; only flag slowdowns that also cost real time
+        slower = ratio > tolerance and stage['seconds'] - old['seconds'] > 0.005
+        flag = '  REGRESSION' if slower else ''
+        print(f"{name:<10} {old['seconds']*1000:10.1f} → {stage['seconds']*1000:10.1f} ms  "
+              f"x{ratio:5.2f}  peak {mem:+8.1f} MB{flag}")
+        if slower:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--sensors', type=int, default=4, help='stations stacked in the demo data')
+    ap.add_argument('--years', type=float, default=2.0, help='years of hourly data per sensor')
+    ap.add_argument('--anomaly-rate', type=float, default=0.002, help='fraction of hours with an injected spike')
+    ap.add_argument('--repeat', type=int, default=3, help='best-of repetitions per stage')
+    ap.add_argument('--z', type=float, default=3.0)
+    ap.add_argument('--rel', type=float, default=0.6)
+    ap.add_argument('--skip', default='', help='comma-separated stages to skip (e.g. report)')
+    ap.add_argument('--json', help='write results to this file')
+    ap.add_argument('--compare', help='previous --json output to compare against')
+    ap.add_argument('--tolerance', type=float, default=1.25,
+                    help='with --compare, exit 1 if a stage is slower than this ratio')
+    ap.add_argument('--compact', action='store_true',
+                    help='also merge in compact (float32) mode and check its anomalies against float64')
+    ap.add_argument('--compact-tolerance', type=float, default=1e-3,
+                    help='with --compact, exit 1 if max |z| difference exceeds this or a non-borderline anomaly differs')
+    ap.add_argument('--verbose', action='store_true', help='show the pipeline output')
+    args = ap.parse_args()
+    skip = {s for s in args.skip.split(',') if s}
+
+    hours = int(args.years * 365 * 24)
+    pune, aqi = generate_demo_data(start='2020-01-01', hours=hours, sensors=args.sensors,
+                                   anomaly_rate=args.anomaly_rate)
+    print(f"{args.sensors} sensors x {hours} hours → {len(pune):,} + {len(aqi):,} rows")
+
+    stages = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        pune_csv, aqi_csv = os.path.join(tmp, 'pune.csv'), os.path.join(tmp, 'aqi.csv')
+        # Real Pune exports carry LASTUPDATEDATETIME rather than a timestamp column
+        pune.drop(columns=['timestamp']).to_csv(pune_csv, index=False)
+        aqi.to_csv(aqi_csv, index=False)
+        rows = len(pune) + len(aqi)
+
+        if 'load_csv' not in skip:
+            stages['load_csv'], (pune, aqi) = run_stage(
+                'load_csv', lambda: (load_csv_safe(pune_csv, 'Pune'), load_csv_safe(aqi_csv, 'AQI')),
+                rows, args.repeat, args.verbose, count=lambda frames: sum(len(f) for f in frames))
+        else:
+            pune = pune.drop(columns=['LASTUPDATEDATETIME'])
+
+        stages['merge'], merged = run_stage('merge', lambda: hourly_align_merge_safe(pune, aqi),
+                                            rows, args.repeat, args.verbose)
+        signals = [s for s in CANDIDATE_SIGNALS if s in merged.columns]
+        cells = len(merged) * len(signals)
+
+        stages['detect'], anoms = run_stage(
+            'detect', lambda: detect_anomalies_matrix(merged, signals, z_threshold=args.z, jump_threshold=args.rel),
+            cells, args.repeat, args.verbose)
+        compact_check = None
+        if args.compact:
+            (pune_c, raw_saved), (aqi_c, aqi_saved) = compact_frame(pune), compact_frame(aqi)
+            stages['merge_compact'], merged_c = run_stage(
+                'merge_c', lambda: hourly_align_merge_safe(pune_c, aqi_c, compact=True),
+                rows, args.repeat, args.verbose)
+            compact_check = verify_compact_detection(merged, merged_c, signals, z_threshold=args.z,
+                                                     jump_threshold=args.rel, tolerance=args.compact_tolerance)
+            compact_check['raw_bytes_saved'] = raw_saved + aqi_saved
+            compact_check['merged_bytes_saved'] = int(merged.memory_usage(deep=True).sum()
+                                                      - merged_c.memory_usage(deep=True).sum())
+            print(f"compact    {compact_check['raw_bytes_saved'] / 2**20:.1f} MB raw + "
+                  f"{compact_check['merged_bytes_saved'] / 2**20:.1f} MB merged saved; anomalies "
+                  f"{compact_check['anomalies_float32']} vs {compact_check['anomalies_float64']}, "
+                  f"{compact_check['mismatched']} mismatched ({compact_check['unexplained']} unexplained), "
+                  f"max |dz| {compact_check['max_abs_z_diff']:.2e} -> {'ok' if compact_check['ok'] else 'FAIL'}")
+            del merged_c
+
+        stages['fuse'], events = run_stage('fuse', lambda: fuse_events(anoms), len(anoms),
+                                           args.repeat, args.verbose)
+        if 'predict' not in skip:
+            stages['predict'], _ = run_stage(
+                'predict', lambda: predict_upcoming_anomalies(merged, z_warn=args.z, rel_warn=args.rel, out_csv=None),
+                cells, args.repeat, args.verbose)
+        if 'report' not in skip:
+            report_dir = os.path.join(tmp, 'report')
+            stages['report'], _ = run_stage(
+                'report', lambda: build_and_save_report(merged, events, report_dir, force=True),
+                len(merged), args.repeat, args.verbose)
+
+    total = sum(s['seconds'] for s in stages.values())
+    peak = max(s['peak_rss_mb'] for s in stages.values())
+    print(f"{'total':<10} {total*1000:10.1f} ms  peak RSS {peak:.1f} MB")
+
+    result = {
+        'meta': {
+            'commit': git_commit(),
+            'time': pd.Timestamp.now().isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'params': {'sensors': args.sensors, 'years': args.years, 'hours': hours,
+                       'anomaly_rate': args.anomaly_rate, 'z': args.z, 'rel': args.rel,
+                       'repeat': args.repeat, 'merged_rows': len(merged), 'signals': len(signals)}
+        },
+        'stages': stages,
+        'compact': compact_check,
+        'total_seconds': total,
+        'peak_rss_mb': peak
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Wrote {args.json}")
+    if compact_check is not None and not compact_check['ok']:
+        sys.exit(1)
+    if args.compare and compare(result, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
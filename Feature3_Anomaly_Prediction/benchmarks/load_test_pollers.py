@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Load test: N dashboard pollers hammering /api/status and /api/get_results.
+Starts web_controller in a child process for each --workers setting (or targets --url)
+and reports throughput and latency per concurrency level.
+Run: python benchmarks/load_test_pollers.py [--workers 1,32] [--clients 1,8,32,64] [--duration 5]
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, BACKEND)
+
+
+def serve(port, workers, results_dir, ready):
+    """Child process: web controller over a directory holding one finished analysis."""
+    import web_controller
+    from job_manager import JobManager
+    from urban_anomaly import run_analysis_with_params
+    os.chdir(results_dir)
+    web_controller.GyatahRequestHandler.log_message = lambda *a: None  # keep stderr out of the timings
+    web_controller.job_manager = JobManager(run_analysis_with_params, jobs_dir='jobs')
+    with web_controller.make_server(port, workers) as httpd:
+        ready.set()
+        httpd.serve_forever()
+
+
+def poller(host, port, deadline, latencies, errors, keepalive):
+    """One dashboard: alternate status and (conditional) results requests until the deadline."""
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    etag = None
+    paths = ['/api/status', '/api/get_results']
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % 2]
+        headers = {'Accept-Encoding': 'gzip'}
+        if not keepalive:
+            headers['Connection'] = 'close'
+        if path == '/api/get_results' and etag:
+            headers['If-None-Match'] = etag
+        t0 = time.perf_counter()
+        try:
+            conn.request('GET', path, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status not in (200, 304):
+                errors.append(resp.status)
+            elif path == '/api/get_results':
+                etag = resp.getheader('ETag') or etag
+            latencies.append(time.perf_counter() - t0)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+        i += 1
+    conn.close()
+
+
+def run_level(host, port, clients, duration, keepalive):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=poller, args=(host, port, deadline, latencies, errors, keepalive))
+               for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    lat = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        'clients': clients,
+        'requests': len(latencies),
+        'rps': len(latencies) / duration,
+        'p50_ms': float(np.percentile(lat, 50)),
+        'p95_ms': float(np.percentile(lat, 95)),
+        'max_ms': float(lat.max()),
+        'errors': len(errors)
+    }
+
+
+def prepare_results(folder):
+    """Run one demo analysis so /api/get_results has something realistic to serve."""
+    from urban_anomaly import run_analysis_with_params
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        run_analysis_with_params({'z_threshold': 2.0, 'rel_threshold': 0.2, 'run_prediction': True,
+                                  'use_cache': False})
+    finally:
+        os.chdir(cwd)
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    print(f"{'clients':>8} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'errors':>7}")
+    for r in rows:
+        print(f"{r['clients']:>8} {r['rps']:>9.0f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+              f"{r['max_ms']:>9.1f} {r['errors']:>7}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument('--workers', default='1,32', help='comma-separated HTTP worker counts to compare')
+    ap.add_argument('--clients', default='1,8,32,64', help='comma-separated concurrent poller counts')
+    ap.add_argument('--duration', type=float, default=5.0, help='seconds per concurrency level')
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--url', help='test an already running server instead (e.g. http://localhost:8000)')
+    ap.add_argument('--no-keepalive', action='store_true', help='open a new connection per request')
+    args = ap.parse_args()
+    clients = [int(c) for c in args.clients.split(',')]
+    keepalive = not args.no_keepalive
+
+    if args.url:
+        url = urlparse(args.url)
+        rows = [run_level(url.hostname, url.port or 80, c, args.duration, keepalive) for c in clients]
+        print_table(args.url, rows)
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        print("Preparing demo results ...")
+        prepare_results(folder)
+        ctx = multiprocessing.get_context('spawn')
+        for i, workers in enumerate(int(w) for w in args.workers.split(',')):
+            port = args.port + i  # fresh port per server; the last one may still be in TIME_WAIT
+            ready = ctx.Event()
+            proc = ctx.Process(target=serve, args=(port, workers, folder, ready), daemon=True)
+            proc.start()
+            if not ready.wait(30):
+                proc.terminate()
+                raise SystemExit("server did not start")
+            try:
+                rows = [run_level('127.0.0.1', port, c, args.duration, keepalive) for c in clients]
+            finally:
+                proc.terminate()
+                proc.join()
+            mode = 'single-threaded TCPServer' if workers <= 1 else f'{workers} HTTP workers, keep-alive'
+            print_table(f"workers={workers} ({mode})", rows)
+
+
+if __name__ == '__main__':
+    main()
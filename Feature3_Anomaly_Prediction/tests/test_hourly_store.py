@@ -0,0 +1,60 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from hourly_store import HourlyStore
+
+
+def hourly(start, hours, **columns):
+    df = pd.DataFrame({'timestamp': pd.date_range(start, periods=hours, freq='h')})
+    for name, values in columns.items():
+        df[name] = np.asarray(values, dtype=float)
+    return df
+
+
+def test_append_skips_stored_hours_and_fills_gaps(tmp_path):
+    store = HourlyStore(str(tmp_path / 'store'))
+    assert store.append(hourly('2024-01-01', 4, AQI=[1, 2, 3, 4])) == 4
+    # overlaps two stored hours, then leaves a one-hour gap and adds a column
+    later = pd.concat([hourly('2024-01-01 02:00', 3, AQI=[30, 40, 50]),
+                       hourly('2024-01-01 06:00', 1, AQI=[70], SOUND=[7])])
+    assert store.append(later) == 3
+
+    df = HourlyStore(str(tmp_path / 'store')).frame()
+    assert list(df['timestamp']) == list(pd.date_range('2024-01-01', periods=7, freq='h'))
+    np.testing.assert_array_equal(df['AQI'], [1, 2, 3, 4, 50, np.nan, 70])
+    np.testing.assert_array_equal(df['SOUND'], [np.nan] * 6 + [7])
+
+
+def test_range_reads(tmp_path):
+    store = HourlyStore(str(tmp_path / 'store'))
+    store.append(hourly('2024-01-01', 48, AQI=np.arange(48)))
+    ts, arrays = store.arrays('2024-01-02 00:00', '2024-01-02 03:00')
+    assert len(ts) == 4 and ts[0] == np.datetime64('2024-01-02T00:00', 'ns')
+    np.testing.assert_array_equal(arrays['AQI'], [24, 25, 26, 27])
+    assert len(store.frame('2024-01-03', None)) == 0
+
+
+def test_concurrent_appends_keep_every_hour_once(tmp_path):
+    path = str(tmp_path / 'store')
+    values = np.arange(240, dtype=float)
+    batches = [hourly(pd.Timestamp('2024-01-01') + pd.Timedelta(hours=i), 24, AQI=values[i:i + 24])
+               for i in range(0, 217, 8)]  # overlapping windows, appended in arbitrary order
+
+    def worker(k):
+        for batch in batches[k::4]:
+            HourlyStore(path).append(batch)
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    df = HourlyStore(path).frame()
+    assert len(df) == 240
+    assert df['timestamp'].is_monotonic_increasing
+    # hours are only ever appended after the stored end, so every stored value is the original one
+    stored = df['AQI'].to_numpy()
+    assert np.array_equal(stored[~np.isnan(stored)], values[~np.isnan(stored)])
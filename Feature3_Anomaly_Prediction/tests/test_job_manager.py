@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+
+import pytest
+
+from job_manager import JobManager, QueueFull
+
+
+def read_until_finished(events, timeout=10):
+    out = []
+    while not (out and out[-1][0] == 'job' and out[-1][2]['status'] in ('completed', 'failed', 'cancelled')):
+        out.append(events.get(timeout=timeout))
+    return out
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_events_carry_the_state_at_notify_time(tmp_path):
+    def runner(params, progress):
+        for stage in ('loading', 'merging', 'detecting'):
+            progress(stage)
+        progress('output', file='anomalies.csv', rows=3)
+        return {}
+
+    manager = JobManager(runner, jobs_dir=str(tmp_path / 'jobs'), max_workers=1)
+    events = manager.subscribe()
+    job_id, _ = manager.create()
+    job = manager.submit(job_id, {})
+    wait_for(lambda: job.done)
+
+    # Read only after the job has finished: the snapshots must still show every transition
+    got = read_until_finished(events)
+    assert all(event_job_id == job_id for _, event_job_id, _ in got)
+    states = [(data['status'], data['stage']) for kind, _, data in got if kind == 'job']
+    assert states == [('queued', None), ('running', None), ('running', 'loading'), ('running', 'merging'),
+                      ('running', 'detecting'), ('completed', 'detecting')]
+    outputs = [data for kind, _, data in got if kind == 'output']
+    assert outputs == [{'file': 'anomalies.csv', 'rows': 3}]
+
+
+def test_full_queue_removes_the_rejected_job_dir(tmp_path):
+    release = threading.Event()
+    manager = JobManager(lambda params, progress: release.wait(), jobs_dir=str(tmp_path / 'jobs'),
+                         max_workers=1, max_queued=1)
+    try:
+        running_id, _ = manager.create()
+        running = manager.submit(running_id, {})
+        wait_for(lambda: running.status == 'running')
+        queued_id, _ = manager.create()
+        manager.submit(queued_id, {})
+
+        rejected_id, rejected_dir = manager.create()
+        with pytest.raises(QueueFull):
+            manager.submit(rejected_id, {})
+        assert not os.path.exists(rejected_dir)
+        assert manager.get(rejected_id) is None
+        assert sorted(os.listdir(tmp_path / 'jobs')) == sorted([running_id, queued_id])
+    finally:
+        release.set()
+
+
+def test_cancel_queued_job(tmp_path):
+    release = threading.Event()
+    manager = JobManager(lambda params, progress: release.wait(), jobs_dir=str(tmp_path / 'jobs'),
+                         max_workers=1)
+    try:
+        first_id, _ = manager.create()
+        manager.submit(first_id, {})
+        second_id, _ = manager.create()
+        second = manager.submit(second_id, {})
+        assert manager.cancel(second_id)
+        assert second.status == 'cancelled'
+        assert not manager.cancel(second_id)
+    finally:
+        release.set()
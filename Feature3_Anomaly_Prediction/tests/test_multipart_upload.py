@@ -0,0 +1,78 @@
+import io
+import os
+
+import pytest
+
+from multipart_upload import MultipartError, UploadTooLarge, parse_multipart
+
+BOUNDARY = 'gyatah-test'
+CONTENT_TYPE = f'multipart/form-data; boundary={BOUNDARY}'
+
+
+def body(*parts):
+    """parts: (name, value bytes, filename or None)"""
+    out = b''
+    for name, value, filename in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename is not None else '')
+        out += f'--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n'.encode() + value + b'\r\n'
+    return out + f'--{BOUNDARY}--\r\n'.encode()
+
+
+def parse(data, upload_dir, **kwargs):
+    return parse_multipart(io.BytesIO(data), CONTENT_TYPE, str(len(data)), str(upload_dir), **kwargs)
+
+
+class UnreadableStream:
+    def read(self, n=-1):
+        raise AssertionError("body read after the request was rejected")
+
+
+def test_fields_and_files(tmp_path):
+    csv = b'timestamp,AQI\n2024-01-01 00:00,42\n'
+    fields, files = parse(body(('z_threshold', b'2.5', None), ('aqi_file', csv, 'aqi.csv'),
+                               ('pune_file', b'', '')), tmp_path, chunk_size=7)
+    assert fields == {'z_threshold': '2.5'}
+    assert list(files) == ['aqi_file']
+    upload = files['aqi_file']
+    assert upload.filename == 'aqi.csv' and upload.size == len(csv) and not upload.deduplicated
+    with open(upload.path, 'rb') as f:
+        assert f.read() == csv
+
+    _, again = parse(body(('aqi_file', csv, 'copy.csv')), tmp_path)
+    assert again['aqi_file'].deduplicated and again['aqi_file'].path == upload.path
+
+
+def test_oversized_content_length_is_rejected_before_reading(tmp_path):
+    with pytest.raises(UploadTooLarge):
+        parse_multipart(UnreadableStream(), CONTENT_TYPE, str(10**9), str(tmp_path), max_request_bytes=10**6)
+
+
+@pytest.mark.parametrize('content_length', [None, 'abc', '-1'])
+def test_invalid_content_length(tmp_path, content_length):
+    with pytest.raises(MultipartError):
+        parse_multipart(UnreadableStream(), CONTENT_TYPE, content_length, str(tmp_path))
+
+
+def test_field_count_limit(tmp_path):
+    parts = [(f'f{i}', b'1', None) for i in range(5)]
+    assert len(parse(body(*parts), tmp_path, max_fields=5)[0]) == 5
+    with pytest.raises(UploadTooLarge):
+        parse(body(*parts, ('extra', b'1', None)), tmp_path, max_fields=5)
+
+
+def test_field_size_limit(tmp_path):
+    assert parse(body(('note', b'x' * 100, None)), tmp_path, max_field_bytes=100)[0]['note'] == 'x' * 100
+    with pytest.raises(UploadTooLarge):
+        parse(body(('note', b'x' * 101, None)), tmp_path, max_field_bytes=100, chunk_size=16)
+
+
+def test_file_size_limit_leaves_no_partial_upload(tmp_path):
+    with pytest.raises(UploadTooLarge):
+        parse(body(('aqi_file', b'1,2\n' * 1000, 'aqi.csv')), tmp_path, max_file_bytes=1000, chunk_size=256)
+    assert os.listdir(tmp_path) == []
+
+
+def test_missing_boundary(tmp_path):
+    data = body(('a', b'1', None))
+    with pytest.raises(MultipartError):
+        parse_multipart(io.BytesIO(data), 'multipart/form-data', str(len(data)), str(tmp_path))
@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+
+from results_store import ResultsStore
+
+DAY = {'': ('2024-01-01 00:00', '2024-01-01 23:00')}
+
+
+def events(*hours, signals='PM2.5,AQI'):
+    return pd.DataFrame({
+        'event_time': pd.to_datetime(list(hours)),
+        'signals': signals,
+        'max_value': 1.0,
+        'max_z': 4.0,
+        'max_rel_change': 0.8
+    })
+
+
+def forecasts(signal, *hours):
+    return pd.DataFrame({
+        'signal': signal,
+        'horizon_hours': range(1, len(hours) + 1),
+        'forecast_time': pd.to_datetime(list(hours)),
+        'forecast_value': 10.0,
+        'flag_upcoming_anomaly': True
+    })
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(str(tmp_path / 'results.db'))
+    yield store
+    store.close()
+
+
+def times(page):
+    return [(r['event_time'], r['run_id']) for r in page['rows']]
+
+
+def test_rerun_drops_events_that_no_longer_fire(store):
+    store.add_run('r1', events('2024-01-01 03:00', '2024-01-01 05:00'), coverage=DAY)
+    store.add_run('r2', events('2024-01-01 05:00'), coverage=DAY)
+
+    assert times(store.query_anomalies()) == [('2024-01-01 05:00:00', 'r2')]
+    assert times(store.query_anomalies(signal='AQI')) == [('2024-01-01 05:00:00', 'r2')]
+
+
+def test_rerun_without_events_clears_its_range_only(store):
+    store.add_run('r1', events('2024-01-01 03:00', '2024-01-02 03:00'))
+    store.add_run('r2', None, coverage=DAY)
+
+    assert times(store.query_anomalies()) == [('2024-01-02 03:00:00', 'r1')]
+    assert store.query_anomalies(signal='PM2.5')['count'] == 1
+
+
+def test_other_partitions_are_kept(store):
+    ev = events('2024-01-01 03:00')
+    store.add_run('r1', ev.assign(partition='Pune'), coverage={'Pune': DAY['']})
+    store.add_run('r2', ev.assign(partition='Delhi'), coverage={'Delhi': DAY['']})
+    store.add_run('r3', None, coverage={'Pune': DAY['']})
+
+    rows = store.query_anomalies()['rows']
+    assert [(r['partition'], r['run_id']) for r in rows] == [('Delhi', 'r2')]
+
+
+def test_new_forecasts_replace_older_ones_for_the_same_hours(store):
+    store.add_run('r1', None, forecasts('PM2.5', '2024-01-02 01:00', '2024-01-02 02:00'), coverage={})
+    store.add_run('r2', None, forecasts('AQI', '2024-01-02 01:00', '2024-01-02 02:00'), coverage={})
+
+    rows = store.query_predictions()['rows']
+    assert [(r['signal'], r['run_id']) for r in rows] == [('AQI', 'r2'), ('AQI', 'r2')]
+    assert all(r['flag_upcoming_anomaly'] is True for r in rows)
+
+
+def test_paging_with_cursor(store):
+    store.add_run('r1', events(*[f'2024-01-01 {h:02d}:00' for h in range(10)]), coverage=DAY)
+    first = store.query_anomalies(limit=4)
+    second = store.query_anomalies(limit=4, cursor=first['next_cursor'])
+    assert first['count'] == second['count'] == 4
+    assert first['rows'][-1]['event_time'] < second['rows'][0]['event_time']
+    with pytest.raises(ValueError):
+        store.query_anomalies(cursor='not-a-cursor')
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from urban_anomaly import SeasonalProfile, seasonal_slot
+
+SIGNALS = ['AQI', 'traffic_count']
+
+
+@pytest.fixture(scope='module')
+def history():
+    rng = np.random.default_rng(7)
+    n = 24 * 7 * 20
+    ts = pd.date_range('2024-01-01', periods=n, freq='h')
+    daily = np.sin(np.arange(n) * 2 * np.pi / 24)[:, None] * [5, 50]
+    values = daily + rng.normal(size=(n, 2)) * [1, 10]
+    values[rng.random(values.shape) < 0.05] = np.nan
+    return ts, values
+
+
+def test_slot_is_hour_of_week_from_monday():
+    assert seasonal_slot(pd.to_datetime(['2024-01-01 00:00', '2024-01-07 23:00', '2024-01-08 01:00'])).tolist() == \
+        [0, 167, 1]  # 2024-01-01 was a Monday
+
+
+def test_rescoring_the_same_history_reproduces_the_first_pass(history):
+    ts, values = history
+    profile = SeasonalProfile(SIGNALS)
+    first = profile.score_update(ts, values)
+    assert np.isfinite(first).mean() > 0.5
+    np.testing.assert_array_equal(profile.score_update(ts, values), first)
+
+
+def test_longer_history_scores_like_one_pass(history):
+    ts, values = history
+    one_pass = SeasonalProfile(SIGNALS).score_update(ts, values)
+    profile = SeasonalProfile(SIGNALS)
+    profile.score_update(ts[:1500], values[:1500])
+    np.testing.assert_allclose(profile.score_update(ts, values), one_pass, equal_nan=True)
+
+
+def test_rows_are_scored_against_earlier_weeks_only(history):
+    ts, values = history
+    spiked = values.copy()
+    spiked[-1, 0] = 1e6  # last hour of the history
+    z = SeasonalProfile(SIGNALS).score_update(ts, spiked)
+    np.testing.assert_array_equal(z[:-1], SeasonalProfile(SIGNALS).score_update(ts[:-1], values[:-1]))
+    assert z[-1, 0] > 1000
+
+
+def test_round_trip(tmp_path, history):
+    ts, values = history
+    profile = SeasonalProfile(SIGNALS)
+    profile.score_update(ts[:2000], values[:2000])
+    profile.save(str(tmp_path / 'profile.json'))
+    loaded = SeasonalProfile.load(str(tmp_path / 'profile.json'))
+    assert loaded.info() == profile.info()
+    np.testing.assert_array_equal(loaded.score_update(ts, values), profile.score_update(ts, values))